@@ -0,0 +1,76 @@
+"""
+设备分类基准：比较原来逐条 re.search 的 get_device_series 与预编译、带缓存的 SeriesClassifier。
+
+使用 设备列表/miui.txt 中每一条记录的设备名称（与按记录分类时的调用次数相同），
+先检查两种实现的结果完全一致，再分别计时。用法：
+
+    python 基准/分类器.py --rounds 20
+"""
+import argparse
+import importlib.util
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from 核心.分类器 import SeriesClassifier
+from 核心.设备列表 import DeviceListReader
+
+
+def load_config():
+    spec = importlib.util.spec_from_file_location("分类", ROOT / "整理" / "分类.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.CONFIG
+
+
+def legacy_series(config, device_name):
+    """原实现：每次调用重新判断品牌，逐条用字符串正则 re.search"""
+    brand = "Redmi" if re.search(r'^(Redmi|REDMI|红米)', device_name, re.IGNORECASE) else "小米"
+    if re.search(config['series_categories'][brand]['Pad系列'], device_name, re.IGNORECASE):
+        return brand, "Pad系列"
+    for series, pattern in config['series_categories'][brand].items():
+        if series in ["其他", "Pad系列"]:
+            continue
+        if re.search(pattern, device_name, re.IGNORECASE):
+            return brand, series
+    return brand, "其他"
+
+
+def timed(func, names, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for name in names:
+            func(name)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="设备分类基准")
+    parser.add_argument("--list", default=str(ROOT / "设备列表" / "miui.txt"), help="设备列表文件")
+    parser.add_argument("--rounds", type=int, default=20, help="重复次数，取平均")
+    args = parser.parse_args()
+
+    config = load_config()
+    names = [record.device_name for record in DeviceListReader(args.list)]
+    unique = sorted(set(names))
+
+    classifier = SeriesClassifier(config['series_categories'], config['brand_patterns'])
+    mismatches = [name for name in unique if classifier.classify(name) != legacy_series(config, name)]
+    if mismatches:
+        print(f"结果不一致：{mismatches[:10]}")
+        sys.exit(1)
+    print(f"{len(names)} 条记录，{len(unique)} 个设备，两种实现的分类结果一致")
+
+    legacy = timed(lambda name: legacy_series(config, name), names, args.rounds)
+    uncached = timed(lambda name: classifier._classify(name), names, args.rounds)
+    cached = timed(classifier.classify, names, args.rounds)
+    for label, seconds in (("逐条 re.search", legacy), ("预编译（无缓存）", uncached), ("预编译 + 缓存", cached)):
+        print(f"{label:>14}：每轮 {seconds * 1000:.2f} ms，相对原实现 {legacy / seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
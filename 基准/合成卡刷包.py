@@ -0,0 +1,165 @@
+"""
+合成卡刷包：生成两种格式的 recovery ZIP 和对应的设备列表，供端到端基准使用。
+
+- 旧格式（zip）：boot.img 直接放在 ZIP 中（DEFLATE），另有一个大的 system.new.dat.br 作为填充；
+- payload 格式：ZIP 中存放不压缩的 payload.bin，包含 boot、init_boot 和填充用的 system 分区，
+  操作类型与真实卡刷包相同（REPLACE、REPLACE_XZ、ZERO）。
+
+镜像带有真实的 boot 头（旧格式 v0，payload 格式 v4），内核为 gzip 压缩并带有 "Linux version" 一行，
+后面是大段零填充。每个卡刷包记录所需分区的 sha256 和实际需要下载的字节数，用来校验输出和衡量多余的下载。
+"""
+import gzip
+import hashlib
+import lzma
+import random
+import struct
+import zipfile
+from pathlib import Path
+from typing import NamedTuple
+
+import payload_dumper.update_metadata_pb2 as um
+
+KIND_ZIP = "zip"
+KIND_PAYLOAD = "payload"
+
+BLOCK_SIZE = 4096
+OPERATION_SIZE = 2 << 20  # 每个操作覆盖的数据量，与真实 payload 相同
+
+_BOOT_V0 = struct.Struct("<8s10I16s512s32s1024s")
+_BOOT_V4 = struct.Struct("<8s4I16sI1536sI")
+_OS_VERSION = (13 << 25) | (2023 - 2000) << 4 | 5  # Android 13，2023-05 补丁
+
+
+class Package(NamedTuple):
+    name: str  # 相对 root 的路径，也是 URL 路径
+    device: str
+    version: str
+    kind: str
+    size: int  # 卡刷包大小
+    needed: dict  # 分区 -> 提取它必须下载的字节数（压缩后的数据）
+    sha256: dict  # 分区 -> 镜像的 sha256
+
+
+def _compressible(rng, size):
+    """一半随机字节、一半重复文本，gzip 后大约是原来的一半"""
+    half = size // 2
+    return rng.randbytes(size - half) + (b"kernel text " * (half // 12 + 1))[:half]
+
+
+def make_boot_image(rng, size, header_version=4, kernel=True, release="5.10.177-android13-4-00001-g0123abcd"):
+    """
+    合成一个 size 字节（块大小的整数倍）的 boot 镜像：头 + gzip 内核 + gzip ramdisk + 零填充。
+    kernel=False 时得到 init_boot（v4，只有 ramdisk）。
+    """
+    page_size = 2048 if header_version < 3 else 4096
+    kernel_data = b""
+    if kernel:
+        banner = f"Linux version {release} (build@synthetic) #1 SMP PREEMPT\n".encode()
+        kernel_data = gzip.compress(banner + _compressible(rng, size // 8), compresslevel=1, mtime=0)
+    ramdisk = gzip.compress(b"070701" + _compressible(rng, size // 32), compresslevel=1, mtime=0)
+    if header_version < 3:
+        head = _BOOT_V0.pack(b"ANDROID!", len(kernel_data), 0x8000, len(ramdisk), 0x1000000, 0, 0, 0x100,
+                             page_size, header_version, _OS_VERSION, b"", b"console=ttyMSM0", b"", b"")
+    else:
+        head = _BOOT_V4.pack(b"ANDROID!", len(kernel_data), len(ramdisk), _OS_VERSION, 1584, bytes(16),
+                             header_version, b"", 0)
+
+    def page(data):
+        return data + bytes(-len(data) % page_size)
+
+    image = page(head) + page(kernel_data) + page(ramdisk)
+    if len(image) > size:
+        raise ValueError(f"镜像大小 {size} 放不下头、内核和 ramdisk（{len(image)} 字节）")
+    return image + bytes(size - len(image))
+
+
+def _operations(partition, image, blobs, offset, compress=True):
+    """把镜像切成操作：全零块用 ZERO，能压缩的用 REPLACE_XZ，其余 REPLACE；返回新的数据偏移"""
+    partition.new_partition_info.size = len(image)
+    partition.new_partition_info.hash = hashlib.sha256(image).digest()
+    for start in range(0, len(image), OPERATION_SIZE):
+        chunk = image[start:start + OPERATION_SIZE]
+        if chunk == bytes(len(chunk)):
+            op = partition.operations.add(type=um.InstallOperation.ZERO)
+        else:
+            data = lzma.compress(chunk, preset=0) if compress else chunk
+            kind = um.InstallOperation.REPLACE_XZ
+            if len(data) >= len(chunk):
+                data, kind = chunk, um.InstallOperation.REPLACE
+            op = partition.operations.add(type=kind, data_offset=offset, data_length=len(data))
+            blobs.append(data)
+            offset += len(data)
+        op.dst_extents.add(start_block=start // BLOCK_SIZE, num_blocks=len(chunk) // BLOCK_SIZE)
+    return offset
+
+
+def build_payload_package(path, images, filler):
+    """payload 格式：images 为 {分区: 镜像}，filler 作为 system 分区放在最前面（真实卡刷包中它最大）"""
+    manifest = um.DeltaArchiveManifest(block_size=BLOCK_SIZE)
+    blobs = []
+    offset = 0
+    needed = {}
+    for name, image in (("system", filler), *images.items()):
+        partition = manifest.partitions.add(partition_name=name)
+        first = len(blobs)
+        # 填充数据是随机的，不必尝试压缩
+        offset = _operations(partition, image, blobs, offset, compress=name != "system")
+        needed[name] = sum(len(blob) for blob in blobs[first:])
+    manifest_bytes = manifest.SerializeToString()
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("META-INF/com/android/metadata", "ota-type=AB\n")
+        with z.open(zipfile.ZipInfo("payload.bin"), "w", force_zip64=True) as dest:
+            dest.write(b"CrAU" + struct.pack(">QQI", 2, len(manifest_bytes), 0) + manifest_bytes)
+            for blob in blobs:
+                dest.write(blob)
+        z.writestr("payload_properties.txt", f"FILE_SIZE={offset}\n")
+    del needed["system"]
+    return needed
+
+
+def build_zip_package(path, images, filler):
+    """旧格式：镜像以 DEFLATE 压缩放在 ZIP 根目录，filler 不压缩地放在前面"""
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("META-INF/com/google/android/updater-script", "ui_print(\"synthetic\");\n")
+        z.writestr(zipfile.ZipInfo("system.new.dat.br"), filler, compress_type=zipfile.ZIP_STORED)
+        for name, image in images.items():
+            z.writestr(f"{name}.img", image, compress_type=zipfile.ZIP_DEFLATED, compresslevel=1)
+    with zipfile.ZipFile(path) as z:
+        return {name: z.getinfo(f"{name}.img").compress_size for name in images}
+
+
+def generate_dataset(root, count, payload_ratio=0.5, image_size=8 << 20, filler_size=16 << 20, seed=0):
+    """
+    在 root 中生成 count 个卡刷包，其中约 payload_ratio 比例为 payload 格式，返回 [Package]。
+    旧格式只有 boot，payload 格式有 boot 和 init_boot；所有卡刷包共用同一份填充数据。
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    image_size -= image_size % BLOCK_SIZE
+    filler = rng.randbytes(filler_size - filler_size % BLOCK_SIZE)
+    packages = []
+    for i in range(count):
+        payload = int((i + 1) * payload_ratio) > int(i * payload_ratio)  # 两种格式均匀交错
+        version = f"OS1.0.{i}.0.UMCCNXM" if payload else f"V14.0.{i}.0.TMCCNXM"
+        # 与官方下载地址相同，版本号是一级目录（miui 爬取从这里取版本号）
+        name = f"{version}/miui_SYNTH{i:04d}_{version}.zip"
+        (root / version).mkdir(exist_ok=True)
+        if payload:
+            images = {"boot": make_boot_image(rng, image_size),
+                      "init_boot": make_boot_image(rng, max(image_size // 4, 1 << 20), kernel=False)}
+            needed = build_payload_package(root / name, images, filler)
+        else:
+            images = {"boot": make_boot_image(rng, image_size, header_version=0)}
+            needed = build_zip_package(root / name, images, filler)
+        packages.append(Package(name, f"合成设备{i:04d}", version, KIND_PAYLOAD if payload else KIND_ZIP,
+                                (root / name).stat().st_size, needed,
+                                {partition: hashlib.sha256(image).hexdigest() for partition, image in images.items()}))
+    return packages
+
+
+def write_device_list(path, packages, base_url):
+    """写出 "设备: xxx, 版本: xxx, 链接: xxx" 格式的设备列表"""
+    with open(path, "w", encoding="utf-8") as f:
+        for package in packages:
+            f.write(f"设备: {package.device}, 版本: {package.version}, 链接: {base_url}/{package.name}\n")
@@ -0,0 +1,159 @@
+"""
+基准测试用的本地 HTTP 服务器：在后台线程中托管一个目录，用来代替 data.hyperos.fans / OSS 等真实数据源。
+
+支持 Range 请求（单个范围，返回 206），可注入固定延迟、随机的 503 错误和中途断开的响应（截断），
+并统计请求数和实际发送的字节数，用来衡量爬取脚本的下载量。
+"""
+import functools
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+SEND_CHUNK = 64 * 1024
+
+_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    latency = 0.0
+    error_rate = 0.0
+    truncate_rate = 0.0
+
+    def _begin(self, kind):
+        """每个请求开始时调用：注入延迟、计数；返回 False 表示已注入错误响应"""
+        if self.latency:
+            time.sleep(self.latency)
+        server = self.server
+        with server.lock:
+            server.requests[kind] += 1
+            fail = self.error_rate and server.random.random() < self.error_rate
+            if fail:
+                server.requests["注入错误"] += 1
+        if fail:
+            self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, "injected error")
+            return False
+        return True
+
+    def _truncate(self):
+        with self.server.lock:
+            truncate = self.truncate_rate and self.server.random.random() < self.truncate_rate
+            if truncate:
+                self.server.requests["截断"] += 1
+        return truncate
+
+    def _send_body(self, source, length):
+        """发送 length 字节；注入截断时只发送一半，然后关闭连接"""
+        if self._truncate():
+            length //= 2
+            self.close_connection = True
+        while length > 0:
+            data = source.read(min(SEND_CHUNK, length))
+            if not data:
+                break
+            self.wfile.write(data)
+            length -= len(data)
+            with self.server.lock:
+                self.server.bytes_sent += len(data)
+
+    def copyfile(self, source, outputfile):
+        # 完整的 GET 响应（不带 Range），source 可能是文件或目录列表的 BytesIO
+        start = source.tell()
+        length = source.seek(0, os.SEEK_END) - start
+        source.seek(start)
+        self._send_body(source, length)
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        if not self._begin("GET Range" if range_header else "GET"):
+            return
+        path = self.translate_path(self.path)
+        if range_header is None or not os.path.isfile(path):
+            super().do_GET()
+            return
+
+        size = os.path.getsize(path)
+        match = _RANGE_PATTERN.fullmatch(range_header.strip())
+        if not match or not (match.group(1) or match.group(2)):
+            self.send_error(HTTPStatus.BAD_REQUEST, "unsupported Range")
+            return
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            # bytes=-N：最后 N 个字节
+            start, end = max(0, size - int(match.group(2))), size - 1
+        if start >= size or start > end:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            self._send_body(f, end - start + 1)
+
+    def do_HEAD(self):
+        if self._begin("HEAD"):
+            super().do_HEAD()
+
+    def end_headers(self):
+        if self.command == "HEAD":
+            self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer:
+    """
+    with LocalServer(root, latency=0.05) as server: server.url 即为根地址。
+    error_rate、truncate_rate 为每个请求返回 503、响应中途断开的概率，seed 固定时注入的位置可重现。
+    """
+
+    def __init__(self, root, latency=0.0, error_rate=0.0, truncate_rate=0.0, seed=None):
+        handler = type("Handler", (_Handler,), {"latency": latency, "error_rate": error_rate,
+                                                "truncate_rate": truncate_rate})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=str(root)))
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.random = random.Random(seed)
+        self.reset_stats()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def request_count(self):
+        with self.httpd.lock:
+            return sum(count for kind, count in self.httpd.requests.items() if kind in ("GET", "GET Range", "HEAD"))
+
+    def stats(self):
+        """{"requests": {类别: 次数}, "bytes_sent": 发送的响应体字节数}"""
+        with self.httpd.lock:
+            return {"requests": dict(self.httpd.requests), "bytes_sent": self.httpd.bytes_sent}
+
+    def reset_stats(self):
+        with self.httpd.lock:
+            self.httpd.requests = Counter()
+            self.httpd.bytes_sent = 0
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,78 @@
+"""
+流式提取内存基准：比较一次性 read() 与 stream_to_file 提取大镜像时的峰值内存（RSS）。
+
+生成一个包含大 boot.img 的合成 ZIP，每种方式在独立子进程中提取一次，
+子进程退出前报告自身的 ru_maxrss。用法：
+
+    python 基准/流式提取内存.py --size-mb 256
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from 核心.提取 import stream_to_file
+
+
+def build_zip(path, size_mb):
+    """镜像内容为随机数据和大段填充交替，接近真实 boot.img 的压缩特征"""
+    block = os.urandom(1 << 20)
+    padding = bytes(1 << 20)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        with z.open("boot.img", "w", force_zip64=True) as dest:
+            for i in range(size_mb):
+                dest.write(block if i % 4 == 0 else padding)
+
+
+def peak_rss_mb():
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def child(mode, zip_path, output_path):
+    start = time.perf_counter()
+    with zipfile.ZipFile(zip_path) as z, z.open("boot.img") as src:
+        if mode == "read":
+            with open(output_path, "wb") as dest:
+                dest.write(src.read())
+        else:
+            stream_to_file(src, output_path)
+    print(f"{time.perf_counter() - start:.3f} {peak_rss_mb():.1f}")
+
+
+def run_child(mode, zip_path, output_path):
+    result = subprocess.run([sys.executable, __file__, "--child", mode, zip_path, output_path],
+                            check=True, capture_output=True, text=True)
+    elapsed, rss = result.stdout.split()
+    return float(elapsed), float(rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式提取内存基准")
+    parser.add_argument("--size-mb", type=int, default=256, help="合成 boot.img 的大小（MB）")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "package.zip")
+        build_zip(zip_path, args.size_mb)
+        print(f"合成 ZIP：boot.img {args.size_mb} MB，压缩后 {os.path.getsize(zip_path) / (1 << 20):.1f} MB")
+        for mode, label in (("read", "一次性 read()"), ("stream", "stream_to_file")):
+            elapsed, rss = run_child(mode, zip_path, os.path.join(tmp, f"{mode}.img"))
+            print(f"{label:>16}：耗时 {elapsed:.2f} 秒，峰值 RSS {rss:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
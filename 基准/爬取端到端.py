@@ -0,0 +1,176 @@
+"""
+端到端爬取基准：离线运行真实的爬取流程（main -> process_device -> 提取），不访问 OSS。
+
+生成旧格式（boot.img）与 payload 格式（boot / init_boot）混合的合成卡刷包和设备列表，
+由支持 Range 的本地服务器提供（可注入延迟、503 错误和中途断开），每个爬取脚本在独立子进程中运行一次。
+报告每秒处理的卡刷包数、实际下载量与所需数据量之比、峰值 RSS 和请求数，并校验输出镜像的 sha256。
+用法：
+
+    python 基准/爬取端到端.py --packages 24 --latency 0.02
+    python 基准/爬取端到端.py --source hyper --error-rate 0.05 --truncate-rate 0.05 --json 结果.json
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import importlib.util
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from 本地服务器 import LocalServer
+from 合成卡刷包 import generate_dataset, write_device_list
+from 流式提取内存 import peak_rss_mb
+
+SOURCES = ("miui", "hyper")
+
+
+def load_crawler(source):
+    spec = importlib.util.spec_from_file_location(f"crawler_{source}", BASE_DIR / "爬取" / source / "开始搭建.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def child(config):
+    """子进程：按配置运行一次爬取，爬取日志写入输出目录，最后一行输出耗时和峰值 RSS"""
+    from 核心.分区 import parse_partitions
+    from 核心.重试 import RetryPolicy
+
+    crawler = load_crawler(config["source"])
+    # 只测下载和提取：不使用去重存储和目录库，重试不做长时间退避
+    crawler.BLOB_STORE_DIR = None
+    crawler.CATALOG_PATH = None
+    crawler.PROGRESS_INTERVAL = 3600
+    crawler.RETRY_POLICY = RetryPolicy(max_attempts=config["attempts"], base_delay=0.01, max_delay=0.1)
+    output_dir = Path(config["output_dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "crawl.log", "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        start = time.perf_counter()
+        asyncio.run(crawler.main(list_path=config["list"], output_dir=str(output_dir),
+                                 concurrency=config["concurrency"] or crawler.MAX_CONCURRENT_PACKAGES,
+                                 partitions=parse_partitions(config["partitions"]), io_budget_path=None))
+        elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "rss_mb": peak_rss_mb()}))
+
+
+def run_child(config):
+    result = subprocess.run([sys.executable, __file__, "--child", json.dumps(config)],
+                            capture_output=True, text=True)
+    if result.returncode:
+        # 临时目录随后会被删除，直接输出爬取日志的末尾
+        log = Path(config["output_dir"]) / "crawl.log"
+        tail = "".join(log.read_text(encoding="utf-8").splitlines(keepends=True)[-20:]) if log.exists() else ""
+        raise SystemExit(f"{config['source']} 爬取失败：\n{tail}{result.stderr}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def verify_outputs(output_dir, expected):
+    """输出目录中与合成镜像 sha256 一致的镜像数"""
+    found = set()
+    for path in Path(output_dir).rglob("*.img"):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        found.add(digest.hexdigest())
+    return len(found & expected)
+
+
+def run_source(source, args, server, packages, list_path, work_dir):
+    partitions = [name.strip() for name in args.partitions.split(",")]
+    needed = sum(size for package in packages for name, size in package.needed.items() if name in partitions)
+    expected = {sha for package in packages for name, sha in package.sha256.items() if name in partitions}
+    output_dir = work_dir / f"output_{source}"
+
+    server.reset_stats()
+    timing = run_child({"source": source, "list": str(list_path), "output_dir": str(output_dir),
+                        "concurrency": args.concurrency, "partitions": args.partitions, "attempts": args.attempts})
+    served = server.stats()
+    with open(output_dir / "crawl_metrics.json", encoding="utf-8") as f:
+        metrics = json.load(f)
+    return {
+        "source": source,
+        "packages": len(packages),
+        "statuses": metrics["packages"],
+        "seconds": timing["seconds"],
+        "packages_per_second": len(packages) / timing["seconds"],
+        "bytes_fetched": served["bytes_sent"],
+        "bytes_needed": needed,
+        "bytes_total": sum(package.size for package in packages),
+        "peak_rss_mb": timing["rss_mb"],
+        "requests": served["requests"],
+        "retries": metrics["retries"],
+        "images_verified": verify_outputs(output_dir, expected),
+        "images_expected": len(expected),
+    }
+
+
+def print_result(result):
+    mb = 1 << 20
+    statuses = "，".join(f"{status} {count}" for status, count in sorted(result["statuses"].items()))
+    requests = "，".join(f"{kind} {count}" for kind, count in sorted(result["requests"].items()))
+    retries = "，".join(f"{kind} {count}" for kind, count in sorted(result["retries"].items())) or "无"
+    print(f"\n{result['source']}：{result['packages']} 个卡刷包（{statuses}），耗时 {result['seconds']:.2f} 秒，"
+          f"{result['packages_per_second']:.2f} 个/秒")
+    print(f"  下载 {result['bytes_fetched'] / mb:.1f} MB，所需 {result['bytes_needed'] / mb:.1f} MB"
+          f"（{result['bytes_fetched'] / result['bytes_needed']:.2f} 倍），卡刷包共 {result['bytes_total'] / mb:.1f} MB")
+    print(f"  请求：{requests}；重试：{retries}")
+    print(f"  峰值 RSS {result['peak_rss_mb']:.1f} MB；输出校验 {result['images_verified']}/{result['images_expected']} 个镜像一致")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端爬取基准（本地合成卡刷包）")
+    parser.add_argument("--source", choices=(*SOURCES, "all"), default="all", help="要测试的爬取脚本")
+    parser.add_argument("--packages", type=int, default=16, help="合成卡刷包数量")
+    parser.add_argument("--payload-ratio", type=float, default=0.5, help="payload 格式卡刷包的比例")
+    parser.add_argument("--image-mb", type=int, default=8, help="boot 镜像大小（MB）")
+    parser.add_argument("--filler-mb", type=int, default=16, help="每个卡刷包中不需要下载的填充数据（MB）")
+    parser.add_argument("--partitions", default="boot,init_boot", help="要提取的分区")
+    parser.add_argument("--concurrency", type=int, help="同时处理的卡刷包数量（默认使用爬取脚本的设置）")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求注入的延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求返回 503 的概率")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="响应中途断开的概率")
+    parser.add_argument("--attempts", type=int, default=6, help="每个卡刷包最多尝试的次数")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据和错误注入的随机种子")
+    parser.add_argument("--json", metavar="文件", help="把结果写入 JSON 文件，便于比较不同版本")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(json.loads(args.child))
+        return
+
+    sources = SOURCES if args.source == "all" else (args.source,)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        start = time.perf_counter()
+        packages = generate_dataset(work_dir / "data", args.packages, payload_ratio=args.payload_ratio,
+                                    image_size=args.image_mb << 20, filler_size=args.filler_mb << 20, seed=args.seed)
+        print(f"合成 {len(packages)} 个卡刷包，耗时 {time.perf_counter() - start:.1f} 秒")
+        with LocalServer(work_dir / "data", latency=args.latency, error_rate=args.error_rate,
+                         truncate_rate=args.truncate_rate, seed=args.seed) as server:
+            list_path = work_dir / "设备列表.txt"
+            write_device_list(list_path, packages, server.url)
+            for source in sources:
+                result = run_source(source, args, server, packages, list_path, work_dir)
+                print_result(result)
+                results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": {key: value for key, value in vars(args).items() if key not in ("child", "json")},
+                       "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
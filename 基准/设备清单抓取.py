@@ -0,0 +1,114 @@
+"""
+设备清单抓取基准：对比串行与并发刷新 HyperOS 设备列表的耗时，以及无变化时增量刷新的开销。
+
+在本地服务器上生成合成的 devices.json 与 devices/{code}.json，每个请求注入固定延迟，
+模拟真实网络往返。用法：
+
+    python 基准/设备清单抓取.py --devices 300 --latency 0.05 --concurrency 16
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from 本地服务器 import LocalServer
+
+UPDATER_PATH = BASE_DIR / "更新" / "澎湃卡刷包更新-设备列表.py"
+
+
+def load_updater():
+    spec = importlib.util.spec_from_file_location("updater", UPDATER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_dataset(root, device_count, roms_per_device=5):
+    """生成合成的 devices.json 与每台设备的 JSON"""
+    devices_dir = Path(root) / "devices"
+    devices_dir.mkdir(parents=True, exist_ok=True)
+    brands = {"xiaomi": {"devices": []}, "redmi": {"devices": []}}
+    for i in range(device_count):
+        code = f"device{i:04d}"
+        brand = "xiaomi" if i % 2 == 0 else "redmi"
+        brands[brand]["devices"].append({"code": code})
+        roms = {
+            f"OS1.0.{v}.0.UMCCNXM": {"recovery": f"miui-blockota-{code}-OS1.0.{v}.0.zip"}
+            for v in range(roms_per_device)
+        }
+        device_data = {
+            "name": {"zh": f"测试设备 {i}"},
+            "branches": [
+                {"name": {"zh": "小米澎湃 OS 正式版"}, "roms": roms},
+                {"name": {"zh": "小米澎湃 OS 开发版"}, "roms": {}},
+            ],
+        }
+        (devices_dir / f"{code}.json").write_text(json.dumps(device_data, ensure_ascii=False), encoding="utf-8")
+    (Path(root) / "devices.json").write_text(json.dumps(brands), encoding="utf-8")
+
+
+def add_rom(root, code, version):
+    """给某台设备追加一个 ROM 版本，并把修改时间往后推，保证 Last-Modified 变化"""
+    path = Path(root) / "devices" / f"{code}.json"
+    device_data = json.loads(path.read_text(encoding="utf-8"))
+    device_data["branches"][0]["roms"][version] = {"recovery": f"miui-blockota-{code}-{version}.zip"}
+    path.write_text(json.dumps(device_data, ensure_ascii=False), encoding="utf-8")
+    later = time.time() + 10
+    os.utime(path, (later, later))
+
+
+def run_once(updater, base_url, output_path, cache_dir, concurrency, rate_per_host):
+    start = time.perf_counter()
+    lines = updater.update_device_list(output_path=output_path, base_url=base_url, cache_dir=cache_dir,
+                                       concurrency=concurrency, rate_per_host=rate_per_host, catalog_path=None)
+    return time.perf_counter() - start, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="设备清单抓取基准")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求注入的延迟（秒）")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=0, help="每主机每秒请求上限，0 为不限")
+    args = parser.parse_args()
+
+    updater = load_updater()
+    with tempfile.TemporaryDirectory() as tmp:
+        data_root = Path(tmp) / "data"
+        generate_dataset(data_root, args.devices)
+        with LocalServer(data_root, latency=args.latency) as server:
+            serial_time, serial_lines = run_once(
+                updater, server.url, os.path.join(tmp, "serial.txt"), os.path.join(tmp, "cache_serial"),
+                1, args.rate)
+            parallel_output = os.path.join(tmp, "parallel.txt")
+            parallel_cache = os.path.join(tmp, "cache_parallel")
+            parallel_time, parallel_lines = run_once(
+                updater, server.url, parallel_output, parallel_cache, args.concurrency, args.rate)
+            # 无变化的增量刷新：全部请求都应返回 304
+            warm_time, warm_lines = run_once(
+                updater, server.url, parallel_output, parallel_cache, args.concurrency, args.rate)
+            # 一台设备新增 ROM 后再刷新，应报告新版本
+            add_rom(data_root, "device0000", "OS2.0.0.0.VMCCNXM")
+            changed_time, changed_lines = run_once(
+                updater, server.url, parallel_output, parallel_cache, args.concurrency, args.rate)
+
+    assert serial_lines == parallel_lines == warm_lines, "并发/增量输出与串行输出不一致"
+    assert len(changed_lines) == len(parallel_lines) + 1
+    print()
+    print(f"设备数：{args.devices}，单请求延迟：{args.latency * 1000:.0f} ms，输出行数：{len(parallel_lines)}")
+    print(f"串行（并发 1）：{serial_time:.2f} 秒")
+    print(f"并发（并发 {args.concurrency}）：{parallel_time:.2f} 秒，加速 {serial_time / parallel_time:.1f}x")
+    print(f"无变化增量刷新：{warm_time:.2f} 秒")
+    print(f"单设备新增版本后刷新：{changed_time:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
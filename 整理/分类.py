@@ -1,14 +1,31 @@
 import os
+import sys
 import shutil
-import re
 import json
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from 核心.目录库 import Catalog
+from 核心.分类器 import SeriesClassifier
+from 核心.视图 import LibraryView, series_grouping, attribute_grouping, LINK_SYMLINK
+
 # 更新后的配置参数（按照截图中的分类体系）
 CONFIG = {
     'source_dir': 'boot库',  # 源文件夹
-    'target_dir': 'boot库_整理',  # 整理后的目标文件夹
+    'target_dir': 'boot库_整理',  # 整理后的目标文件夹（--move 实际移动时使用）
+    # 分类视图：在视图目录中按分组建立指向 boot库 设备文件夹的链接，不移动、不复制文件。
+    # group_by 为 series（品牌/系列）或 attribute（按 attribute_file 中 {"设备文件夹名": "属性值"} 分组），
+    # 属性文件不存在的视图会被跳过
+    'views': [
+        {'dir': 'boot库_整理', 'group_by': 'series'},
+        {'dir': 'boot库_按SoC', 'group_by': 'attribute', 'attribute_file': '设备属性/soc.json'},
+        {'dir': 'boot库_按Android版本', 'group_by': 'attribute', 'attribute_file': '设备属性/android.json'}
+    ],
+    'link_mode': LINK_SYMLINK,  # symlink（设备文件夹的符号链接，失败时自动改用硬链接）或 hardlink
     'undo_log': 'organize_undo_log.json',  # 撤销日志文件
+    'catalog': '目录库.sqlite3',  # 目录库（相对项目根目录），存在时同步文件夹移动后的路径
+    'rules_file': None,  # 外部规则文件（JSON，格式见 核心/分类器.py），设置后代替下面的 series_categories
+    'brand_patterns': {'Redmi': r'^(Redmi|REDMI|红米)'},  # 品牌判断，都不匹配时归为小米
     'series_categories': {
         'Redmi': {
             '数字系列': r'\b(\d+[A-Za-z]*)\b',
@@ -36,32 +53,58 @@ CONFIG = {
 }
 
 
+def open_catalog():
+    path = Path(__file__).resolve().parent.parent / CONFIG['catalog']
+    return Catalog(path) if path.exists() else None
+
+
+_classifier = None
+
+
+def get_classifier():
+    """按配置创建的分类器（规则预编译，结果按设备名称缓存）"""
+    global _classifier
+    if _classifier is None:
+        rules_file = CONFIG['rules_file']
+        if rules_file:
+            _classifier = SeriesClassifier.from_file(Path(__file__).resolve().parent.parent / rules_file)
+        else:
+            _classifier = SeriesClassifier(CONFIG['series_categories'], CONFIG['brand_patterns'])
+    return _classifier
+
+
 def get_device_series(device_name):
-    """根据设备名称确定其所属系列"""
-    # 确定品牌大类
-    brand = "Redmi" if re.search(r'^(Redmi|REDMI|红米)', device_name, re.IGNORECASE) else "小米"
+    """根据设备名称确定其所属系列：平板优先，其余按照配置顺序，都不匹配时归为"其他"系列"""
+    return get_classifier().classify(device_name)
 
-    # 检查是否平板设备
-    if re.search(CONFIG['series_categories'][brand]['Pad系列'], device_name, re.IGNORECASE):
-        return brand, "Pad系列"
 
-    # 检查其他系列（按照配置顺序）
-    for series, pattern in CONFIG['series_categories'][brand].items():
-        if series in ["其他", "Pad系列"]:
-            continue
-        if re.search(pattern, device_name, re.IGNORECASE):
-            return brand, series
+def export_mapping(output_file):
+    """一次性分类目录库和源文件夹中的全部设备，把 设备 -> 品牌/系列 的映射写入 JSON 文件"""
+    base_dir = Path(__file__).resolve().parent.parent
+    names = set()
+    catalog = open_catalog()
+    if catalog:
+        names.update(catalog.device_names())
+        catalog.close()
+    source_path = base_dir / CONFIG['source_dir']
+    if source_path.is_dir():
+        with os.scandir(source_path) as entries:
+            names.update(entry.name for entry in entries if entry.is_dir())
 
-    # 默认归类为"其他"
-    return brand, "其他"
+    mapping = get_classifier().classify_all(sorted(names))
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({name: {'brand': brand, 'series': series} for name, (brand, series) in mapping.items()},
+                  f, ensure_ascii=False, indent=2)
+    print(f"已分类 {len(mapping)} 个设备，映射已写入 {output_file}")
 
 
 def organize_devices():
     """整理设备文件夹"""
-    base_dir = Path(__file__).parent.parent
+    base_dir = Path(__file__).resolve().parent.parent
     source_path = base_dir / CONFIG['source_dir']
     target_path = base_dir / CONFIG['target_dir']
     undo_data = []
+    catalog = open_catalog()
 
     # 创建目标文件夹
     target_path.mkdir(parents=True, exist_ok=True)
@@ -93,6 +136,8 @@ def organize_devices():
 
         try:
             shutil.move(str(device_path), str(target_device_path))
+            if catalog:
+                catalog.move_output_tree(device_path, target_device_path)
             undo_data.append({
                 'device': device_folder,
                 'src': str(device_path),
@@ -104,6 +149,9 @@ def organize_devices():
         except Exception as e:
             print(f"❌ 整理失败: {device_folder} - {str(e)}")
 
+    if catalog:
+        catalog.close()
+
     # 写入撤销日志
     if undo_data:
         with open(CONFIG['undo_log'], 'w') as f:
@@ -113,6 +161,34 @@ def organize_devices():
         print("\n没有设备需要整理")
 
 
+def build_views(dry_run=False, clear=False):
+    """增量重建（或清除）全部分类视图，只处理分组发生变化的设备"""
+    base_dir = Path(__file__).resolve().parent.parent
+    source_path = base_dir / CONFIG['source_dir']
+    if not source_path.is_dir():
+        print(f"⚠️ 源文件夹不存在: {source_path}")
+        return
+
+    for view in CONFIG['views']:
+        if view['group_by'] == 'series':
+            group_of = series_grouping(get_classifier())
+        else:
+            attribute_file = base_dir / view['attribute_file']
+            if not attribute_file.exists():
+                print(f"⏩ 跳过视图 {view['dir']}：属性文件不存在 {attribute_file}")
+                continue
+            group_of = attribute_grouping(attribute_file)
+
+        library_view = LibraryView(source_path, base_dir / view['dir'], group_of, CONFIG['link_mode'])
+        if clear:
+            library_view.clear()
+            print(f"🗑️ 已清除视图 {view['dir']}")
+            continue
+        stats = library_view.build(dry_run)
+        print(f"✅ 视图 {view['dir']}：新增 {stats.added}，调整分组 {stats.moved}，移除 {stats.removed}，"
+              f"未变 {stats.unchanged}，同步文件 {stats.synced_files}")
+
+
 def undo_organization():
     """撤销整理操作"""
     if not os.path.exists(CONFIG['undo_log']):
@@ -127,11 +203,14 @@ def undo_organization():
         return
 
     restored_devices = 0
+    catalog = open_catalog()
 
     for record in reversed(undo_data):
         try:
             # 移动设备文件夹回原位置
             shutil.move(record['dst'], record['src'])
+            if catalog:
+                catalog.move_output_tree(record['dst'], record['src'])
             restored_devices += 1
             print(f"↩️ 已还原 {record['device']}")
 
@@ -150,6 +229,9 @@ def undo_organization():
         except Exception as e:
             print(f"❌ 还原失败: {record['device']} - {str(e)}")
 
+    if catalog:
+        catalog.close()
+
     # 删除日志文件
     os.remove(CONFIG['undo_log'])
     print(f"\n已撤销 {restored_devices}/{len(undo_data)} 个设备整理操作")
@@ -164,7 +246,16 @@ if __name__ == "__main__":
         print("\n正在撤销最近一次整理操作...")
         undo_organization()
         print("\n撤销操作完成！")
-    else:
-        print("\n开始整理设备文件夹...")
+    elif '--mapping' in sys.argv:
+        index = sys.argv.index('--mapping') + 1
+        export_mapping(sys.argv[index] if index < len(sys.argv) else 'device_series.json')
+    elif '--move' in sys.argv:
+        print("\n开始整理设备文件夹（实际移动）...")
         organize_devices()
-        print("\n整理操作完成！使用 --undo 参数可撤销操作")
\ No newline at end of file
+        print("\n整理操作完成！使用 --undo 参数可撤销操作")
+    elif '--clear-views' in sys.argv:
+        build_views(clear=True)
+    else:
+        print("\n更新分类视图...")
+        build_views(dry_run='--dry-run' in sys.argv)
+        print("\n视图更新完成！修改规则后重新执行即可；--move 实际移动文件夹，--clear-views 删除视图")
\ No newline at end of file
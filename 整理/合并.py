@@ -1,82 +1,178 @@
 import os
+import sys
+import errno
 import shutil
-import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import NamedTuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from 核心.目录库 import Catalog
+from 核心.撤销日志 import UndoLog, read_undo_log
+from 核心.压缩存储 import original_name
 
 # 配置参数
 CONFIG = {
     'source_dirs': ['miui', 'hyper'],  # 要合并的源文件夹
     'target_dir': 'boot库',  # 合并目标文件夹
-    'undo_log': 'merge_undo_log.json'  # 撤销日志文件
+    'undo_log': 'merge_undo_log.json',  # 撤销日志文件（每行一条 JSON 记录）
+    'catalog': '目录库.sqlite3',  # 目录库（相对项目根目录），存在时同步文件移动后的路径
+    'batch_size': 500,  # 每批移动的文件数：先写入并 fsync 这一批的撤销记录，再执行移动
+    'copy_workers': 8  # 跨文件系统时并行复制的线程数
 }
 
 
-def merge_folders():
-    """合并文件夹并记录操作日志"""
-    # 获取当前脚本所在目录的上级目录
-    base_dir = Path(__file__).parent.parent
-    undo_data = []
+class MoveItem(NamedTuple):
+    source: str  # 源分区文件夹
+    device: str
+    partition: str
+    file: str
+    src: str
+    dst: str
+
+
+def open_catalog():
+    path = Path(__file__).resolve().parent.parent / CONFIG['catalog']
+    return Catalog(path) if path.exists() else None
+
 
-    # 创建目标文件夹
+def _subdirs(path):
+    with os.scandir(path) as entries:
+        return sorted((entry for entry in entries if entry.is_dir()), key=lambda entry: entry.name)
+
+
+def _names(path):
+    """目录中的文件名集合，目录不存在时为空"""
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+
+def plan_merge(base_dir):
+    """
+    只读地遍历源文件夹，计算完整的移动计划，返回 (移动计划, 跳过的文件)。
+    每个目标分区文件夹只列一次目录，不再对每个文件调用 exists。
+    文件只按名称移动、不读取内容；同一镜像的原始文件（.img）和压缩文件（.img.zst）视为同名。
+    """
     target_path = base_dir / CONFIG['target_dir']
-    target_path.mkdir(parents=True, exist_ok=True)
+    plan = []
+    skipped = []
+    claimed = set()  # 计划中已占用的目标路径（miui 与 hyper 中可能有同名文件），不含 .zst 后缀
 
-    # 处理每个源文件夹
     for source_name in CONFIG['source_dirs']:
         source_path = base_dir / '爬取' / source_name
 
-        if not source_path.exists():
+        if not source_path.is_dir():
             print(f"⚠️ 源文件夹不存在: {source_path}")
             continue
 
-        # 遍历所有设备文件夹
-        for device in os.listdir(source_path):
-            device_path = source_path / device
+        for device in _subdirs(source_path):
+            for partition in _subdirs(device.path):
+                dst_dir = os.path.join(target_path, device.name, partition.name)
+                existing = {original_name(name) for name in _names(dst_dir)}
+                with os.scandir(partition.path) as entries:
+                    files = sorted(entry.name for entry in entries if not entry.is_dir())
+                for file in files:
+                    dst = os.path.join(dst_dir, file)
+                    name = original_name(file)
+                    key = os.path.join(dst_dir, name)
+                    if name in existing or key in claimed:
+                        skipped.append(f"{device.name}/{partition.name}/{file}")
+                        continue
+                    claimed.add(key)
+                    plan.append(MoveItem(partition.path, device.name, partition.name, file,
+                                         os.path.join(partition.path, file), dst))
+    return plan, skipped
 
-            if not os.path.isdir(device_path):
-                continue
 
-            # 遍历设备下的所有分区文件夹
-            for partition in os.listdir(device_path):
-                partition_src = device_path / partition
-                partition_dst = target_path / device / partition
+def _copy_move(item):
+    """跨文件系统移动：复制到目标目录中的临时文件，重命名后删除源文件"""
+    tmp = os.path.join(os.path.dirname(item.dst), f".{item.file}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        shutil.copy2(item.src, tmp)
+        # 删除源文件之前确保副本已落盘
+        with open(tmp, "r+b") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, item.dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.remove(item.src)
+
+
+def execute_plan(plan, undo_log, catalog=None):
+    """按批次执行移动：同一文件系统内直接 rename，跨文件系统的文件并行复制"""
+    for dst_dir in sorted({os.path.dirname(item.dst) for item in plan}):
+        os.makedirs(dst_dir, exist_ok=True)
+
+    moved = failed = 0
+    with ThreadPoolExecutor(max_workers=CONFIG['copy_workers']) as executor:
+        for start in range(0, len(plan), CONFIG['batch_size']):
+            batch = plan[start:start + CONFIG['batch_size']]
+            undo_log.write_batch([item._asdict() for item in batch])
+
+            done = []
+            cross_device = []
+            for item in batch:
+                try:
+                    os.rename(item.src, item.dst)
+                    done.append(item)
+                except OSError as e:
+                    if e.errno == errno.EXDEV:
+                        cross_device.append(item)
+                    else:
+                        print(f"❌ 移动失败: {item.device}/{item.partition}/{item.file} - {e}")
+                        failed += 1
+
+            futures = [(item, executor.submit(_copy_move, item)) for item in cross_device]
+            for item, future in futures:
+                try:
+                    future.result()
+                    done.append(item)
+                except Exception as e:
+                    print(f"❌ 移动失败: {item.device}/{item.partition}/{item.file} - {e}")
+                    failed += 1
+
+            if catalog:
+                catalog.move_outputs((item.src, item.dst) for item in done)
+            moved += len(done)
+            print(f"✅ 已移动 {moved}/{len(plan)} 个文件")
+    return moved, failed
+
+
+def merge_folders(dry_run=False):
+    """合并文件夹并记录操作日志"""
+    # 获取当前脚本所在目录的上级目录
+    base_dir = Path(__file__).resolve().parent.parent
 
-                if not os.path.isdir(partition_src):
-                    continue
+    plan, skipped = plan_merge(base_dir)
+    for name in skipped:
+        print(f"⏩ 跳过已存在文件: {name}")
 
-                # 创建目标分区文件夹
-                partition_dst.mkdir(parents=True, exist_ok=True)
+    if dry_run:
+        for item in plan:
+            print(f"📝 {item.src} -> {item.dst}")
+        print(f"\n计划移动 {len(plan)} 个文件，跳过 {len(skipped)} 个（未执行任何移动）")
+        return
 
-                # 移动所有分区文件
-                for file in os.listdir(partition_src):
-                    src_file = partition_src / file
-                    dst_file = partition_dst / file
+    if not plan:
+        print("\n没有文件需要移动")
+        return
 
-                    if os.path.exists(dst_file):
-                        print(f"⏩ 跳过已存在文件: {device}/{partition}/{file}")
-                        continue
+    catalog = open_catalog()
+    try:
+        with UndoLog(CONFIG['undo_log']) as undo_log:
+            moved, failed = execute_plan(plan, undo_log, catalog)
+    finally:
+        if catalog:
+            catalog.close()
 
-                    try:
-                        shutil.move(str(src_file), str(dst_file))
-                        undo_data.append({
-                            'source': str(partition_src),
-                            'device': device,
-                            'partition': partition,
-                            'file': file,
-                            'src': str(src_file),
-                            'dst': str(dst_file)
-                        })
-                        print(f"✅ 已移动 {source_name}/{device}/{partition}/{file}")
-                    except Exception as e:
-                        print(f"❌ 移动失败: {str(e)}")
-
-    # 写入撤销日志
-    if undo_data:
-        with open(CONFIG['undo_log'], 'w') as f:
-            json.dump(undo_data, f, indent=2)
-        print(f"\n操作已记录到 {CONFIG['undo_log']}")
-    else:
-        print("\n没有文件需要移动")
+    print(f"\n移动 {moved} 个文件，失败 {failed} 个，跳过 {len(skipped)} 个")
+    print(f"操作已记录到 {CONFIG['undo_log']}")
 
 
 def undo_merge():
@@ -86,41 +182,52 @@ def undo_merge():
         return
 
     try:
-        with open(CONFIG['undo_log'], 'r') as f:
-            undo_data = json.load(f)
+        undo_data = read_undo_log(CONFIG['undo_log'])
     except Exception as e:
         print(f"读取日志失败: {str(e)}")
         return
 
     restored_files = 0
+    not_moved = 0
+    restored = []
+    catalog = open_catalog()
 
     for record in reversed(undo_data):
+        # 预写日志中可能有崩溃前没来得及执行的移动
+        if not os.path.exists(record['dst']) or os.path.exists(record['src']):
+            not_moved += 1
+            continue
         try:
             # 确保源目录存在
             os.makedirs(record['source'], exist_ok=True)
 
             # 移动文件回原位置
             shutil.move(record['dst'], record['src'])
+            restored.append((record['dst'], record['src']))
             restored_files += 1
-            print(f"↩️ 已还原 {record['device']}/{record['partition']}/{record['file']}")
         except Exception as e:
             print(f"❌ 还原失败: {record['file']} - {str(e)}")
 
+    if catalog:
+        catalog.move_outputs(restored)
+        catalog.close()
+
     # 删除日志文件
     os.remove(CONFIG['undo_log'])
-    print(f"\n已撤销 {restored_files}/{len(undo_data)} 个文件操作")
+    print(f"\n已撤销 {restored_files}/{len(undo_data)} 个文件操作（{not_moved} 条记录对应的文件未被移动）")
 
 
 if __name__ == "__main__":
-    import sys
-
     print("===start===")
 
     if '--undo' in sys.argv:
         print("\n正在撤销最近一次合并操作...")
         undo_merge()
         print("\n撤销操作完成！")
+    elif '--dry-run' in sys.argv:
+        print("\n计算合并计划（不移动文件）...")
+        merge_folders(dry_run=True)
     else:
         print("\n开始合并分区文件...")
         merge_folders()
-        print("\n合并操作完成！使用 --undo 参数可撤销操作")
\ No newline at end of file
+        print("\n合并操作完成！使用 --undo 参数可撤销操作，--dry-run 只查看计划")
@@ -1,76 +1,170 @@
 import requests
 import time
 import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from 核心.并发抓取 import FetchEngine, DEFAULT_CONCURRENCY, DEFAULT_RATE_PER_HOST
+from 核心.http缓存 import HttpCache, CacheResult, atomic_write_bytes
+from 核心.目录库 import Catalog, DEFAULT_CATALOG_PATH
 
 download_base_url = "https://bkt-sgp-miui-ota-update-alisgp.oss-ap-southeast-1.aliyuncs.com"
+data_base_url = "https://data.hyperos.fans"
 
 file_path = "澎湃_全机型卡刷包链接.txt"
-output_lines = []
-
-def extract_device_codes_from_json(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        devices_data = response.json()
-        device_codes = []
-        for brand in devices_data:
-            if "devices" in devices_data[brand]:
-                for device in devices_data[brand]["devices"]:
-                    device_code = device.get("code")
-                    if device_code:
-                        device_codes.append(device_code)
-        return device_codes
-    else:
-        print("无法获取 JSON 数据，HTTP 状态码:", response.status_code)
-        return []
-
-def fetch_data_from_json(device_code, target_branch_name="小米澎湃 OS 正式版"):
-    url = f"https://data.hyperos.fans/devices/{device_code}.json"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        device_data = response.json()
-
-        # 解析 JSON 数据
-        device_name = device_data['name']['zh']
-
-        found_roms = False
-        for branch in device_data['branches']:
-            branch_name = branch['name']['zh']
-            if branch_name != target_branch_name:
-                continue  # 跳过非目标分支
-
-            found_roms = True
-
-            for rom_version, files in branch['roms'].items():
-                # 卡刷包 URL
-                recovery_url = files.get('recovery')
-                if recovery_url:
-                    recovery_package = f"{download_base_url}/{rom_version}/{recovery_url}"
-                    output_lines.append(f"设备: {device_name}, 版本: {rom_version}, 链接: {recovery_package}\n")
+# 本地 HTTP 缓存目录，保存 devices.json 和各设备 JSON 的校验信息与内容
+CACHE_DIR = ".http_cache"
+# 目录库路径，抓取到的卡刷包同时登记到目录库；设为 None 则不登记
+CATALOG_PATH = DEFAULT_CATALOG_PATH
+TARGET_BRANCH_NAME = "小米澎湃 OS 正式版"
 
-        if not found_roms:
-            output_lines.append(f"设备: {device_name}, 未找到目标分支的 ROM 数据。\n")
+# 并发设置：同时进行的请求数、每个主机每秒最多请求数
+CONCURRENCY = DEFAULT_CONCURRENCY
+RATE_PER_HOST = DEFAULT_RATE_PER_HOST
 
-        return True
 
+def fetch_or_cached(engine, cache, url):
+    """条件请求 url；请求失败时退回上次缓存的响应体（视为没有变化），没有缓存时抛出原来的异常"""
+    try:
+        return cache.fetch(engine, url)
     except requests.RequestException as e:
-        print(f"设备代号 {device_code} 请求失败: {e}")
-        return False
+        _, body = cache.load(url)
+        if body is None:
+            raise
+        print(f"请求失败，使用缓存的内容：{url}（{e}）")
+        return CacheResult(body, False, body)
 
-devices_url = "https://data.hyperos.fans/devices.json"
 
-device_codes = extract_device_codes_from_json(devices_url)
-print("提取到的设备代号数量：", len(device_codes))
+def extract_device_codes_from_json(engine, cache, url):
+    """返回 devices.json 中的设备代号列表；请求失败且没有缓存、或内容不是有效的 JSON 时返回 None"""
+    try:
+        devices_data = json.loads(fetch_or_cached(engine, cache, url).body)
+    except (requests.RequestException, ValueError) as e:
+        print("无法获取 JSON 数据:", e)
+        return None
+
+    device_codes = []
+    for brand in devices_data:
+        if "devices" in devices_data[brand]:
+            for device in devices_data[brand]["devices"]:
+                device_code = device.get("code")
+                if device_code:
+                    device_codes.append(device_code)
+    return device_codes
+
+
+def find_target_roms(device_data, target_branch_name):
+    """返回目标分支的 ROM 字典，没有目标分支时返回 None"""
+    for branch in device_data['branches']:
+        if branch['name']['zh'] == target_branch_name:
+            return branch['roms']
+    return None
+
+
+def fetch_data_from_json(engine, cache, device_code, target_branch_name=TARGET_BRANCH_NAME, base_url=data_base_url):
+    """
+    获取单个设备的卡刷包链接。
+    返回 (输出行列表, 相比上次新增的 ROM 版本列表, 卡刷包列表)；请求失败时使用缓存的内容，没有缓存时返回 None。
+    卡刷包列表的每一项为 (设备名称, 版本, 链接, 设备代号)。
+    """
+    url = f"{base_url}/devices/{device_code}.json"
+    try:
+        result = fetch_or_cached(engine, cache, url)
+        device_data = json.loads(result.body)
 
-start_time = time.time()
-for device_code in device_codes:
-    fetch_data_from_json(device_code)
-end_time = time.time()
+        # 解析 JSON 数据
+        device_name = device_data['name']['zh']
+        lines = []
+        packages = []
+
+        roms = find_target_roms(device_data, target_branch_name)
+        if roms is None:
+            lines.append(f"设备: {device_name}, 未找到目标分支的 ROM 数据。\n")
+            return lines, [], packages
+
+        for rom_version, files in roms.items():
+            # 卡刷包 URL
+            recovery_url = files.get('recovery')
+            if recovery_url:
+                recovery_package = f"{download_base_url}/{rom_version}/{recovery_url}"
+                lines.append(f"设备: {device_name}, 版本: {rom_version}, 链接: {recovery_package}\n")
+                packages.append((device_name, rom_version, recovery_package, device_code))
+
+        # 与上次缓存的内容比较，找出新增的 ROM 版本（首次抓取不算新增）
+        new_versions = []
+        if result.changed and result.previous is not None:
+            old_roms = find_target_roms(json.loads(result.previous), target_branch_name) or {}
+            new_versions = [v for v in roms if v not in old_roms]
+
+        return lines, new_versions, packages
+
+    except (requests.RequestException, ValueError, KeyError) as e:
+        print(f"设备代号 {device_code} 请求失败: {e}")
+        return None
+
+
+def update_device_list(output_path=file_path, base_url=data_base_url, cache_dir=CACHE_DIR,
+                       concurrency=CONCURRENCY, rate_per_host=RATE_PER_HOST, catalog_path=CATALOG_PATH,
+                       on_packages=None):
+    """
+    并发、增量地抓取全部设备的卡刷包链接，输出顺序与 devices.json 一致。
+    on_packages 不为 None 时，每抓取完一个设备就在抓取线程中以该设备的卡刷包列表调用一次，
+    下游阶段（python -m 核心 all 中的 hyper 爬取）不必等整个列表写完。
+    devices.json 既无法获取也没有缓存时不改动设备列表和目录库，返回 None。
+    """
+    cache = HttpCache(cache_dir)
+
+    def fetch(device_code):
+        result = fetch_data_from_json(engine, cache, device_code, base_url=base_url)
+        if result is not None and on_packages:
+            on_packages(result[2])
+        return result
+
+    with FetchEngine(concurrency=concurrency, rate_per_host=rate_per_host) as engine:
+        start_time = time.time()
+        device_codes = extract_device_codes_from_json(engine, cache, f"{base_url}/devices.json")
+        if device_codes is None:
+            print(f"没有获取到设备代号，保留原有的设备列表：{os.path.abspath(output_path)}")
+            return None
+        print("提取到的设备代号数量：", len(device_codes))
+
+        results = engine.map(fetch, device_codes)
+        end_time = time.time()
+
+    output_lines = []
+    packages = []
+    for device_code, result in zip(device_codes, results):
+        if result is None:
+            continue
+        lines, new_versions, device_packages = result
+        output_lines.extend(lines)
+        packages.extend(device_packages)
+        if new_versions:
+            print(f"新版本：{device_code} -> {', '.join(new_versions)}")
+
+    # 内容没有变化时不重写文件
+    content = "".join(output_lines).encode("utf-8")
+    try:
+        with open(output_path, 'rb') as file:
+            unchanged = file.read() == content
+    except OSError:
+        unchanged = False
+    if unchanged:
+        print(f"设备列表没有变化：{os.path.abspath(output_path)}")
+    else:
+        atomic_write_bytes(output_path, content)
+        print(f"输出已写入文件：{os.path.abspath(output_path)}")
 
+    if catalog_path:
+        with Catalog(catalog_path) as catalog:
+            catalog.upsert_packages(packages, source="hyper", branch=TARGET_BRANCH_NAME)
+        print(f"已登记到目录库：{len(packages)} 个卡刷包")
 
-with open(file_path, 'w', encoding='utf-8') as file:
-    file.writelines(output_lines)
+    print(f"缓存命中 {cache.hits} 次，下载 {cache.misses} 次，共 {cache.bytes_downloaded} 字节")
+    print(f"总耗时：{end_time - start_time:.2f} 秒")
+    return output_lines
 
 
-print(f"输出已写入文件：{os.path.abspath(file_path)}")
-print(f"总耗时：{end_time - start_time:.2f} 秒")
\ No newline at end of file
+if __name__ == "__main__":
+    update_device_list()
@@ -0,0 +1 @@
+"""小米boot库公共模块：更新、爬取、整理各阶段共用的组件"""
@@ -0,0 +1,6 @@
+"""python -m 核心：统一的命令行入口，见 核心/命令行.py"""
+import sys
+
+from .命令行 import main
+
+sys.exit(main())
@@ -0,0 +1,381 @@
+"""
+Android boot 镜像头解析（boot v0–v4、init_boot、vendor_boot v3/v4）。
+
+BootImageInspector 在提取时跟随写盘的数据流工作：写入函数每写一块就调用 feed(偏移, 数据)，
+检查器只保留镜像头、ramdisk 开头几个字节和文件末尾 64 字节，并在内核数据中查找
+"Linux version ..." 字符串（gzip 压缩的内核边解压边查找，找到即停止），不需要重新打开镜像文件。
+得到的头版本、内核版本、ramdisk 压缩格式、页大小、cmdline 和 AVB footer 写入目录库的 images 表：
+
+    python -m 核心.目录库 images --kernel 5.10 --gki
+    python -m 核心.目录库 images --ramdisk lz4_legacy --partition init_boot
+
+已经提取过的镜像（本功能之前的 boot库）可以补充登记（在项目根目录执行）：
+
+    python -m 核心.boot镜像 backfill
+    python -m 核心.boot镜像 inspect 某个/boot.img
+"""
+import argparse
+import os
+import re
+import struct
+import zlib
+from typing import NamedTuple
+
+from .目录库 import Catalog, DEFAULT_CATALOG_PATH
+from .压缩存储 import open_image
+
+try:
+    import lz4.block
+except ImportError:  # 只有 LZ4 压缩的内核需要，没有时不读取内核版本
+    lz4 = None
+
+BOOT_MAGIC = b"ANDROID!"
+VENDOR_BOOT_MAGIC = b"VNDRBOOT"
+AVB_FOOTER_MAGIC = b"AVBf"
+
+KIND_BOOT = "boot"
+KIND_INIT_BOOT = "init_boot"  # 没有内核、只有 ramdisk 的 v4 boot 镜像
+KIND_VENDOR_BOOT = "vendor_boot"
+
+HEAD_BYTES = 4096  # 所有版本的镜像头都在前 4096 字节内
+V3_PAGE_SIZE = 4096
+
+# boot v0–v2：magic, kernel_size, kernel_addr, ramdisk_size, ramdisk_addr, second_size, second_addr,
+# tags_addr, page_size, header_version, os_version, name, cmdline, id, extra_cmdline
+_BOOT_V0 = struct.Struct("<8s10I16s512s32s1024s")
+# boot v3/v4：magic, kernel_size, ramdisk_size, os_version, header_size, reserved[4], header_version, cmdline
+_BOOT_V3 = struct.Struct("<8s4I16sI1536s")
+# vendor_boot v3/v4：magic, header_version, page_size, kernel_addr, ramdisk_addr, vendor_ramdisk_size,
+# cmdline, tags_addr, name, header_size, dtb_size, dtb_addr
+_VENDOR_BOOT = struct.Struct("<8s5I2048sI16sIIQ")
+_HEADER_VERSION = struct.Struct("<I")
+_AVB_FOOTER = struct.Struct(">4sIIQQQ28x")
+
+# 压缩格式的魔数（ramdisk 与内核共用）
+_COMPRESSION_MAGICS = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\x02\x21\x4c\x18", "lz4_legacy"),
+    (b"\x04\x22\x4d\x18", "lz4"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"BZh", "bzip2"),
+    (b"\x5d\x00\x00", "lzma"),
+    (b"0707", "cpio"),  # 不压缩的 ramdisk
+)
+MAGIC_BYTES = 8
+
+_BANNER = b"Linux version "
+_BANNER_MAX = 512
+_LZ4_LEGACY_BLOCK = 8 << 20  # 内核 LZ4 legacy 格式每块解压后的最大长度
+
+
+class ImageInfo(NamedTuple):
+    kind: str
+    header_version: int
+    page_size: int
+    kernel_size: int
+    kernel_compression: str
+    kernel_release: str  # 例如 5.10.149-android12-9-00001-g0123abcd
+    kernel_banner: str
+    ramdisk_size: int
+    ramdisk_compression: str
+    os_version: str  # 例如 13.0.0
+    os_patch_level: str  # 例如 2023-05
+    cmdline: str
+    avb_version: str  # 没有 AVB footer 时为 None
+    avb_original_size: int
+    avb_vbmeta_offset: int
+    avb_vbmeta_size: int
+    size: int
+
+
+def compression_of(magic):
+    if not magic:
+        return None
+    for prefix, name in _COMPRESSION_MAGICS:
+        if magic.startswith(prefix):
+            return name
+    return "raw"
+
+
+def _align(value, page_size):
+    return (value + page_size - 1) // page_size * page_size
+
+
+def _text(raw):
+    return raw.split(b"\x00", 1)[0].decode("ascii", "replace").strip()
+
+
+def _os_version(value):
+    """把头中的 os_version 字段拆成 (Android 版本, 安全补丁月份)"""
+    if not value:
+        return None, None
+    version = f"{value >> 25 & 0x7f}.{value >> 18 & 0x7f}.{value >> 11 & 0x7f}"
+    year, month = 2000 + (value >> 4 & 0x7f), value & 0xf
+    return version, f"{year:04d}-{month:02d}" if month else None
+
+
+class _BannerSearch:
+    """在（解压后的）内核数据流中查找 "Linux version ..." 一行"""
+
+    def __init__(self):
+        self._buffer = b""
+        self.banner = None
+
+    def feed(self, data):
+        if self.banner is not None:
+            return
+        buffer = self._buffer + data
+        index = buffer.find(_BANNER)
+        if index < 0:
+            # 只保留可能是半个标记的结尾
+            self._buffer = buffer[-(len(_BANNER) - 1):]
+            return
+        line = buffer[index:index + _BANNER_MAX]
+        end = re.search(rb"[\x00\n]", line)
+        if end is None and len(line) < _BANNER_MAX:
+            self._buffer = buffer[index:]  # 这一行还没收完
+            return
+        self.banner = line[:end.start() if end else _BANNER_MAX].decode("ascii", "replace").strip()
+        self._buffer = b""
+
+
+class _KernelScanner:
+    """按内核的压缩格式边解压边查找版本字符串；不支持的格式直接放弃"""
+
+    def __init__(self, compression):
+        self.search = _BannerSearch()
+        self._pending = b""
+        self._stopped = False
+        if compression == "gzip":
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif compression == "lz4_legacy" and lz4 is not None:
+            self._decompressor = None
+            self._pending = None  # 等待跳过 4 字节魔数
+        elif compression == "raw":
+            self._decompressor = None
+        else:
+            self._stopped = True
+        self.compression = compression
+
+    @property
+    def done(self):
+        return self._stopped or self.search.banner is not None
+
+    def feed(self, data):
+        if self.done:
+            return
+        try:
+            if self.compression == "gzip":
+                self.search.feed(self._decompressor.decompress(data))
+                self._stopped = self._decompressor.eof
+            elif self.compression == "lz4_legacy":
+                self._feed_lz4_legacy(data)
+            else:
+                self.search.feed(data)
+        except (zlib.error, ValueError, RuntimeError):
+            # 数据损坏或不是预期的格式
+            self._stopped = True
+
+    def _feed_lz4_legacy(self, data):
+        # 格式：4 字节魔数，之后是若干 [4 字节小端长度][LZ4 块]
+        buffer = (self._pending or b"") + data
+        if self._pending is None:
+            buffer = buffer[4:]
+        while len(buffer) >= 4:
+            length = _HEADER_VERSION.unpack_from(buffer)[0]
+            if length == 0x184c2102:  # 下一段又是魔数（多段拼接）
+                buffer = buffer[4:]
+                continue
+            if len(buffer) < 4 + length:
+                break
+            self.search.feed(lz4.block.decompress(buffer[4:4 + length], uncompressed_size=_LZ4_LEGACY_BLOCK))
+            buffer = buffer[4 + length:]
+            if self.done:
+                break
+        self._pending = buffer
+
+
+class BootImageInspector:
+    """
+    跟随写盘数据流解析镜像头。feed(position, data) 按写入顺序调用（payload 的 extent 按目标位置排序，
+    通常就是顺序的），result(size) 在写完后返回 ImageInfo；一次也没有收到数据时返回 None。
+    """
+
+    def __init__(self):
+        self._head = bytearray()
+        self._parsed = False
+        self._info = {}
+        self._kernel_range = None  # (起始, 结束)
+        self._kernel = None  # _KernelScanner
+        self._kernel_head = b""
+        self._ramdisk_offset = None
+        self._ramdisk_magic = bytearray()
+        self._tail = b""
+        self._tail_end = 0
+        self._fed = False
+
+    def feed(self, position, data):
+        if not data:
+            return
+        self._fed = True
+        end = position + len(data)
+
+        # 文件末尾 64 字节（AVB footer）
+        if end >= self._tail_end:
+            if position == self._tail_end:
+                self._tail = (self._tail + bytes(data[-_AVB_FOOTER.size:]))[-_AVB_FOOTER.size:]
+            else:
+                self._tail = bytes(data[-_AVB_FOOTER.size:])
+            self._tail_end = end
+
+        if not self._parsed:
+            if position > len(self._head):
+                self._parsed = True  # 镜像头不是顺序写入的，放弃解析
+                return
+            self._head += data[len(self._head) - position:HEAD_BYTES - position]
+            if len(self._head) < HEAD_BYTES:
+                return
+            self._parse_head()
+            # 内核可能从 HEAD_BYTES 之前开始（页大小 2048），先处理已收到的镜像头部分
+            self._scan(0, bytes(self._head))
+            data = data[HEAD_BYTES - position:]
+            position = HEAD_BYTES
+        if data:
+            self._scan(position, data)
+
+    def _scan(self, position, data):
+        """处理镜像头之后的区域：ramdisk 开头的魔数，内核中的版本字符串"""
+        end = position + len(data)
+        if self._ramdisk_offset is not None:
+            self._capture(self._ramdisk_magic, self._ramdisk_offset, position, data)
+
+        if self._kernel_range and not (self._kernel and self._kernel.done):
+            start, stop = self._kernel_range
+            if position < stop and end > start:
+                piece = bytes(data[max(0, start - position):stop - position])
+                if self._kernel is None:
+                    if max(position, start) != start + len(self._kernel_head):
+                        self._kernel_range = None  # 内核数据不是顺序写入的，不查找版本
+                        return
+                    # 收到开头几个字节、确定压缩格式后再开始查找
+                    self._kernel_head += piece
+                    if len(self._kernel_head) < MAGIC_BYTES and end < stop:
+                        return
+                    self._kernel = _KernelScanner(compression_of(self._kernel_head[:MAGIC_BYTES]))
+                    piece, self._kernel_head = self._kernel_head, b""
+                self._kernel.feed(piece)
+
+    @staticmethod
+    def _capture(target, offset, position, data):
+        """把 [offset, offset + MAGIC_BYTES) 中落在这次数据里的部分追加到 target"""
+        want = offset + len(target)
+        if len(target) < MAGIC_BYTES and position <= want < position + len(data):
+            target += data[want - position:want - position + MAGIC_BYTES - len(target)]
+
+    def _parse_head(self):
+        self._parsed = True
+        head = bytes(self._head).ljust(HEAD_BYTES, b"\x00")  # 比 HEAD_BYTES 还小的镜像
+        if head.startswith(VENDOR_BOOT_MAGIC):
+            (_, version, page_size, _, _, ramdisk_size, cmdline, _, _, header_size, _, _) = \
+                _VENDOR_BOOT.unpack_from(head)
+            self._info = dict(kind=KIND_VENDOR_BOOT, header_version=version, page_size=page_size,
+                              ramdisk_size=ramdisk_size, cmdline=_text(cmdline))
+            if ramdisk_size and page_size:
+                self._ramdisk_offset = _align(header_size or _VENDOR_BOOT.size, page_size)
+            return
+        if not head.startswith(BOOT_MAGIC):
+            return
+
+        version = _HEADER_VERSION.unpack_from(head, 40)[0]
+        if version >= 3:
+            (_, kernel_size, ramdisk_size, os_version, _, _, _, cmdline) = _BOOT_V3.unpack_from(head)
+            page_size = V3_PAGE_SIZE
+        else:
+            fields = _BOOT_V0.unpack_from(head)
+            kernel_size, ramdisk_size, page_size, os_version = fields[1], fields[3], fields[8], fields[10]
+            cmdline = fields[12].split(b"\x00", 1)[0] + fields[14]
+            if page_size not in (2048, 4096, 8192, 16384):
+                return
+        android, patch_level = _os_version(os_version)
+        kind = KIND_INIT_BOOT if version >= 4 and not kernel_size and ramdisk_size else KIND_BOOT
+        self._info = dict(kind=kind, header_version=version, page_size=page_size, kernel_size=kernel_size,
+                          ramdisk_size=ramdisk_size, os_version=android, os_patch_level=patch_level,
+                          cmdline=_text(cmdline))
+        if kernel_size:
+            self._kernel_range = (page_size, page_size + kernel_size)
+        if ramdisk_size:
+            self._ramdisk_offset = page_size + _align(kernel_size, page_size)
+
+    def result(self, size):
+        if not self._fed:
+            return None
+        if not self._parsed and self._head:
+            self._parse_head()  # 镜像比 HEAD_BYTES 还小
+        info = dict.fromkeys(ImageInfo._fields)
+        info.update(self._info, size=size)
+        if self._ramdisk_offset is not None:
+            info["ramdisk_compression"] = compression_of(bytes(self._ramdisk_magic))
+        if self._kernel is not None:
+            info["kernel_compression"] = self._kernel.compression
+            banner = self._kernel.search.banner
+            if banner:
+                info["kernel_banner"] = banner
+                info["kernel_release"] = banner[len(_BANNER):].split(" ", 1)[0]
+        if self._tail_end == size and len(self._tail) == _AVB_FOOTER.size:
+            magic, major, minor, original_size, vbmeta_offset, vbmeta_size = _AVB_FOOTER.unpack(self._tail)
+            if magic == AVB_FOOTER_MAGIC:
+                info.update(avb_version=f"{major}.{minor}", avb_original_size=original_size,
+                            avb_vbmeta_offset=vbmeta_offset, avb_vbmeta_size=vbmeta_size)
+        return ImageInfo(**info)
+
+
+def inspect_file(path, chunk_size=1 << 20):
+    """解析已经在磁盘上的镜像（顺序读取整个文件，.img.zst 边读边解压）"""
+    inspector = BootImageInspector()
+    position = 0
+    with open_image(path) as f:
+        while chunk := f.read(chunk_size):
+            inspector.feed(position, chunk)
+            position += len(chunk)
+    return inspector.result(position)
+
+
+def backfill(catalog):
+    """为目录库中已有哈希、但还没有镜像信息的分区文件补充解析，返回 (解析数, 缺失文件数)"""
+    inspected = missing = 0
+    for sha256, output_path in catalog.images_missing():
+        if not output_path or not os.path.isfile(output_path):
+            missing += 1
+            continue
+        info = inspect_file(output_path)
+        if info:
+            catalog.record_image(sha256, info)
+            inspected += 1
+    return inspected, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="boot 镜像头解析")
+    parser.add_argument("--catalog", default=str(DEFAULT_CATALOG_PATH), help="目录库文件路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    inspect = subparsers.add_parser("inspect", help="解析镜像文件并打印结果")
+    inspect.add_argument("paths", nargs="+")
+    subparsers.add_parser("backfill", help="为目录库中已提取、尚未解析的镜像补充登记")
+    args = parser.parse_args()
+
+    if args.command == "inspect":
+        for path in args.paths:
+            info = inspect_file(path)
+            print(f"{path}：")
+            for key, value in (info._asdict() if info else {}).items():
+                if value is not None:
+                    print(f"  {key}: {value}")
+        return
+    with Catalog(args.catalog) as catalog:
+        inspected, missing = backfill(catalog)
+    print(f"补充解析 {inspected} 个镜像，{missing} 个文件已不存在")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+以 URL 为键的本地 HTTP 缓存。
+
+每个 URL 在缓存目录下保存两份文件：{sha256}.json 记录 ETag / Last-Modified 等校验信息，
+{sha256}.body 保存响应体。刷新时带上 If-None-Match / If-Modified-Since，
+服务器返回 304 时直接复用本地响应体，几乎不产生下载流量。
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+
+class CacheResult(NamedTuple):
+    body: bytes
+    changed: bool  # 与上次缓存的内容是否不同
+    previous: Optional[bytes]  # 上次缓存的响应体，没有缓存时为 None
+
+
+def atomic_write_bytes(path, data):
+    """先写临时文件再重命名，避免中断时留下半截文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class HttpCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # 统计：命中（304）次数、完整下载次数、下载的响应体字节数
+        self.hits = 0
+        self.misses = 0
+        self.bytes_downloaded = 0
+
+    def _entry_paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.body"
+
+    def load(self, url):
+        """读取缓存条目，返回 (校验信息, 响应体)，不存在时返回 (None, None)"""
+        meta_path, body_path = self._entry_paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def store(self, url, headers, body):
+        meta_path, body_path = self._entry_paths(url)
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+        # 先写响应体再写校验信息，校验信息存在即代表条目完整
+        atomic_write_bytes(body_path, body)
+        atomic_write_bytes(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    def fetch(self, engine, url):
+        """条件请求 url，失败时抛出 requests.RequestException"""
+        meta, cached_body = self.load(url)
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = engine.get(url, headers=headers)
+        if response.status_code == 304 and cached_body is not None:
+            with self._lock:
+                self.hits += 1
+            return CacheResult(cached_body, False, cached_body)
+
+        response.raise_for_status()
+        body = response.content
+        with self._lock:
+            self.misses += 1
+            self.bytes_downloaded += len(body)
+        # 内容不变但校验信息更新时也要保存，否则之后的条件请求一直带着旧的 ETag / Last-Modified
+        validators_changed = not meta or (meta.get("etag"), meta.get("last_modified")) != (
+            response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        if body != cached_body or validators_changed:
+            self.store(url, response.headers, body)
+        return CacheResult(body, body != cached_body, cached_body)
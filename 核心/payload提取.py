@@ -0,0 +1,270 @@
+"""
+进程内的 payload.bin 分区提取。
+
+卡刷包中的 payload.bin 以不压缩（STORED）方式存放，可以直接在 ZIP 中定位它的数据偏移；
+解析清单（manifest）后，只按需读取所请求分区的各个操作数据块，解压后写入目标文件。
+对 HttpFile 来说，这意味着只下载清单和所需分区的数据，不需要再启动 payload_dumper 进程。
+
+只支持全量包中出现的操作：REPLACE / REPLACE_BZ / REPLACE_XZ / ZSTD / ZERO / DISCARD。
+"""
+import bz2
+import hashlib
+import lzma
+import os
+import struct
+import time
+import zipfile
+from pathlib import Path
+
+import payload_dumper.update_metadata_pb2 as um
+
+from .提取 import WriteResult, CHUNK_SIZE, temp_path_for
+
+try:
+    import zstandard
+except ImportError:  # 只有 ZSTD 操作需要
+    zstandard = None
+
+PAYLOAD_MAGIC = b"CrAU"
+PAYLOAD_NAME = "payload.bin"
+
+# InstallOperation.Type，取值见 AOSP update_metadata.proto
+OP_REPLACE = 0
+OP_REPLACE_BZ = 1
+OP_ZERO = 6
+OP_DISCARD = 7
+OP_REPLACE_XZ = 8
+OP_ZSTD = 14
+
+_ZIP_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+
+
+class PayloadError(Exception):
+    pass
+
+
+class _ChunkReader:
+    """把数据块迭代器包装成 read() 接口，每次返回下一块（长度不固定），读完返回 b"" """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def read(self, size=-1):
+        return next(self._chunks, b"")
+
+
+def zip_member_data_offset(file, info):
+    """根据本地文件头计算 ZIP 成员数据在文件中的起始偏移"""
+    file.seek(info.header_offset)
+    header = file.read(_ZIP_LOCAL_HEADER.size)
+    if len(header) != _ZIP_LOCAL_HEADER.size or header[:4] != b"PK\x03\x04":
+        raise PayloadError(f"无效的本地文件头：{info.filename}")
+    fields = _ZIP_LOCAL_HEADER.unpack(header)
+    name_length, extra_length = fields[9], fields[10]
+    return info.header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length
+
+
+class PayloadReader:
+    """
+    在任意可 seek 的文件对象上读取 payload.bin，offset 为 payload.bin 在文件中的起始位置。
+    """
+
+    def __init__(self, file, offset=0):
+        self.file = file
+        self.offset = offset
+        self._parse_header()
+
+    @classmethod
+    def from_zip(cls, file, zip_file=None):
+        """在卡刷包 ZIP 中定位 payload.bin；zip_file 为已经打开的 ZipFile，可避免重复读取中央目录"""
+        z = zip_file or zipfile.ZipFile(file)
+        try:
+            info = z.getinfo(PAYLOAD_NAME)
+        except KeyError:
+            raise PayloadError("卡刷包中没有 payload.bin")
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise PayloadError("payload.bin 被压缩存放，无法按偏移读取")
+        return cls(file, zip_member_data_offset(file, info))
+
+    def _read(self, pos, size):
+        self.file.seek(self.offset + pos)
+        data = self.file.read(size)
+        if len(data) != size:
+            raise PayloadError(f"读取 payload.bin 数据不完整：偏移 {pos}，需要 {size}，实际 {len(data)}")
+        return data
+
+    def _parse_header(self):
+        header = self._read(0, 24)
+        magic, version, manifest_size, signature_size = struct.unpack(">4sQQI", header)
+        if magic != PAYLOAD_MAGIC:
+            raise PayloadError("payload.bin 魔数错误")
+        if version != 2:
+            raise PayloadError(f"不支持的 payload 版本：{version}")
+
+        self.manifest = um.DeltaArchiveManifest()
+        self.manifest.ParseFromString(self._read(24, manifest_size))
+        self.block_size = self.manifest.block_size
+        # 操作数据区紧跟在清单和清单签名之后
+        self.data_offset = 24 + manifest_size + signature_size
+        self.partitions = {p.partition_name: p for p in self.manifest.partitions}
+
+    def has_partition(self, name):
+        return name in self.partitions
+
+    def data_range(self, name):
+        """分区操作数据在 payload.bin 中的 (起始偏移, 总长度)"""
+        operations = [op for op in self.partitions[name].operations if op.data_length]
+        start = min((op.data_offset for op in operations), default=0)
+        return self.data_offset + start, sum(op.data_length for op in operations)
+
+    def sweep_order(self, names):
+        """请求的分区中存在的那些，按数据在 payload.bin 中的位置排序，依次提取时远程文件只向前读取"""
+        return sorted((name for name in names if name in self.partitions), key=lambda name: self.data_range(name)[0])
+
+    def _operation_data(self, op):
+        """读取并解压一个操作的数据；ZERO / DISCARD 返回 None"""
+        if op.type in (OP_ZERO, OP_DISCARD):
+            return None
+        data = self._read(self.data_offset + op.data_offset, op.data_length)
+        if op.type == OP_REPLACE:
+            return data
+        if op.type == OP_REPLACE_XZ:
+            return lzma.decompress(data)
+        if op.type == OP_REPLACE_BZ:
+            return bz2.decompress(data)
+        if op.type == OP_ZSTD:
+            if zstandard is None:
+                raise PayloadError("分区使用 zstd 压缩，需要安装 zstandard")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        raise PayloadError(f"不支持的操作类型 {op.type}（可能是增量包）")
+
+    def iter_partition(self, name):
+        """
+        按目标位置顺序产生分区数据，未覆盖的区域补零，总长度为清单中的分区大小。
+        全量包的 extent 互不重叠；遇到重叠的 extent 时抛出 PayloadError。
+        """
+        partition = self.partitions[name]
+        block_size = self.block_size
+        size = partition.new_partition_info.size
+        extents = []
+        for index, op in enumerate(partition.operations):
+            consumed = 0
+            for extent in op.dst_extents:
+                length = extent.num_blocks * block_size
+                extents.append((extent.start_block * block_size, length, index, consumed))
+                consumed += length
+        extents.sort()
+
+        def zeros(count):
+            while count > 0:
+                yield bytes(min(count, CHUNK_SIZE))
+                count -= CHUNK_SIZE
+
+        position = 0
+        cached_index, cached = None, None
+        for start, length, index, consumed in extents:
+            if start < position:
+                raise PayloadError(f"分区 {name} 的 extent 重叠，无法顺序提取")
+            if size and start >= size:
+                break
+            yield from zeros(start - position)
+            if size:
+                length = min(length, size - start)
+            if index != cached_index:
+                cached_index, cached = index, self._operation_data(partition.operations[index])
+            if cached is None:
+                yield from zeros(length)
+            else:
+                yield cached[consumed:consumed + length]
+            position = start + length
+        yield from zeros(size - position)
+
+    def extract(self, name, output_path, throttle=None, observer=None, writer=None):
+        """
+        提取分区到 output_path（先写临时文件再重命名），并校验清单中的分区哈希。
+        throttle(字节数) 在每次写盘前调用，用于限制写盘速度；observer(偏移, 数据) 在每次写盘后调用。
+        writer 为与 stream_to_file 参数相同的写入函数（例如压缩存储），指定时按顺序把分区数据交给它写入。
+        """
+        partition = self.partitions[name]
+        output_path = Path(output_path)
+        if writer is not None:
+            return self._extract_with(writer, name, output_path, throttle, observer)
+        block_size = self.block_size
+        size = partition.new_partition_info.size
+        # 按目标位置排序，通常就能顺序写入并同时计算哈希
+        operations = sorted(partition.operations,
+                            key=lambda op: op.dst_extents[0].start_block if op.dst_extents else 0)
+
+        tmp_path = temp_path_for(output_path)
+        digest = hashlib.sha256()
+        hashed = 0
+        write_seconds = 0.0
+        try:
+            with open(tmp_path, "x+b") as out:
+                for op in operations:
+                    data = self._operation_data(op)
+                    consumed = 0
+                    for extent in op.dst_extents:
+                        extent_start = extent.start_block * block_size
+                        length = extent.num_blocks * block_size
+                        # 按 CHUNK_SIZE 分段写入，ZERO / DISCARD 的大范围不会一次分配整段零字节
+                        for offset in range(0, length, CHUNK_SIZE):
+                            piece = min(CHUNK_SIZE, length - offset)
+                            if data is None:
+                                chunk = bytes(piece)
+                            else:
+                                chunk = data[consumed + offset:consumed + offset + piece]
+                            position = extent_start + offset
+                            if throttle:
+                                throttle(len(chunk))
+                            start = time.perf_counter()
+                            out.seek(position)
+                            out.write(chunk)
+                            write_seconds += time.perf_counter() - start
+                            if observer:
+                                observer(position, chunk)
+                            if position == hashed:
+                                digest.update(chunk)
+                                hashed += len(chunk)
+                        consumed += length
+                if size:
+                    out.truncate(size)
+                else:
+                    size = out.seek(0, os.SEEK_END)
+
+                if hashed != size:
+                    # 写入不连续或末尾被截断，重新读一遍计算哈希
+                    digest = hashlib.sha256()
+                    out.seek(0)
+                    while chunk := out.read(CHUNK_SIZE):
+                        digest.update(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+
+            expected = partition.new_partition_info.hash
+            if expected and digest.digest() != expected:
+                raise PayloadError(f"分区 {name} 哈希校验失败")
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return WriteResult(output_path, size, digest.hexdigest(), write_seconds=write_seconds)
+
+    def _extract_with(self, writer, name, output_path, throttle, observer):
+        tmp_path = temp_path_for(output_path)
+        try:
+            result = writer(_ChunkReader(self.iter_partition(name)), tmp_path, throttle=throttle, observer=observer)
+            expected = self.partitions[name].new_partition_info.hash
+            if expected and result.sha256 != expected.hex():
+                raise PayloadError(f"分区 {name} 哈希校验失败")
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return result._replace(path=output_path)
@@ -0,0 +1,48 @@
+"""
+要提取的分区列表与卡刷包中分区的定位。
+
+分区列表来自爬取脚本的 DEFAULT_PARTITIONS 或命令行 --partitions（boot,init_boot,vendor_boot,dtbo,vbmeta ...）。
+ZIP 卡刷包只遍历一次中央目录，建立 分区 -> 成员 的索引，再按成员在文件中的偏移顺序提取，
+对远程文件来说是一次向前的顺序扫描；多提取一个分区只多下载它本身的数据。
+payload.bin 的对应逻辑见 PayloadReader.sweep_order。
+"""
+import posixpath
+
+IMAGE_SUFFIX = ".img"
+
+
+def parse_partitions(text):
+    """把 "boot, init_boot,boot" 这样的参数解析成去重且保持顺序的分区元组"""
+    partitions = []
+    for name in text.split(","):
+        name = name.strip()
+        if name.endswith(IMAGE_SUFFIX):
+            name = name[:-len(IMAGE_SUFFIX)]
+        if name and name not in partitions:
+            partitions.append(name)
+    if not partitions:
+        raise ValueError(f"无效的分区列表：{text!r}")
+    return tuple(partitions)
+
+
+def add_partition_arguments(parser, default):
+    parser.add_argument("--partitions", default=default,
+                        help=f"要提取的分区，逗号分隔（默认 {default}），例如 boot,init_boot,vendor_boot,dtbo,vbmeta")
+
+
+def zip_partition_index(z, partitions):
+    """
+    一次遍历 ZIP 中央目录，返回 [(分区, ZipInfo)]，按成员在文件中的偏移排序。
+    成员的文件名（不含目录）必须正好是 "分区.img"，boot 不会再匹配到 vendor_boot.img、init_boot.img；
+    同一分区在多个目录中出现时取层级最浅的一个。
+    """
+    wanted = {f"{partition}{IMAGE_SUFFIX}": partition for partition in partitions}
+    found = {}
+    for info in z.infolist():
+        partition = wanted.get(posixpath.basename(info.filename))
+        if partition is None or info.is_dir():
+            continue
+        current = found.get(partition)
+        if current is None or info.filename.count("/") < current.filename.count("/"):
+            found[partition] = info
+    return sorted(found.items(), key=lambda item: item[1].header_offset)
@@ -0,0 +1,294 @@
+"""
+多个 worker（同一台或多台机器）分担同一个设备列表。
+
+两种方式：
+- 静态分片（--shard 2/4）：按链接或设备名的哈希把列表确定地切成 N 份，worker 之间不需要通信，适合多台机器；
+- 租约队列（--queue 路径）：所有 worker 把列表登记到同一个 SQLite 队列，逐个领取带租约的任务，
+  worker 在运行期间定时续约；崩溃的 worker 不再续约，租约过期后任务被其他 worker 领走。
+  同一任务的租约过期 max_attempts 次（每次都让 worker 崩溃）后不再分配，记为死信。
+  SQLite 需要所有 worker 能访问同一个本地文件，不要放在网络文件系统上。
+
+每个 worker 在自己的子目录（shard-2of4 或 worker-<id>）中输出镜像、处理记录和死信列表，
+结束后合并（在项目根目录执行）：
+
+    python -m 核心.分片 merge --target 输出目录 输出目录/shard-*
+    python -m 核心.分片 status --queue 队列.sqlite3
+"""
+import argparse
+import filecmp
+import hashlib
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from .处理记录 import ResumeJournal, iter_journal, STATUS_FAILED, STATUS_DEAD_LETTER
+from .设备列表 import DeviceRecord
+from .目录库 import Catalog, DEFAULT_CATALOG_PATH
+
+SHARD_KEYS = ("url", "device")
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+
+# 分片目录中的记录文件，与爬取脚本中的常量一致
+JOURNAL_NAME = "processed_urls.txt"
+DEAD_LETTER_NAME = "dead_letter.txt"
+
+_QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    url TEXT PRIMARY KEY,
+    device_name TEXT NOT NULL,
+    version TEXT,
+    device_code TEXT,
+    line_number INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs (owner, state);
+"""
+
+
+def shard_of(key, count):
+    """稳定的哈希分片（不受 PYTHONHASHSEED 影响，不同机器结果一致）"""
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+class ShardSpec(NamedTuple):
+    index: int  # 从 1 开始
+    count: int
+    key: str = "url"  # 按链接或按设备名分片；按设备分片时同一设备的卡刷包落在同一个 worker
+
+    @classmethod
+    def parse(cls, text, key="url"):
+        """解析 "2/4" 这样的参数"""
+        index, sep, count = text.partition("/")
+        if not sep or not index.isdigit() or not count.isdigit() or not 1 <= int(index) <= int(count):
+            raise ValueError(f"无效的分片参数：{text}（应为 序号/总数，例如 2/4）")
+        return cls(int(index), int(count), key)
+
+    @property
+    def name(self):
+        return f"shard-{self.index}of{self.count}"
+
+    def match(self, record):
+        key = record.url if self.key == "url" else record.device_name
+        return shard_of(key, self.count) == self.index - 1
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def add_shard_arguments(parser):
+    """给爬取脚本的命令行加上分片参数"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--shard", help="静态分片：只处理第 I 份（共 N 份），格式 I/N")
+    group.add_argument("--queue", help="租约队列模式：SQLite 队列文件路径，多个 worker 共用")
+    parser.add_argument("--shard-by", choices=SHARD_KEYS, default="url", help="静态分片的依据（默认按链接）")
+    parser.add_argument("--worker-id", help="租约队列模式下的 worker 标识（默认 主机名-进程号）")
+
+
+class LeaseQueue:
+    """基于 SQLite 的任务队列，领取任务即获得一段时间的租约"""
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = str(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # isolation_level=None：由下面的 BEGIN IMMEDIATE 显式控制事务
+        self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_QUEUE_SCHEMA)
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _transaction(self, func):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def enqueue(self, records, reset_failed=False):
+        """
+        登记任务，已有的任务保持原状态；返回新登记的数量。
+        reset_failed 为真时，已完成但状态为失败/死信的任务重新排队。
+        """
+        rows = [(r.url, r.device_name, r.version, r.device_code, r.line_number) for r in records]
+
+        def run(db):
+            before = db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            db.executemany("""
+                INSERT OR IGNORE INTO jobs (url, device_name, version, device_code, line_number)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            if reset_failed:
+                db.execute("UPDATE jobs SET state = 'pending', owner = NULL, attempts = 0 "
+                           "WHERE state = 'done' AND status IN (?, ?)", (STATUS_FAILED, STATUS_DEAD_LETTER))
+            return db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - before
+
+        return self._transaction(run)
+
+    def acquire(self, owner):
+        """领取一个待处理或租约已过期的任务，没有任务时返回 None"""
+        def run(db):
+            now = time.time()
+            # 已领取 max_attempts 次、租约仍然过期的任务多半会让 worker 崩溃，不再分配
+            db.execute("""
+                UPDATE jobs SET state = 'done', status = ?, owner = NULL, lease_expires = NULL
+                WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (STATUS_DEAD_LETTER, now, self.max_attempts))
+            row = db.execute("""
+                SELECT device_name, version, url, device_code, line_number FROM jobs
+                WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)
+                ORDER BY line_number LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                return None
+            record = DeviceRecord(*row)
+            db.execute("""
+                UPDATE jobs SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE url = ?
+            """, (owner, now + self.lease_seconds, record.url))
+            return record
+
+        return self._transaction(run)
+
+    def iter_leases(self, owner):
+        while (record := self.acquire(owner)) is not None:
+            yield record
+
+    def renew(self, owner):
+        return self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE owner = ? AND state = 'leased'",
+            (time.time() + self.lease_seconds, owner)).rowcount)
+
+    def complete(self, url, owner, status):
+        self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET state = 'done', status = ?, lease_expires = NULL WHERE url = ? AND owner = ?",
+            (status, url, owner)))
+
+    def release(self, owner):
+        """退出时把尚未完成的任务放回队列；正常退出不算一次失败的尝试"""
+        return self._transaction(lambda db: db.execute("""
+            UPDATE jobs SET state = 'pending', owner = NULL, lease_expires = NULL, attempts = MAX(attempts - 1, 0)
+            WHERE owner = ? AND state = 'leased'
+        """, (owner,)).rowcount)
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def start_heartbeat(self, owner):
+        """后台线程每隔租约时长的三分之一续约一次"""
+        def run():
+            while not self._stop.wait(self.lease_seconds / 3):
+                self.renew(owner)
+
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=run, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        if self._heartbeat:
+            self._stop.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def close(self):
+        self.stop_heartbeat()
+        self._db.close()
+
+
+def merge_shards(target_dir, shard_dirs, catalog=None):
+    """
+    把各分片目录中的镜像移动到 target_dir，处理记录和死信列表追加到 target_dir 中的对应文件。
+    同名文件内容相同时丢弃分片中的副本，不同时保留在分片目录中并报告。
+    """
+    target_dir = Path(target_dir)
+    moved = duplicates = conflicts = 0
+    with ResumeJournal(target_dir / JOURNAL_NAME) as journal:
+        for shard_dir in map(Path, shard_dirs):
+            for url, status in iter_journal(shard_dir / JOURNAL_NAME):
+                journal.record(url, status)
+            bookkeeping = {shard_dir / JOURNAL_NAME, shard_dir / DEAD_LETTER_NAME}
+            dead_letter = shard_dir / DEAD_LETTER_NAME
+            if dead_letter.exists():
+                with open(target_dir / DEAD_LETTER_NAME, "a", encoding="utf-8") as out:
+                    out.write(dead_letter.read_text(encoding="utf-8"))
+
+            for device_dir in sorted(p for p in shard_dir.iterdir() if p.is_dir()):
+                for src in sorted(p for p in device_dir.rglob("*") if p.is_file()):
+                    dst = target_dir / src.relative_to(shard_dir)
+                    if dst.exists():
+                        if filecmp.cmp(src, dst, shallow=False):
+                            src.unlink()
+                            duplicates += 1
+                        else:
+                            print(f"冲突：{dst} 已存在且内容不同，保留 {src}")
+                            conflicts += 1
+                        continue
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(str(src), str(dst))  # 同一文件系统时为重命名，硬链接保持不变
+                    if catalog:
+                        catalog.move_output(os.path.abspath(src), os.path.abspath(dst))
+                    moved += 1
+                # 删除已清空的子目录
+                for sub in sorted((p for p in device_dir.rglob("*") if p.is_dir()), reverse=True):
+                    if not any(sub.iterdir()):
+                        sub.rmdir()
+                if not any(device_dir.iterdir()):
+                    device_dir.rmdir()
+
+            for path in bookkeeping:
+                if path.exists():
+                    path.unlink()
+            if not any(shard_dir.iterdir()):
+                shard_dir.rmdir()
+            else:
+                print(f"分片目录中还有其他文件（运行指标或冲突文件），已保留：{shard_dir}")
+    return moved, duplicates, conflicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片爬取的合并与队列状态")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge = subparsers.add_parser("merge", help="把分片目录合并到输出目录")
+    merge.add_argument("shard_dirs", nargs="+", help="分片目录（shard-*of* 或 worker-*）")
+    merge.add_argument("--target", required=True, help="输出目录（运行爬取脚本的目录）")
+    merge.add_argument("--catalog", default=str(DEFAULT_CATALOG_PATH), help="目录库路径，存在时同步文件移动后的路径")
+    status = subparsers.add_parser("status", help="租约队列中各状态的任务数")
+    status.add_argument("--queue", required=True)
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        catalog = Catalog(args.catalog) if os.path.exists(args.catalog) else None
+        try:
+            moved, duplicates, conflicts = merge_shards(args.target, args.shard_dirs, catalog)
+        finally:
+            if catalog:
+                catalog.close()
+        print(f"合并完成：移动 {moved} 个文件，丢弃重复 {duplicates} 个，冲突 {conflicts} 个")
+    else:
+        queue = LeaseQueue(args.queue)
+        for state, count in sorted(queue.counts().items()):
+            print(f"{state}: {count}")
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
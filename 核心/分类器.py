@@ -0,0 +1,77 @@
+"""
+设备名称 -> (品牌, 系列) 的分类器。
+
+规则与 整理/分类.py 中 CONFIG['series_categories'] 的格式相同：每个品牌一组有序的 "系列: 正则"，
+按顺序第一个匹配的系列胜出，优先系列（默认 Pad系列）最先检查，都不匹配时归入兜底系列（其他）。
+
+每个品牌的全部规则预编译成一个正则：
+
+    ^(?:(?=.*?(?P<r0>规则0))|(?=.*?(?P<r1>规则1))|...)
+
+在字符串开头按顺序尝试各个前瞻分支，第一个成功的分支就是第一个匹配的规则，
+一次 match 即可得到与逐条 re.search 相同的结果。结果按设备名称缓存。
+"""
+import json
+import re
+
+DEFAULT_BRAND_PATTERNS = {"Redmi": r"^(Redmi|REDMI|红米)"}
+DEFAULT_BRAND = "小米"
+FALLBACK_SERIES = "其他"
+PRIORITY_SERIES = ("Pad系列",)
+
+
+class SeriesClassifier:
+    def __init__(self, series_categories, brand_patterns=None, default_brand=DEFAULT_BRAND,
+                 priority_series=PRIORITY_SERIES, fallback_series=FALLBACK_SERIES, flags=re.IGNORECASE):
+        self.default_brand = default_brand
+        self.fallback_series = fallback_series
+        self._brands = [(brand, re.compile(pattern, flags))
+                        for brand, pattern in (brand_patterns or DEFAULT_BRAND_PATTERNS).items()]
+        self._rules = {}  # 品牌 -> (编译后的正则, 分组名 -> 系列)
+        for brand, categories in series_categories.items():
+            ordered = [s for s in priority_series if s in categories]
+            ordered += [s for s in categories if s not in priority_series and s != fallback_series]
+            names = {f"r{i}": series for i, series in enumerate(ordered)}
+            branches = "|".join(f"(?=.*?(?P<r{i}>{categories[series]}))" for i, series in enumerate(ordered))
+            self._rules[brand] = (re.compile(f"^(?:{branches})", flags | re.DOTALL) if branches else None, names)
+        self._cache = {}
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        从 JSON 规则文件创建，格式：
+        {"series_categories": {...}, "brand_patterns": {...}, "default_brand": "小米"}
+        后两项可省略。
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+        return cls(rules["series_categories"], rules.get("brand_patterns"),
+                   rules.get("default_brand", DEFAULT_BRAND))
+
+    def brand_of(self, device_name):
+        for brand, pattern in self._brands:
+            if pattern.search(device_name):
+                return brand
+        return self.default_brand
+
+    def classify(self, device_name):
+        """返回 (品牌, 系列)"""
+        result = self._cache.get(device_name)
+        if result is None:
+            result = self._cache[device_name] = self._classify(device_name)
+        return result
+
+    def _classify(self, device_name):
+        brand = self.brand_of(device_name)
+        pattern, names = self._rules.get(brand, (None, {}))
+        match = pattern.match(device_name) if pattern else None
+        if match:
+            # 前瞻分支中只有一个命名分组参与了匹配
+            for name, value in match.groupdict().items():
+                if value is not None:
+                    return brand, names[name]
+        return brand, self.fallback_series
+
+    def classify_all(self, device_names):
+        """批量分类，返回 {设备名称: (品牌, 系列)}"""
+        return {name: self.classify(name) for name in device_names}
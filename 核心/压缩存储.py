@@ -0,0 +1,375 @@
+"""
+boot 库的压缩存储：镜像以 zstd 可随机访问格式（seekable format）保存为 *.img.zst。
+
+文件结构（与 zstd contrib/seekable_format 兼容，普通的 zstd -d 也能直接解压）：
+
+    [zstd 帧 1][zstd 帧 2]...[清单（skippable 帧）][跳转表（skippable 帧）]
+
+每帧独立压缩 frame_size 字节的原始数据，跳转表记录每帧压缩前后的大小，读取任意位置只需解压一帧。
+清单为 JSON，记录原始大小和 SHA-256（目录库、去重存储中的哈希都是原始镜像的哈希）。
+
+合并、分类脚本只按文件名移动文件和文件夹，压缩后的镜像照常处理。需要原始镜像时：
+
+    python -m 核心.压缩存储 export boot库/某设备/boot/V1_boot.img.zst 输出目录/
+    python -m 核心.压缩存储 export boot库 boot库_解压          # 整个目录
+    python -m 核心.压缩存储 info 文件.img.zst
+    python -m 核心.压缩存储 verify boot库
+"""
+import argparse
+import bisect
+import functools
+import hashlib
+import io
+import json
+import os
+import struct
+import time
+from pathlib import Path
+
+from .提取 import CHUNK_SIZE, WriteResult, stream_to_file, temp_path_for
+
+try:
+    import zstandard
+except ImportError:  # 只有压缩存储需要
+    zstandard = None
+
+ZSTD_SUFFIX = ".zst"
+DEFAULT_LEVEL = 3
+DEFAULT_FRAME_SIZE = 1 << 20  # 每帧的原始数据大小，也是随机读取的最小解压单位
+
+_SKIPPABLE_HEADER = struct.Struct("<II")  # 魔数，内容长度
+_MANIFEST_MAGIC = 0x184D2A50
+_SEEK_TABLE_MAGIC = 0x184D2A5E
+_SEEKABLE_MAGIC = 0x8F92EAB1
+_SEEK_ENTRY = struct.Struct("<II")  # 压缩后大小，原始大小（不带校验和）
+_SEEK_FOOTER = struct.Struct("<IBI")  # 帧数，描述符，魔数
+_CHECKSUM_FLAG = 0x80
+
+
+class CompressedImageError(Exception):
+    pass
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise CompressedImageError("压缩存储需要安装 zstandard")
+
+
+def is_compressed(path):
+    return str(path).endswith(ZSTD_SUFFIX)
+
+
+def compressed_path(path):
+    """原始镜像路径对应的压缩文件路径：V1_boot.img -> V1_boot.img.zst"""
+    return Path(f"{path}{ZSTD_SUFFIX}")
+
+
+def original_name(name):
+    return name[:-len(ZSTD_SUFFIX)] if is_compressed(name) else name
+
+
+class SeekableWriter:
+    """把顺序写入的数据按帧压缩到 file 中，close() 时写入清单和跳转表"""
+
+    def __init__(self, file, level=DEFAULT_LEVEL, frame_size=DEFAULT_FRAME_SIZE, throttle=None):
+        _require_zstandard()
+        self.file = file
+        self.frame_size = frame_size
+        self.throttle = throttle
+        self._compressor = zstandard.ZstdCompressor(level=level, write_content_size=True)
+        self._buffer = bytearray()
+        self._frames = []  # (压缩后大小, 原始大小)
+        self._digest = hashlib.sha256()
+        self.size = 0
+        self.compressed_size = 0
+        self.write_seconds = 0.0
+
+    def _emit(self, data):
+        if self.throttle:
+            self.throttle(len(data))
+        start = time.perf_counter()
+        self.file.write(data)
+        self.write_seconds += time.perf_counter() - start
+        self.compressed_size += len(data)
+
+    def _flush_frame(self, raw):
+        frame = self._compressor.compress(bytes(raw))
+        self._emit(frame)
+        self._frames.append((len(frame), len(raw)))
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.frame_size:
+            self._flush_frame(self._buffer[:self.frame_size])
+            del self._buffer[:self.frame_size]
+        return len(data)
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def close(self):
+        if self._buffer or not self._frames:
+            self._flush_frame(self._buffer)
+            self._buffer = bytearray()
+        manifest = json.dumps({"size": self.size, "sha256": self.sha256, "frame_size": self.frame_size}).encode()
+        self._emit(_SKIPPABLE_HEADER.pack(_MANIFEST_MAGIC, len(manifest)) + manifest)
+        entries = b"".join(_SEEK_ENTRY.pack(*frame) for frame in self._frames)
+        footer = _SEEK_FOOTER.pack(len(self._frames), 0, _SEEKABLE_MAGIC)
+        self._emit(_SKIPPABLE_HEADER.pack(_SEEK_TABLE_MAGIC, len(entries) + len(footer)) + entries + footer)
+
+
+def stream_to_compressed(src, output_path, chunk_size=CHUNK_SIZE, throttle=None, observer=None,
+                         level=DEFAULT_LEVEL, frame_size=DEFAULT_FRAME_SIZE):
+    """
+    与 stream_to_file 相同，但写入压缩文件。返回的大小和 SHA-256 是原始数据的；
+    throttle 按实际写盘的（压缩后）字节数调用，observer 收到的是原始数据。
+    """
+    output_path = Path(output_path)
+    tmp_path = temp_path_for(output_path)
+    try:
+        with open(tmp_path, "xb") as dest:
+            writer = SeekableWriter(dest, level, frame_size, throttle)
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                if observer:
+                    observer(writer.size, chunk)
+                writer.write(chunk)
+            writer.close()
+            dest.flush()
+            os.fsync(dest.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return WriteResult(output_path, writer.size, writer.sha256, write_seconds=writer.write_seconds)
+
+
+def compressed_writer(level=DEFAULT_LEVEL, frame_size=DEFAULT_FRAME_SIZE):
+    """与 stream_to_file 参数相同的写入函数，供去重存储和爬取脚本选择存储方式"""
+    _require_zstandard()
+    return functools.partial(stream_to_compressed, level=level, frame_size=frame_size)
+
+
+class CompressedImage(io.RawIOBase):
+    """以原始镜像的偏移随机读取 .img.zst，只解压用到的帧（缓存最近一帧）"""
+
+    def __init__(self, path):
+        _require_zstandard()
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._parse()
+        except BaseException:
+            self._file.close()
+            raise
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._cached_index = None
+        self._cached = b""
+        self.pos = 0
+
+    def _read_at(self, offset, size):
+        self._file.seek(offset)
+        data = self._file.read(size)
+        if len(data) != size:
+            raise CompressedImageError(f"文件不完整：{self.path}")
+        return data
+
+    def _parse(self):
+        file_size = self._file.seek(0, io.SEEK_END)
+        if file_size < _SKIPPABLE_HEADER.size + _SEEK_FOOTER.size:
+            raise CompressedImageError(f"不是可随机访问的 zstd 文件：{self.path}")
+        count, descriptor, magic = _SEEK_FOOTER.unpack(self._read_at(file_size - _SEEK_FOOTER.size, _SEEK_FOOTER.size))
+        if magic != _SEEKABLE_MAGIC:
+            raise CompressedImageError(f"不是可随机访问的 zstd 文件：{self.path}")
+        entry_size = _SEEK_ENTRY.size + (4 if descriptor & _CHECKSUM_FLAG else 0)
+        table_size = count * entry_size + _SEEK_FOOTER.size
+        table_start = file_size - table_size - _SKIPPABLE_HEADER.size
+        frame_magic, length = _SKIPPABLE_HEADER.unpack(self._read_at(table_start, _SKIPPABLE_HEADER.size))
+        if frame_magic != _SEEK_TABLE_MAGIC or length != table_size:
+            raise CompressedImageError(f"跳转表损坏：{self.path}")
+        table = self._read_at(table_start + _SKIPPABLE_HEADER.size, count * entry_size)
+
+        self._frame_offsets = []  # 每帧在压缩文件中的偏移
+        self._frame_sizes = []
+        self._starts = []  # 每帧在原始镜像中的起始偏移
+        offset = position = 0
+        for i in range(count):
+            compressed, size = _SEEK_ENTRY.unpack_from(table, i * entry_size)
+            self._frame_offsets.append(offset)
+            self._frame_sizes.append(compressed)
+            self._starts.append(position)
+            offset += compressed
+            position += size
+        self.size = position
+
+        # 清单紧跟在最后一帧之后（其他工具写的文件可能没有）
+        self.manifest = {"size": position, "sha256": None}
+        if offset + _SKIPPABLE_HEADER.size <= table_start:
+            frame_magic, length = _SKIPPABLE_HEADER.unpack(self._read_at(offset, _SKIPPABLE_HEADER.size))
+            if frame_magic == _MANIFEST_MAGIC:
+                self.manifest = json.loads(self._read_at(offset + _SKIPPABLE_HEADER.size, length))
+        self.sha256 = self.manifest.get("sha256")
+
+    @property
+    def frame_count(self):
+        return len(self._starts)
+
+    def _frame(self, index):
+        if index != self._cached_index:
+            data = self._read_at(self._frame_offsets[index], self._frame_sizes[index])
+            self._cached = self._decompressor.decompress(data)
+            self._cached_index = index
+        return self._cached
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = self.size + offset
+        else:
+            raise ValueError(f"无效的 whence：{whence}")
+        return self.pos
+
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        written = 0
+        while written < len(view) and self.pos < self.size:
+            index = bisect.bisect_right(self._starts, self.pos) - 1
+            frame = self._frame(index)
+            start = self.pos - self._starts[index]
+            piece = frame[start:start + len(view) - written]
+            if not piece:
+                raise CompressedImageError(f"帧 {index} 的数据比跳转表记录的短：{self.path}")
+            view[written:written + len(piece)] = piece
+            written += len(piece)
+            self.pos += len(piece)
+        return written
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+            self._cached = b""
+        super().close()
+
+
+def open_image(path):
+    """打开镜像（压缩或原始），返回可 seek 的二进制文件对象"""
+    return CompressedImage(path) if is_compressed(path) else open(path, "rb")
+
+
+def stored_size(path):
+    """镜像的原始大小；压缩文件读取清单，不解压"""
+    if is_compressed(path):
+        with CompressedImage(path) as image:
+            return image.size
+    return os.path.getsize(path)
+
+
+def export(src, dst):
+    """把压缩镜像解压到 dst（文件或已存在的目录），校验 SHA-256，返回 WriteResult"""
+    src, dst = Path(src), Path(dst)
+    if dst.is_dir():
+        dst = dst / original_name(src.name)
+    with CompressedImage(src) as image:
+        result = stream_to_file(io.BufferedReader(image, CHUNK_SIZE), dst)
+        if image.sha256 and result.sha256 != image.sha256:
+            os.remove(dst)
+            raise CompressedImageError(f"SHA-256 校验失败：{src}")
+    return result
+
+
+def export_tree(src_dir, dst_dir):
+    """把目录中的 .img.zst 解压到 dst_dir 中的相同位置，已存在的文件跳过；返回 (解压数, 跳过数)"""
+    exported = skipped = 0
+    for root, _, files in os.walk(src_dir):
+        for name in sorted(files):
+            if not is_compressed(name):
+                continue
+            target_dir = Path(dst_dir) / os.path.relpath(root, src_dir)
+            if (target_dir / original_name(name)).exists():
+                skipped += 1
+                continue
+            target_dir.mkdir(parents=True, exist_ok=True)
+            export(Path(root) / name, target_dir)
+            exported += 1
+    return exported, skipped
+
+
+def verify(path):
+    """完整解压一遍并核对清单中的大小和 SHA-256"""
+    digest = hashlib.sha256()
+    with CompressedImage(path) as image:
+        size = 0
+        while chunk := image.read(CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+        return size == image.manifest["size"] and image.sha256 in (None, digest.hexdigest())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压缩存储的镜像：解压导出、查看、校验")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="解压镜像文件或整个目录")
+    export_parser.add_argument("source", help=".img.zst 文件或目录")
+    export_parser.add_argument("target", help="输出文件或目录")
+    info = subparsers.add_parser("info", help="显示原始大小、压缩率和 SHA-256")
+    info.add_argument("paths", nargs="+")
+    verify_parser = subparsers.add_parser("verify", help="解压校验文件或目录中的全部 .img.zst")
+    verify_parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+    if zstandard is None:
+        parser.error("压缩存储需要安装 zstandard")
+
+    if args.command == "export":
+        if os.path.isdir(args.source):
+            exported, skipped = export_tree(args.source, args.target)
+            print(f"解压 {exported} 个镜像，跳过已存在的 {skipped} 个")
+        else:
+            result = export(args.source, args.target)
+            print(f"{result.path}（{result.size} 字节，sha256: {result.sha256}）")
+    elif args.command == "info":
+        for path in args.paths:
+            with CompressedImage(path) as image:
+                ratio = os.path.getsize(path) / image.size if image.size else 0
+                print(f"{path}：原始 {image.size} 字节，压缩后为 {ratio:.1%}，{image.frame_count} 帧，"
+                      f"sha256: {image.sha256}")
+    else:
+        bad = checked = 0
+        for path in args.paths:
+            files = ([Path(root) / name for root, _, names in os.walk(path) for name in names if is_compressed(name)]
+                     if os.path.isdir(path) else [Path(path)])
+            for file in files:
+                checked += 1
+                try:
+                    ok = verify(file)
+                except (CompressedImageError, zstandard.ZstdError) as e:
+                    ok = False
+                    print(f"损坏：{file}（{e}）")
+                else:
+                    if not ok:
+                        print(f"校验失败：{file}")
+                bad += not ok
+        print(f"校验 {checked} 个镜像，{bad} 个有问题")
+
+
+if __name__ == "__main__":
+    main()
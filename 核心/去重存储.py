@@ -0,0 +1,164 @@
+"""
+按 SHA-256 寻址的镜像去重存储。
+
+不同设备、不同版本的卡刷包经常带有完全相同的 boot.img / init_boot.img。
+每个镜像只在 objects/<前两位>/<sha256>.img 保存一份，设备目录中的
+{device}/{partition}/{version}_{partition}.img 是指向它的硬链接，合并、分类脚本移动这些文件和移动普通文件没有区别。
+对象库必须与输出目录在同一文件系统上（见 can_link），否则每个镜像会保存两份，爬取脚本此时不使用去重存储。
+
+payload 清单中带有分区的 SHA-256，库中已有该对象时直接建立链接，不再下载和写盘。
+ZIP 成员只有 CRC32 + 大小，index.sqlite3 记录"别名 -> SHA-256"，但 CRC32 会碰撞，别名只作提示：
+命中时仍下载并计算 SHA-256，一致才链接已有对象（省去写盘），不一致时照常写入。
+
+指定 compress_level 时对象以 zstd 压缩保存为 <sha256>.img.zst（见 核心.压缩存储），
+SHA-256 仍是原始镜像的哈希；设备目录中的链接也使用 .img.zst 文件名。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from .提取 import WriteResult, stream_to_file, temp_path_for, CHUNK_SIZE
+from .压缩存储 import compressed_writer, stored_size, ZSTD_SUFFIX
+
+
+def zip_member_alias(info):
+    return f"zip-crc32:{info.CRC:08x}:{info.file_size}"
+
+
+class BlobStore:
+    def __init__(self, root, compress_level=None):
+        self.root = Path(root)
+        self.compressed = compress_level is not None
+        self.writer = compressed_writer(compress_level) if self.compressed else stream_to_file
+        self.suffix = ".img" + ZSTD_SUFFIX if self.compressed else ".img"
+        self.objects_dir = self.root / "objects"
+        self.tmp_dir = self.root / "tmp"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / "index.sqlite3"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS aliases (alias TEXT PRIMARY KEY, sha256 TEXT NOT NULL)")
+        self._db.commit()
+        # 统计：复用的镜像数与因此省下的写盘字节数
+        self.reused = 0
+        self.bytes_saved = 0
+
+    def blob_path(self, sha256):
+        return self.objects_dir / sha256[:2] / f"{sha256}{self.suffix}"
+
+    def has(self, sha256):
+        return self.blob_path(sha256).exists()
+
+    def lookup(self, alias):
+        """按别名查找已保存的镜像，返回 SHA-256；镜像文件已不存在时返回 None"""
+        with self._lock:
+            row = self._db.execute("SELECT sha256 FROM aliases WHERE alias = ?", (alias,)).fetchone()
+        if row and self.has(row[0]):
+            return row[0]
+        return None
+
+    def add_alias(self, alias, sha256):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO aliases (alias, sha256) VALUES (?, ?)", (alias, sha256))
+            self._db.commit()
+
+    def _commit(self, tmp_path, sha256):
+        """把临时文件放入对象库；同样内容已存在时丢弃临时文件"""
+        blob = self.blob_path(sha256)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        # os.link 不会覆盖已有对象：两个 worker 同时提取相同内容时，后到的一方丢弃自己的副本，
+        # 先到的一方已经建立的硬链接仍指向库中的对象
+        try:
+            os.link(tmp_path, blob)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+        return True
+
+    def can_link(self, directory):
+        """能否从对象库硬链接到 directory（同一文件系统且支持硬链接）"""
+        probe = self.tmp_dir / f"link-probe-{os.getpid()}"
+        target = Path(directory) / f".link-probe-{os.getpid()}"
+        probe.touch()
+        try:
+            os.link(probe, target)
+        except OSError:
+            return False
+        else:
+            os.remove(target)
+            return True
+        finally:
+            os.remove(probe)
+
+    def link(self, sha256, output_path):
+        """在 output_path 建立指向对象的硬链接，已存在的同名文件会被原子替换"""
+        blob = self.blob_path(sha256)
+        output_path = Path(output_path)
+        try:
+            if os.path.samefile(blob, output_path):
+                return
+        except OSError:
+            pass
+        tmp_path = temp_path_for(output_path)
+        os.link(blob, tmp_path)
+        os.replace(tmp_path, output_path)
+
+    def _reuse(self, sha256, output_path):
+        self.link(sha256, output_path)
+        blob = self.blob_path(sha256)
+        size = stored_size(blob)  # 原始镜像大小
+        with self._lock:
+            self.reused += 1
+            self.bytes_saved += blob.stat().st_size
+        return WriteResult(Path(output_path), size, sha256, True)
+
+    def write_zip_member(self, z, name, output_path, throttle=None, observer=None):
+        """
+        提取 ZIP 成员。CRC32 + 大小命中已有对象时先只下载并计算 SHA-256，一致则直接链接、不写盘；
+        CRC32 碰撞（SHA-256 不一致）时重新读取并照常写入。throttle、observer 见 stream_to_file
+        """
+        info = z.getinfo(name)
+        alias = zip_member_alias(info)
+        candidate = self.lookup(alias)
+        if candidate:
+            digest = hashlib.sha256()
+            with z.open(info) as src:
+                position = 0
+                while chunk := src.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    if observer:
+                        observer(position, chunk)
+                    position += len(chunk)
+            if digest.hexdigest() == candidate and self.has(candidate):
+                return self._reuse(candidate, output_path)
+            if digest.hexdigest() != candidate:
+                print(f"去重存储：{name} 的 CRC32 与已有镜像相同但内容不同，照常写入")
+            observer = None  # observer 已经收到过完整内容
+
+        tmp_path = self.tmp_dir / temp_path_for(output_path).name
+        with z.open(info) as src:
+            result = self.writer(src, tmp_path, throttle=throttle, observer=observer)
+        self._commit(tmp_path, result.sha256)
+        self.add_alias(alias, result.sha256)
+        self.link(result.sha256, output_path)
+        return result._replace(path=Path(output_path))
+
+    def write_payload_partition(self, payload, name, output_path, throttle=None, observer=None):
+        """提取 payload.bin 中的分区；清单里的分区哈希已在库中时直接链接，不下载"""
+        expected = payload.partitions[name].new_partition_info.hash.hex()
+        if expected and self.has(expected):
+            return self._reuse(expected, output_path)
+
+        tmp_path = self.tmp_dir / temp_path_for(output_path).name
+        result = payload.extract(name, tmp_path, throttle=throttle, observer=observer,
+                                 writer=self.writer if self.compressed else None)
+        self._commit(tmp_path, result.sha256)
+        self.link(result.sha256, output_path)
+        return result._replace(path=Path(output_path))
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,220 @@
+"""
+统一的非交互命令行入口（在项目根目录执行）：
+
+    python -m 核心 update                       # 更新 HyperOS 设备列表
+    python -m 核心 crawl --source miui          # 爬取，其余参数与 开始搭建.py 相同（--partitions、--latest ...）
+    python -m 核心 crawl --source hyper --list 更新/澎湃_全机型卡刷包链接.txt --output-dir 爬取/hyper
+    python -m 核心 merge [--dry-run | --undo]
+    python -m 核心 classify [--move | --undo | --mapping 文件 | --clear-views | --dry-run]
+    python -m 核心 all                          # 以上全部，适合 cron 无人值守运行
+    python -m 核心 verify [目录 ...] [--full]      # 按提取时记录的哈希校验 boot 库，有问题时退出码为 1
+
+所有路径都有明确的默认值（相对项目根目录），不依赖当前目录，也不会等待输入。
+all 中各阶段重叠执行：update 每抓到一个设备的卡刷包就直接交给 hyper 爬取，miui 爬取同时进行；
+两个爬取都结束后再合并、更新分类视图。
+"""
+import argparse
+import importlib.util
+import itertools
+import threading
+from pathlib import Path
+
+from . import 校验
+from .流水线 import RecordChannel
+from .设备列表 import DeviceRecord
+
+ROOT = Path(__file__).resolve().parent.parent
+SOURCES = ("miui", "hyper")
+
+UPDATE_SCRIPT = ROOT / "更新" / "澎湃卡刷包更新-设备列表.py"
+HYPER_LIST = ROOT / "更新" / "澎湃_全机型卡刷包链接.txt"
+UPDATE_CACHE_DIR = ROOT / "更新" / ".http_cache"
+DEFAULT_LISTS = {"miui": ROOT / "设备列表" / "miui.txt", "hyper": HYPER_LIST}
+
+_scripts = {}
+
+
+def load_script(relative_path):
+    """按路径加载脚本（文件名不是合法的模块名），同一脚本只加载一次"""
+    path = ROOT / relative_path
+    module = _scripts.get(path)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(f"_script_{len(_scripts)}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _scripts[path] = module
+    return module
+
+
+def crawler(source):
+    return load_script(Path("爬取") / source / "开始搭建.py")
+
+
+def crawl_parser(source):
+    parser = argparse.ArgumentParser(prog=f"python -m 核心 crawl --source {source}",
+                                     description="从设备列表中的卡刷包提取分区镜像")
+    crawler(source).add_arguments(parser)
+    return parser
+
+
+def parse_crawl_args(source, argv):
+    """解析爬取参数，列表文件和输出目录默认使用项目中的固定位置"""
+    parser = crawl_parser(source)
+    args = parser.parse_args(argv)
+    args.list = args.list or str(DEFAULT_LISTS[source])
+    args.output_dir = args.output_dir or str(ROOT / "爬取" / source)
+    return args, parser
+
+
+def run_update(args, on_packages=None):
+    """返回退出码：没有获取到设备代号（设备列表未更新）时为 1"""
+    update = load_script(UPDATE_SCRIPT.relative_to(ROOT))
+    lines = update.update_device_list(output_path=args.output, cache_dir=args.cache_dir, concurrency=args.concurrency,
+                                      rate_per_host=args.rate_per_host, on_packages=on_packages)
+    return 0 if lines is not None else 1
+
+
+def run_merge(args):
+    merge = load_script(Path("整理") / "合并.py")
+    merge.CONFIG['undo_log'] = str(ROOT / "整理" / Path(merge.CONFIG['undo_log']).name)
+    if args.undo:
+        merge.undo_merge()
+    else:
+        merge.merge_folders(dry_run=args.dry_run)
+
+
+def run_classify(args):
+    classify = load_script(Path("整理") / "分类.py")
+    classify.CONFIG['undo_log'] = str(ROOT / "整理" / Path(classify.CONFIG['undo_log']).name)
+    if args.undo:
+        classify.undo_organization()
+    elif args.mapping:
+        classify.export_mapping(args.mapping)
+    elif args.move:
+        classify.organize_devices()
+    else:
+        classify.build_views(dry_run=args.dry_run, clear=args.clear_views)
+
+
+class _Stage(threading.Thread):
+    """在独立线程中运行的阶段，记录异常供主线程检查"""
+
+    def __init__(self, name, target):
+        super().__init__(name=name, daemon=True)
+        self._target_func = target
+        self.error = None
+
+    def run(self):
+        try:
+            self._target_func()
+        except BaseException as e:
+            self.error = e
+            print(f"阶段 {self.name} 失败：{type(e).__name__}: {e}")
+
+
+def run_all(args):
+    common = []
+    if args.crawl_concurrency:
+        common += ["--concurrency", str(args.crawl_concurrency)]
+    if args.partitions:
+        common += ["--partitions", args.partitions]
+    miui_args, miui_parser = parse_crawl_args("miui", common)
+    hyper_args, hyper_parser = parse_crawl_args("hyper", common)
+
+    stages = [_Stage("miui", lambda: crawler("miui").run(miui_args, miui_parser))]
+    if args.skip_update:
+        stages.append(_Stage("hyper", lambda: crawler("hyper").run(hyper_args, hyper_parser)))
+    else:
+        # update 每抓到一个设备就把它的卡刷包交给 hyper 爬取
+        channel = RecordChannel()
+        line_numbers = itertools.count(1)
+        lock = threading.Lock()
+
+        def on_packages(packages):
+            with lock:
+                for device_name, version, url, device_code in packages:
+                    channel.put(DeviceRecord(device_name, version, url, device_code, next(line_numbers)))
+
+        def update():
+            try:
+                if run_update(args, on_packages):
+                    raise RuntimeError("没有获取到设备列表")
+            finally:
+                channel.close()
+
+        stages.append(_Stage("update", update))
+        stages.append(_Stage("hyper", lambda: crawler("hyper").run(hyper_args, hyper_parser, records=channel)))
+
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join()
+    failed = [stage.name for stage in stages if stage.error]
+    if failed:
+        print(f"以下阶段失败，不执行合并和分类：{', '.join(failed)}")
+        return 1
+
+    run_merge(argparse.Namespace(undo=False, dry_run=False))
+    run_classify(argparse.Namespace(undo=False, mapping=None, move=False, dry_run=False, clear_views=False))
+    return 0
+
+
+def add_update_arguments(parser):
+    update = load_script(UPDATE_SCRIPT.relative_to(ROOT))
+    parser.add_argument("--output", default=str(HYPER_LIST), help="输出的设备列表文件")
+    parser.add_argument("--cache-dir", default=str(UPDATE_CACHE_DIR), help="HTTP 缓存目录")
+    parser.add_argument("--concurrency", type=int, default=update.CONCURRENCY, help="同时进行的请求数")
+    parser.add_argument("--rate-per-host", type=float, default=update.RATE_PER_HOST, help="每个主机每秒最多请求数")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m 核心", description="小米 boot 库：更新、爬取、合并、分类")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_update_arguments(subparsers.add_parser("update", help="更新 HyperOS 设备列表"))
+
+    # 其余参数交给爬取脚本解析（-h 查看）
+    crawl = subparsers.add_parser("crawl", help="从卡刷包提取分区镜像", add_help=False)
+    crawl.add_argument("--source", choices=SOURCES, required=True)
+
+    merge = subparsers.add_parser("merge", help="把 miui、hyper 的结果合并到 boot库")
+    group = merge.add_mutually_exclusive_group()
+    group.add_argument("--dry-run", action="store_true", help="只显示移动计划")
+    group.add_argument("--undo", action="store_true", help="撤销最近一次合并")
+
+    classify = subparsers.add_parser("classify", help="更新分类视图（或实际移动文件夹）")
+    group = classify.add_mutually_exclusive_group()
+    group.add_argument("--move", action="store_true", help="实际移动设备文件夹（旧方式）")
+    group.add_argument("--undo", action="store_true", help="撤销最近一次 --move")
+    group.add_argument("--mapping", metavar="文件", help="把全部设备的分类结果写入 JSON 文件")
+    group.add_argument("--clear-views", action="store_true", help="删除分类视图")
+    group.add_argument("--dry-run", action="store_true", help="只显示视图的变化")
+
+    校验.add_arguments(subparsers.add_parser("verify", help="校验 boot 库中镜像的完整性"))
+
+    run = subparsers.add_parser("all", help="更新、爬取（并行）、合并、分类")
+    add_update_arguments(run)
+    run.add_argument("--skip-update", action="store_true", help="不更新设备列表，直接使用已有的列表文件")
+    run.add_argument("--crawl-concurrency", type=int,
+                     help="每个爬取阶段同时处理的卡刷包数量")
+    run.add_argument("--partitions", help="要提取的分区，逗号分隔")
+
+    args, rest = parser.parse_known_args(argv)
+    if args.command == "crawl":
+        crawl_args, parser = parse_crawl_args(args.source, rest)
+        crawler(args.source).run(crawl_args, parser)
+        return 0
+    if rest:
+        parser.error(f"无法识别的参数：{' '.join(rest)}")
+
+    if args.command == "update":
+        return run_update(args)
+    elif args.command == "merge":
+        run_merge(args)
+    elif args.command == "classify":
+        run_classify(args)
+    elif args.command == "verify":
+        return 校验.run(args)
+    else:
+        return run_all(args)
+    return 0
@@ -0,0 +1,175 @@
+"""
+远程文件的块缓存层。
+
+HttpFile 每次 read() 都是一次 Range 请求，zipfile 读取目录、本地文件头时会发出大量零碎的小请求。
+CachedRangeFile 把读取按块对齐，用带字节上限的 LRU 缓存保存已下载的块；
+一次读取缺失的多个相邻块会合并成一个请求；检测到连续的顺序读取时预读后续的块，
+预读窗口从 1 块开始逐次翻倍，直到 readahead_blocks。
+指定 retry 时，读取中途断开或数据不完整只重新请求尚未收到的部分，不从头开始。
+指定 throttle 时每次向底层文件发出请求前调用 throttle(字节数)，由共享的带宽预算限制下载速度。
+"""
+import io
+import time
+from collections import OrderedDict
+
+from .重试 import TruncatedReadError, classify_error
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+DEFAULT_READAHEAD_BLOCKS = 16
+
+
+class CachedRangeFile(io.RawIOBase):
+    def __init__(self, raw, block_size=DEFAULT_BLOCK_SIZE, cache_bytes=DEFAULT_CACHE_BYTES,
+                 readahead_blocks=DEFAULT_READAHEAD_BLOCKS, retry=None, throttle=None):
+        self.raw = raw
+        self.retry = retry  # RetryPolicy，为 None 时不重试
+        self.throttle = throttle
+        self.block_size = block_size
+        self.cache_bytes = cache_bytes
+        self.readahead_blocks = readahead_blocks
+        self.size = raw.seek(0, io.SEEK_END)
+        self.pos = 0
+        self._blocks = OrderedDict()  # 块序号 -> 数据，按最近使用排序
+        self._cached = 0
+        self._next_block = None  # 上一次读取结束处的块序号，用于判断顺序读取
+        self._readahead = 0  # 当前预读窗口（块数）
+        # 统计：向底层文件发出的读取次数、下载字节数与重试次数
+        self.requests = 0
+        self.bytes_fetched = 0
+        self.retries = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = self.size + offset
+        else:
+            raise ValueError(f"无效的 whence：{whence}")
+        return self.pos
+
+    def stats(self):
+        return {"requests": self.requests, "bytes_fetched": self.bytes_fetched, "retries": self.retries}
+
+    def _raw_read(self, offset, length):
+        """从底层文件读取 [offset, offset + length)，底层一次没读满时从已收到的位置继续读"""
+        chunks = []
+        received = 0
+        attempt = 0
+        while received < length:
+            try:
+                if self.throttle:
+                    self.throttle(length - received)
+                self.raw.seek(offset + received)
+                data = self.raw.read(length - received)
+                if not data:
+                    raise TruncatedReadError(f"远程文件读取不完整：偏移 {offset + received}")
+            except Exception as e:
+                attempt += 1
+                if self.retry is None or classify_error(e) is None or attempt >= self.retry.max_attempts:
+                    if isinstance(e, TruncatedReadError):
+                        break
+                    raise
+                self.retries += 1
+                time.sleep(self.retry.delay(attempt))
+                continue
+            chunks.append(data)
+            received += len(data)
+            attempt = 0  # 有进展时重新计数
+        self.requests += 1
+        data = b"".join(chunks)
+        self.bytes_fetched += len(data)
+        return data
+
+    def _fetch_run(self, first, last):
+        """下载连续的块 [first, last]，只发一个请求"""
+        offset = first * self.block_size
+        data = self._raw_read(offset, min((last + 1) * self.block_size, self.size) - offset)
+        for index in range(first, last + 1):
+            start = (index - first) * self.block_size
+            block = data[start:start + self.block_size]
+            if not block:
+                break
+            self._blocks[index] = block
+            self._cached += len(block)
+
+    def _evict(self, keep):
+        while self._cached > self.cache_bytes and len(self._blocks) > len(keep):
+            index, block = self._blocks.popitem(last=False)
+            if index in keep:
+                self._blocks[index] = block  # 当前读取需要的块放回队尾
+                continue
+            self._cached -= len(block)
+
+    def _ensure(self, first, last):
+        """保证块 [first, last] 都在缓存中，缺失的相邻块合并下载"""
+        last_block = (self.size - 1) // self.block_size
+        if self._next_block is not None and first in (self._next_block - 1, self._next_block):
+            # 顺序读取：扩大预读窗口
+            self._readahead = min(max(1, self._readahead * 2), self.readahead_blocks)
+        else:
+            self._readahead = 0
+        fetch_last = min(last + self._readahead, last_block)
+
+        run_start = None
+        for index in range(first, fetch_last + 2):
+            missing = index <= fetch_last and index not in self._blocks
+            if missing and run_start is None:
+                run_start = index
+            elif not missing and run_start is not None:
+                self._fetch_run(run_start, index - 1)
+                run_start = None
+
+        for index in range(first, last + 1):
+            if index not in self._blocks:
+                raise TruncatedReadError(f"远程文件读取不完整：块 {index}")
+            self._blocks.move_to_end(index)
+        self._evict(keep=range(first, last + 1))
+        self._next_block = last + 1
+
+    def readinto(self, b):
+        length = min(len(b), self.size - self.pos)
+        if length <= 0:
+            return 0
+        view = memoryview(b).cast("B")
+
+        # 超过缓存一半的大块读取直接透传，避免把缓存整个冲掉
+        if length > self.cache_bytes // 2:
+            data = self._raw_read(self.pos, length)
+            if len(data) < length:
+                raise TruncatedReadError(f"远程文件读取不完整：偏移 {self.pos + len(data)}")
+            view[:len(data)] = data
+            self.pos += len(data)
+            self._next_block = None
+            self._readahead = 0
+            return len(data)
+
+        first = self.pos // self.block_size
+        last = (self.pos + length - 1) // self.block_size
+        self._ensure(first, last)
+
+        written = 0
+        for index in range(first, last + 1):
+            block = self._blocks[index]
+            start = self.pos + written - index * self.block_size
+            piece = block[start:start + length - written]
+            view[written:written + len(piece)] = piece
+            written += len(piece)
+        self.pos += written
+        return written
+
+    def close(self):
+        self._blocks.clear()
+        self._cached = 0
+        super().close()
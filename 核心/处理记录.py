@@ -0,0 +1,128 @@
+"""
+已处理链接的断点续传日志（processed_urls.txt）。
+
+启动时一次性读入内存，之后的查询都是 O(1) 的字典查找；新记录先缓存在内存中，
+按固定间隔批量追加并 fsync，日志中重复记录过多时原子地重写（压缩）整个文件。
+
+每行格式为 "状态<TAB>链接"，状态见下方常量；旧版本只写链接的行视为 ok。
+分片运行时每个 worker 写自己的日志，同时只读地加载主日志（base_paths），跳过已处理的链接。
+"""
+import os
+import threading
+import time
+
+STATUS_OK = "ok"  # 已提取到分区
+STATUS_NO_PARTITION = "no-partition"  # 卡刷包中没有需要的分区
+STATUS_FAILED = "failed"  # 暂时性错误重试用尽，下次运行会重试
+STATUS_DEAD_LETTER = "dead-letter"  # 永久性错误（404、无效 ZIP 等），只在 --retry-failed 时重试
+
+# 这些状态的链接下次运行时跳过
+DONE_STATUSES = (STATUS_OK, STATUS_NO_PARTITION, STATUS_DEAD_LETTER)
+
+DEFAULT_FLUSH_INTERVAL = 5.0  # 秒
+# 日志行数超过有效链接数的这个倍数时压缩
+COMPACT_RATIO = 2
+COMPACT_MIN_LINES = 1000
+
+
+def iter_journal(path):
+    """按顺序产出日志中的 (链接, 状态)，文件不存在时不产出"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            status, sep, url = line.partition("\t")
+            if not sep:
+                status, url = STATUS_OK, line
+            yield url, status
+
+
+class ResumeJournal:
+    def __init__(self, path, flush_interval=DEFAULT_FLUSH_INTERVAL, base_paths=()):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self._status = {}  # 链接 -> 最新状态
+        self._base = {}  # 只读加载的其他日志中的状态，本日志中的记录优先
+        self._pending = []
+        self._line_count = 0
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        for base_path in base_paths:
+            self._base.update(iter_journal(base_path))
+        self._load()
+        self._file = self._open_for_append()
+
+    def _load(self):
+        for url, status in iter_journal(self.path):
+            self._status[url] = status
+            self._line_count += 1
+
+    def _open_for_append(self):
+        file = open(self.path, "a+b")
+        # 上次崩溃可能留下没有换行符的半行，先补上换行，避免与新记录粘在一起
+        if file.tell() > 0:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                file.write(b"\n")
+        return file
+
+    def __contains__(self, url):
+        return url in self._status or url in self._base
+
+    def __len__(self):
+        return len(self._base.keys() | self._status.keys())
+
+    def status(self, url):
+        return self._status.get(url, self._base.get(url))
+
+    def is_done(self, url):
+        return self.status(url) in DONE_STATUSES
+
+    def urls_with_status(self, status):
+        return [url for url, s in {**self._base, **self._status}.items() if s == status]
+
+    def record(self, url, status=STATUS_OK):
+        with self._lock:
+            self._status[url] = status
+            self._pending.append(f"{status}\t{url}\n")
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._file.write("".join(self._pending).encode("utf-8"))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._line_count += len(self._pending)
+                self._pending.clear()
+            self._last_flush = time.monotonic()
+            if self._line_count >= COMPACT_MIN_LINES and self._line_count > COMPACT_RATIO * len(self._status):
+                self._compact()
+
+    def _compact(self):
+        """只保留每个链接的最新状态，写临时文件后原子替换"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+            for url, status in self._status.items():
+                f.write(f"{status}\t{url}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._line_count = len(self._status)
+        self._file = self._open_for_append()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,228 @@
+"""
+多个爬取进程共用的 I/O 预算：下载带宽和写盘速度各一个令牌桶（单位：字节/秒）。
+
+令牌桶的状态保存在一个 SQLite 文件中（与租约队列相同的做法），miui、hyper 两个爬取脚本
+无论在同一进程（python -m 核心 all）还是在不同窗口中运行，都从同一个桶中取令牌，合计速度不超过上限。
+上限可以在运行期间修改，正在运行的爬取在一秒内生效：
+
+    python -m 核心.带宽 set --download 40M --disk 100M   # 0 表示不限速
+    python -m 核心.带宽 show
+
+每个爬取进程有一个优先级（--io-priority，数值越大越优先，默认 hyper 高于 miui）。
+最近一秒内有更高优先级的进程在取令牌时，低优先级的进程只有在桶已满（链路空闲）时才能取到令牌，
+例如新的 HyperOS 卡刷包会先于 MIUI 旧版本的补爬下载。
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+DEFAULT_BUDGET_PATH = Path(__file__).resolve().parent.parent / "带宽预算.sqlite3"
+
+BUCKET_DOWNLOAD = "download"
+BUCKET_DISK = "disk"
+BUCKETS = (BUCKET_DOWNLOAD, BUCKET_DISK)
+
+BURST_SECONDS = 1.0  # 桶容量：一秒的流量
+DEMAND_WINDOW = 1.0  # 多久没有取令牌就不再算作"正在使用"
+RATE_REFRESH_SECONDS = 1.0  # 不限速时多久重新读取一次上限
+MIN_GRANT = 256 * 1024  # 每次从共享桶中至少取这么多，剩余的留在本进程，减少事务次数
+MAX_SLEEP = 0.25  # 单次等待上限，上限被调整后能尽快生效
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    rate REAL NOT NULL DEFAULT 0,
+    tokens REAL NOT NULL DEFAULT 0,
+    updated REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS demand (
+    name TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (name, owner)
+);
+"""
+
+_RATE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_rate(text):
+    """解析 "40M"、"1.5G"、"500K"、"0" 这样的速度（字节/秒，可带 /s 或 B），0 表示不限速"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?(?:/s)?\s*", text, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"无效的速度：{text!r}（例如 40M、1.5G、0）")
+    return float(match.group(1)) * _RATE_UNITS[match.group(2).upper()]
+
+
+def format_rate(rate):
+    return f"{rate / (1 << 20):.1f} MB/s" if rate else "不限速"
+
+
+class IOBudget:
+    """
+    共享令牌桶的一个使用者（一个爬取进程或 all 中的一个爬取阶段），可在多个线程中同时使用。
+    令牌可以透支：一次取走整个请求所需的量，余额为负时后来者等待，单个请求大于桶容量时也不会卡住。
+    """
+
+    def __init__(self, path=DEFAULT_BUDGET_PATH, priority=0, owner=None):
+        self.path = str(path)
+        self.priority = priority
+        self.owner = owner or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        # isolation_level=None：由 BEGIN IMMEDIATE 显式控制事务
+        self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._local = dict.fromkeys(BUCKETS, 0.0)  # 已从共享桶取出、尚未用掉的令牌
+        self._unlimited_until = dict.fromkeys(BUCKETS, 0.0)
+        # 统计：各桶的等待时间（秒）
+        self.waited = dict.fromkeys(BUCKETS, 0.0)
+
+    def _transaction(self, func):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def set_rate(self, name, rate):
+        """修改上限（字节/秒，0 为不限速），对所有使用这个文件的进程生效"""
+        now = time.time()
+        self._transaction(lambda db: db.execute("""
+            INSERT INTO buckets (name, rate, tokens, updated) VALUES (?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET rate = excluded.rate, tokens = MIN(tokens, excluded.tokens)
+        """, (name, rate, rate * BURST_SECONDS, now)))
+
+    def rates(self):
+        with self._lock:
+            rows = dict(self._db.execute("SELECT name, rate FROM buckets").fetchall())
+        return {name: rows.get(name, 0.0) for name in BUCKETS}
+
+    def active_users(self, window=DEMAND_WINDOW * 5):
+        """最近在取令牌的使用者：[(桶, 使用者, 优先级)]"""
+        with self._lock:
+            return self._db.execute("""
+                SELECT name, owner, priority FROM demand WHERE last_seen > ? ORDER BY name, priority DESC
+            """, (time.time() - window,)).fetchall()
+
+    def _take(self, name, amount):
+        """尝试从共享桶取 amount 个令牌，返回 (是否取到, 建议的等待秒数)；桶不限速时返回 (None, 0)"""
+        def run(db):
+            now = time.time()
+            row = db.execute("SELECT rate, tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            if row is None or row[0] <= 0:
+                return None, 0
+            rate, tokens, updated = row
+            burst = rate * BURST_SECONDS
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            db.execute("INSERT OR REPLACE INTO demand (name, owner, priority, last_seen) VALUES (?, ?, ?, ?)",
+                       (name, self.owner, self.priority, now))
+            higher = db.execute("""
+                SELECT 1 FROM demand WHERE name = ? AND priority > ? AND last_seen > ? LIMIT 1
+            """, (name, self.priority, now - DEMAND_WINDOW)).fetchone()
+            granted = tokens > 0 and (higher is None or tokens >= burst)
+            if granted:
+                tokens -= amount
+                wait = 0
+            elif tokens <= 0:
+                wait = -tokens / rate + 0.001
+            else:
+                # 有更高优先级的使用者：等它们用不完、桶重新满了再取
+                wait = (burst - tokens) / rate + 0.001
+            db.execute("UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?", (tokens, now, name))
+            return granted, wait
+
+        return self._transaction(run)
+
+    def acquire(self, name, nbytes):
+        """取得 nbytes 字节的额度，必要时阻塞；返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                if time.monotonic() < self._unlimited_until[name]:
+                    break
+                if self._local[name] >= nbytes:
+                    self._local[name] -= nbytes
+                    break
+                need = nbytes - self._local[name]
+            amount = max(need, MIN_GRANT)
+            granted, wait = self._take(name, amount)
+            if granted is None:
+                with self._lock:
+                    self._unlimited_until[name] = time.monotonic() + RATE_REFRESH_SECONDS
+                    self._local[name] = 0.0
+                break
+            if granted:
+                # 存入本进程的余额，回到循环开头扣除（其他线程可能同时在用余额）
+                with self._lock:
+                    self._local[name] += amount
+                continue
+            wait = min(wait, MAX_SLEEP)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            with self._lock:
+                self.waited[name] += waited
+        return waited
+
+    def throttle(self, name, on_wait=None):
+        """返回 take(nbytes) 函数，供块缓存、写盘函数在每次读写前调用；on_wait(秒) 在实际等待时调用"""
+        def take(nbytes):
+            waited = self.acquire(name, nbytes)
+            if waited and on_wait:
+                on_wait(waited)
+        return take
+
+    def close(self):
+        with self._lock:
+            self._db.execute("DELETE FROM demand WHERE owner = ?", (self.owner,))
+            self._db.close()
+
+
+def add_budget_arguments(parser, default_path, default_priority):
+    """给爬取脚本的命令行加上带宽预算参数"""
+    parser.add_argument("--io-budget", default=str(default_path) if default_path else "none",
+                        help="共享的带宽预算文件（设为 none 则不限速），上限用 python -m 核心.带宽 set 修改")
+    parser.add_argument("--io-priority", type=int, default=default_priority,
+                        help=f"带宽优先级，数值越大越优先（默认 {default_priority}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爬取脚本共用的下载带宽与写盘速度上限")
+    parser.add_argument("--budget", default=str(DEFAULT_BUDGET_PATH), help="带宽预算文件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    set_parser = subparsers.add_parser("set", help="修改上限，正在运行的爬取随即生效")
+    set_parser.add_argument("--download", help="下载带宽上限，例如 40M（0 为不限速）")
+    set_parser.add_argument("--disk", help="写盘速度上限，例如 100M（0 为不限速）")
+    subparsers.add_parser("show", help="显示当前上限和正在使用的进程")
+    args = parser.parse_args()
+
+    budget = IOBudget(args.budget)
+    try:
+        if args.command == "set":
+            for name, text in ((BUCKET_DOWNLOAD, args.download), (BUCKET_DISK, args.disk)):
+                if text is not None:
+                    try:
+                        budget.set_rate(name, parse_rate(text))
+                    except ValueError as e:
+                        parser.error(str(e))
+        for name, rate in budget.rates().items():
+            print(f"{name}: {format_rate(rate)}")
+        for name, owner, priority in budget.active_users():
+            print(f"  使用中：{name} {owner}（优先级 {priority}）")
+    finally:
+        budget.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+爬取流水线的分阶段计时与吞吐统计。
+
+各阶段（列表解析、元数据请求、ZIP 目录读取、分区提取、写盘、处理记录）的耗时记入固定分桶的直方图，
+同时统计下载与写入字节数、每个主机的下载速度、按状态计数的卡刷包和按原因计数的失败。
+运行期间定时打印一行进度，结束时导出 JSON / CSV，用于调整并发数和发现慢速镜像。
+"""
+import csv
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+STAGE_LIST_PARSE = "列表解析"
+STAGE_METADATA = "元数据请求"
+STAGE_ZIP_DIRECTORY = "ZIP目录读取"
+STAGE_PAYLOAD = "payload提取"
+STAGE_ZIP_EXTRACT = "ZIP成员提取"
+STAGE_DISK_WRITE = "写盘"
+STAGE_JOURNAL = "处理记录"
+STAGE_IO_WAIT = "带宽等待"
+
+# 直方图分桶上界（秒），最后一个桶收集超过 300 秒的观测值
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+DEFAULT_PROGRESS_INTERVAL = 30
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def observe(self, value):
+        index = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """按分桶估算分位数，返回所在桶的上界（最后一个桶返回最大值）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min or 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {("+Inf" if i == len(self.bounds) else str(self.bounds[i])): count
+                        for i, count in enumerate(self.buckets)},
+        }
+
+
+class Metrics:
+    """线程安全：worker 线程和事件循环都可以直接记录"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self.stages = {}  # 阶段名 -> Histogram
+        self.bytes_downloaded = 0
+        self.bytes_written = 0
+        self.packages = Counter()  # 处理状态 -> 卡刷包数量
+        self.failures = Counter()  # 失败原因 -> 次数
+        self.retries = Counter()  # 重试类别 -> 次数
+        self.hosts = {}  # 主机 -> {"packages", "bytes", "seconds"}
+        self._stop = threading.Event()
+        self._reporter = None
+
+    # ---- 记录 ----
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """计时一个代码块，抛出异常时同样记录耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def add_download(self, url, size, seconds):
+        """一个卡刷包的下载量与耗时，按主机汇总"""
+        host = urlparse(url).netloc or url
+        with self._lock:
+            self.bytes_downloaded += size
+            stats = self.hosts.setdefault(host, {"packages": 0, "bytes": 0, "seconds": 0.0})
+            stats["packages"] += 1
+            stats["bytes"] += size
+            stats["seconds"] += seconds
+
+    def add_written(self, size):
+        with self._lock:
+            self.bytes_written += size
+
+    def package_done(self, status):
+        with self._lock:
+            self.packages[status] += 1
+
+    def failure(self, reason):
+        with self._lock:
+            self.failures[reason] += 1
+
+    def retry(self, reason, count=1):
+        with self._lock:
+            self.retries[reason] += count
+
+    # ---- 汇总 ----
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def packages_per_minute(self):
+        elapsed = self.elapsed()
+        return sum(self.packages.values()) * 60 / elapsed if elapsed else 0.0
+
+    def progress_line(self):
+        with self._lock:
+            done = sum(self.packages.values())
+            failed = sum(self.failures.values())
+            retried = sum(self.retries.values())
+            downloaded, written = self.bytes_downloaded, self.bytes_written
+        return (f"进度：已处理 {done} 个卡刷包（失败 {failed} 次，重试 {retried} 次），{self.packages_per_minute():.1f} 个/分钟，"
+                f"下载 {downloaded / (1 << 20):.1f} MB，写入 {written / (1 << 20):.1f} MB，"
+                f"已运行 {self.elapsed():.0f} 秒")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "elapsed_seconds": self.elapsed(),
+                "packages": dict(self.packages),
+                "packages_per_minute": self.packages_per_minute(),
+                "bytes_downloaded": self.bytes_downloaded,
+                "bytes_written": self.bytes_written,
+                "failures": dict(self.failures),
+                "retries": dict(self.retries),
+                "stages": {name: histogram.to_dict() for name, histogram in self.stages.items()},
+                "hosts": {host: dict(stats, bytes_per_second=stats["bytes"] / stats["seconds"] if stats["seconds"] else 0.0)
+                          for host, stats in self.hosts.items()},
+            }
+
+    def report(self):
+        """结束时打印的多行摘要"""
+        data = self.snapshot()
+        lines = [self.progress_line().replace("进度", "汇总", 1)]
+        for name, stage in data["stages"].items():
+            lines.append(f"  {name}：{stage['count']} 次，平均 {stage['mean'] * 1000:.1f} ms，"
+                         f"p50 {stage['p50'] * 1000:.0f} ms，p95 {stage['p95'] * 1000:.0f} ms，"
+                         f"最大 {stage['max'] * 1000:.0f} ms")
+        for host, stats in sorted(data["hosts"].items(), key=lambda item: item[1]["bytes_per_second"]):
+            lines.append(f"  主机 {host}：{stats['packages']} 个卡刷包，{stats['bytes_per_second'] / (1 << 20):.2f} MB/s")
+        for reason, count in sorted(data["failures"].items(), key=lambda item: -item[1]):
+            lines.append(f"  失败原因 {reason}：{count} 次")
+        for reason, count in sorted(data["retries"].items(), key=lambda item: -item[1]):
+            lines.append(f"  重试 {reason}：{count} 次")
+        return "\n".join(lines)
+
+    # ---- 定时进度 ----
+
+    def start_reporter(self, interval=DEFAULT_PROGRESS_INTERVAL):
+        """在后台线程中每隔 interval 秒打印一行进度"""
+        def run():
+            while not self._stop.wait(interval):
+                print(self.progress_line())
+
+        self._stop.clear()
+        self._reporter = threading.Thread(target=run, name="metrics-reporter", daemon=True)
+        self._reporter.start()
+
+    def stop_reporter(self):
+        if self._reporter:
+            self._stop.set()
+            self._reporter.join()
+            self._reporter = None
+
+    # ---- 导出 ----
+
+    def export_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def export_csv(self, path):
+        """每行一个数值：kind, name, metric, value"""
+        data = self.snapshot()
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "name", "metric", "value"])
+            for metric in ("elapsed_seconds", "packages_per_minute", "bytes_downloaded", "bytes_written"):
+                writer.writerow(["run", "", metric, data[metric]])
+            for status, count in data["packages"].items():
+                writer.writerow(["package", status, "count", count])
+            for reason, count in data["failures"].items():
+                writer.writerow(["failure", reason, "count", count])
+            for reason, count in data["retries"].items():
+                writer.writerow(["retry", reason, "count", count])
+            for name, stage in data["stages"].items():
+                for metric, value in stage.items():
+                    if metric == "buckets":
+                        for bound, count in value.items():
+                            writer.writerow(["stage", name, f"le_{bound}", count])
+                    else:
+                        writer.writerow(["stage", name, metric, value])
+            for host, stats in data["hosts"].items():
+                for metric, value in stats.items():
+                    writer.writerow(["host", host, metric, value])
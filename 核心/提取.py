@@ -0,0 +1,66 @@
+"""
+分区镜像写盘。
+
+用固定大小的缓冲区把源文件（ZIP 成员、HttpFile 等）流式复制到磁盘，边写边计算 SHA-256；
+先写入同目录下的临时文件，完成后再重命名为目标文件名，中断时不会留下半截镜像。
+指定 throttle 时每写一块前调用 throttle(字节数)，由共享的带宽预算限制写盘速度；
+指定 observer 时每写一块后调用 observer(偏移, 数据)，例如边写边解析 boot 镜像头。
+内存占用只与缓冲区大小有关，与镜像大小无关。
+"""
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import NamedTuple
+
+CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+class WriteResult(NamedTuple):
+    path: Path
+    size: int
+    sha256: str
+    reused: bool = False  # 是否直接复用了去重存储中已有的镜像
+    write_seconds: float = 0.0  # 其中花在写盘上的时间
+
+
+def temp_path_for(output_path):
+    """与目标文件同目录的唯一临时文件名（普通 open 创建，权限遵循 umask）"""
+    output_path = Path(output_path)
+    return output_path.with_name(f".{output_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+
+
+def stream_to_file(src, output_path, chunk_size=CHUNK_SIZE, throttle=None, observer=None):
+    """把 src 的剩余内容写入 output_path，返回写入的大小和 SHA-256"""
+    output_path = Path(output_path)
+    tmp_path = temp_path_for(output_path)
+    digest = hashlib.sha256()
+    size = 0
+    write_seconds = 0.0
+    try:
+        with open(tmp_path, "xb") as dest:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                if throttle:
+                    throttle(len(chunk))
+                start = time.perf_counter()
+                dest.write(chunk)
+                write_seconds += time.perf_counter() - start
+                if observer:
+                    observer(size, chunk)
+                size += len(chunk)
+            # 先落盘再重命名，断电后不会出现名字正确、内容残缺的镜像
+            dest.flush()
+            os.fsync(dest.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return WriteResult(output_path, size, digest.hexdigest(), write_seconds=write_seconds)
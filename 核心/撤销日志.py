@@ -0,0 +1,58 @@
+"""
+整理脚本（合并、分类）的撤销日志。
+
+每次运行开始时新建日志（上一次运行的日志改名为 *.prev 保留），撤销只针对最近一次运行。
+运行中每条移动记录是一行 JSON，按批次追加并 fsync：先写日志、再执行这一批移动（预写日志），
+中途崩溃时日志中至少包含所有已经执行的移动，撤销时跳过实际没有执行的记录即可。
+旧版本一次性写出的 JSON 数组格式仍可读取。
+"""
+import json
+import os
+
+PREVIOUS_SUFFIX = ".prev"
+
+
+class UndoLog:
+    def __init__(self, path):
+        self.path = str(path)
+        self.count = 0
+        # 不追加到旧日志：否则撤销会连同更早的运行一起撤销，旧的 JSON 数组格式也会被追加成无法读取的文件
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + PREVIOUS_SUFFIX)
+        self._file = open(self.path, "wb")
+
+    def write_batch(self, entries):
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        if not data:
+            return
+        self._file.write(data.encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.count += len(entries)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_undo_log(path):
+    """读取撤销日志中的全部记录（按写入顺序），不完整的行被忽略"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    entries = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
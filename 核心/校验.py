@@ -0,0 +1,403 @@
+"""
+boot 库完整性校验：用提取时记录的哈希核对库中的每个镜像，发现截断、损坏、丢失的文件。
+
+    python -m 核心.校验                       # 校验 boot库 和 boot库_整理
+    python -m 核心.校验 boot库/某设备 --full    # 忽略缓存，全部重新计算
+
+校验依据（按顺序）：目录库中提取时计算的 SHA-256（以及预扫描记录的 payload 清单中的分区哈希，两者都有时都要一致）；
+目录库中没有记录的 .img.zst 使用文件清单中的 SHA-256；都没有的镜像记为"无记录"，不计算哈希。
+原始镜像的大小与记录不符时直接判为截断，不再计算哈希。
+
+哈希在进程池中计算，原始镜像通过 mmap 读取。每个文件的哈希按 (大小, 修改时间, inode) 缓存在 校验缓存.sqlite3 中，
+再次运行时只重新计算变化过的文件；合并脚本在同一文件系统内 rename 的文件 inode 不变，移动后也不用重新计算。
+分类视图中的符号链接目录不会重复校验，硬链接的多个路径只计算一次。
+还会报告目录库中有记录、但文件已不存在的镜像，以及中断的写入、移动留下的临时文件。有问题时退出码为 1。
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import NamedTuple
+
+from .提取 import CHUNK_SIZE
+from .压缩存储 import is_compressed, open_image
+from .目录库 import Catalog, DEFAULT_CATALOG_PATH
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_ROOTS = (ROOT / "boot库", ROOT / "boot库_整理")
+DEFAULT_CACHE_PATH = ROOT / "校验缓存.sqlite3"
+
+IMAGE_SUFFIX = ".img"
+HASH_BLOCK = 8 << 20  # mmap 中每次交给 sha256 的长度
+CACHE_BATCH = 200  # 每计算这么多个文件写一次缓存，中断后已完成的部分不用重算
+PROGRESS_INTERVAL = 10
+
+RESULT_OK = "一致"
+RESULT_MISMATCH = "哈希不符"
+RESULT_SIZE = "大小不符"
+RESULT_ERROR = "读取失败"
+RESULT_MISSING = "缺失"
+RESULT_LEFTOVER = "残留临时文件"
+RESULT_UNKNOWN = "无记录"
+PROBLEMS = (RESULT_MISMATCH, RESULT_SIZE, RESULT_ERROR, RESULT_MISSING, RESULT_LEFTOVER)
+
+# 提取（temp_path_for）和合并（_copy_move）的临时文件：.原文件名.8位十六进制.tmp
+_LEFTOVER_PATTERN = re.compile(r"^\..+\.[0-9a-f]{8}\.tmp$")
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    embedded_sha256 TEXT,
+    checked_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_files_inode ON files (device, inode);
+"""
+
+
+class FileEntry(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    device: int
+    inode: int
+
+
+class Hashed(NamedTuple):
+    sha256: str
+    embedded_sha256: str  # .img.zst 清单中的 SHA-256，原始镜像为 None
+
+
+class Expected(NamedTuple):
+    sha256: str  # 提取时计算的哈希
+    size: int
+    manifest_sha256: str  # payload 清单中的哈希
+    by_name: bool  # 路径已不一致，按文件名找到的记录
+
+
+class Finding(NamedTuple):
+    result: str
+    path: str
+    detail: str = ""
+
+
+def _norm(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def sha256_file(path):
+    """文件内容的哈希：原始镜像用 mmap 读取，.img.zst 解压后计算；返回 Hashed"""
+    digest = hashlib.sha256()
+    if is_compressed(path):
+        with open_image(path) as image:
+            while chunk := image.read(CHUNK_SIZE):
+                digest.update(chunk)
+            return Hashed(digest.hexdigest(), image.sha256)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mapped)
+                try:
+                    for start in range(0, len(view), HASH_BLOCK):
+                        digest.update(view[start:start + HASH_BLOCK])
+                finally:
+                    view.release()
+    return Hashed(digest.hexdigest(), None)
+
+
+def _hash_task(path):
+    """进程池中执行：返回 (路径, Hashed 或 None, 错误信息)"""
+    try:
+        return path, sha256_file(path), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+class HashCache:
+    """
+    文件哈希缓存：路径相同且大小、修改时间、inode 都没变，或者路径变了但同一 inode 的大小、修改时间没变
+    （同一文件系统内的移动），就认为内容没变
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._db = sqlite3.connect(self.path)
+        self._db.executescript(_CACHE_SCHEMA)
+        self._by_path = {}
+        self._by_inode = {}
+        for row in self._db.execute("SELECT path, size, mtime_ns, device, inode, sha256, embedded_sha256 FROM files"):
+            entry, hashed = FileEntry(*row[:5]), Hashed(*row[5:])
+            self._by_path[entry.path] = (entry, hashed)
+            self._by_inode[entry.device, entry.inode] = (entry, hashed)
+
+    def lookup(self, entry):
+        if self.is_current(entry):
+            return self._by_path[entry.path][1]
+        cached = self._by_inode.get((entry.device, entry.inode))
+        if cached and cached[0].size == entry.size and cached[0].mtime_ns == entry.mtime_ns:
+            return cached[1]
+        return None
+
+    def is_current(self, entry):
+        """缓存中已有这个路径的最新记录"""
+        cached = self._by_path.get(entry.path)
+        return cached is not None and cached[0] == entry
+
+    def store(self, items):
+        """items 为 (FileEntry, Hashed) 的序列"""
+        now = time.time()
+        self._db.executemany("""
+            INSERT OR REPLACE INTO files (path, size, mtime_ns, device, inode, sha256, embedded_sha256, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(*entry, *hashed, now) for entry, hashed in items])
+        self._db.commit()
+
+    def prune(self, roots, seen):
+        """删除 roots 下已不存在（本次没有遍历到）的文件的缓存"""
+        prefixes = [os.path.join(_norm(root), "") for root in roots]
+        stale = [(path,) for path in self._by_path
+                 if path not in seen and any(path.startswith(prefix) for prefix in prefixes)]
+        self._db.executemany("DELETE FROM files WHERE path = ?", stale)
+        self._db.commit()
+        return len(stale)
+
+    def close(self):
+        self._db.close()
+
+
+def scan(roots):
+    """
+    遍历镜像文件（*.img、*.img.zst），不进入符号链接的目录（分类视图）。
+    返回 ({(设备, inode): [FileEntry]}, [残留的临时文件])，硬链接的多个路径归为一组。
+    """
+    groups = defaultdict(list)
+    leftovers = []
+    for root in roots:
+        for directory, _, names in os.walk(root):
+            for name in sorted(names):
+                path = _norm(os.path.join(directory, name))
+                if _LEFTOVER_PATTERN.match(name):
+                    leftovers.append(path)
+                    continue
+                if not (name.endswith(IMAGE_SUFFIX) or is_compressed(name)):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # 指向不存在文件的符号链接
+                groups[st.st_dev, st.st_ino].append(FileEntry(path, st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino))
+    return groups, leftovers
+
+
+def load_expected(catalog):
+    """目录库中的校验依据：({规范化的输出路径: 行}, {文件名: [行]})"""
+    by_path = {}
+    by_name = defaultdict(list)
+    for row in catalog.recorded_hashes():
+        by_path[_norm(row[0])] = row
+        by_name[os.path.normcase(row[1])].append(row)
+    return by_path, by_name
+
+
+def expected_for(path, by_path, by_name):
+    """
+    路径对应的记录；路径不在目录库中（例如不经合并脚本移动过）时，文件名在目录库中唯一的也可以对应上。
+    """
+    row = by_path.get(path)
+    by_name_match = False
+    if row is None:
+        rows = by_name.get(os.path.basename(path), ())
+        if len(rows) != 1:
+            return None
+        row, by_name_match = rows[0], True
+    _, _, sha256, size, manifest_sha256 = row
+    if not sha256 and not manifest_sha256:
+        return None
+    return Expected(sha256, size, manifest_sha256, by_name_match)
+
+
+def judge(path, expected, hashed):
+    """比较计算出的哈希和记录，返回 Finding"""
+    note = "，按文件名对应目录库记录" if expected and expected.by_name else ""
+    if expected is None:
+        if hashed.embedded_sha256 is None:
+            return Finding(RESULT_UNKNOWN, path)
+        if hashed.sha256 != hashed.embedded_sha256:
+            return Finding(RESULT_MISMATCH, path, f"压缩文件清单 {hashed.embedded_sha256}，实际 {hashed.sha256}")
+        return Finding(RESULT_OK, path)
+    if expected.sha256 and hashed.sha256 != expected.sha256:
+        return Finding(RESULT_MISMATCH, path, f"提取时 {expected.sha256}，实际 {hashed.sha256}{note}")
+    if expected.manifest_sha256 and hashed.sha256 != expected.manifest_sha256:
+        return Finding(RESULT_MISMATCH, path, f"payload 清单 {expected.manifest_sha256}，实际 {hashed.sha256}{note}")
+    return Finding(RESULT_OK, path)
+
+
+class VerifyReport(NamedTuple):
+    findings: list
+    counts: Counter
+    files: int
+    cache_hits: int
+    hashed_files: int
+    hashed_bytes: int
+    seconds: float
+
+    @property
+    def problems(self):
+        return [finding for finding in self.findings if finding.result in PROBLEMS]
+
+
+def verify_library(roots, catalog=None, cache=None, workers=None, full=False):
+    """
+    校验 roots 下的全部镜像。catalog 为 None 时只能校验 .img.zst（对照文件清单）；
+    cache 为 HashCache 或 None，full=True 时忽略缓存中的哈希（仍然更新缓存）。
+    """
+    start = time.monotonic()
+    roots = [root for root in roots if os.path.isdir(root)]
+    groups, leftovers = scan(roots)
+    by_path, by_name = load_expected(catalog) if catalog else ({}, {})
+
+    findings = [Finding(RESULT_LEFTOVER, path) for path in leftovers]
+    done = {}  # (设备, inode) -> Hashed
+    pending = []  # 需要计算哈希的文件组
+    to_store = []  # 待写入缓存的 (FileEntry, Hashed)
+    for key, entries in groups.items():
+        entry = entries[0]
+        if not is_compressed(entry.path):
+            expected = [expected_for(item.path, by_path, by_name) for item in entries]
+            if not any(expected):
+                # 没有记录的原始镜像无从对照，不计算哈希
+                findings.extend(Finding(RESULT_UNKNOWN, item.path) for item in entries)
+                continue
+            wrong_size = [(item, exp) for item, exp in zip(entries, expected)
+                          if exp and exp.size is not None and exp.size != item.size]
+            if wrong_size:
+                findings.extend(Finding(RESULT_SIZE, item.path, f"记录 {exp.size} 字节，实际 {item.size} 字节")
+                                for item, exp in wrong_size)
+                continue
+        cached = None if full or cache is None else cache.lookup(entry)
+        if cached:
+            done[key] = cached
+            # 按 inode 命中（文件被移动过）时记下新路径
+            to_store.extend((item, cached) for item in entries if not cache.is_current(item))
+        else:
+            pending.append(key)
+
+    cache_hits = len(done)
+    hashed_bytes = 0
+    errors = {}
+    if pending:
+        # 大文件先算，避免最后只剩一个进程在算大文件
+        pending.sort(key=lambda key: groups[key][0].size, reverse=True)
+        total_bytes = sum(groups[key][0].size for key in pending)
+        last_report = time.monotonic()
+
+        def finish(key, hashed, error):
+            nonlocal hashed_bytes, last_report
+            hashed_bytes += groups[key][0].size
+            if error:
+                errors[key] = error
+                return
+            done[key] = hashed
+            if cache:
+                to_store.extend((item, hashed) for item in groups[key])
+                if len(to_store) >= CACHE_BATCH:
+                    cache.store(to_store)
+                    to_store.clear()
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                print(f"校验进度：{hashed_bytes / (1 << 30):.1f}/{total_bytes / (1 << 30):.1f} GB，"
+                      f"{len(done) - cache_hits + len(errors)}/{len(pending)} 个文件")
+
+        if workers == 1:
+            for key in pending:
+                finish(key, *_hash_task(groups[key][0].path)[1:])
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_hash_task, groups[key][0].path): key for key in pending}
+                for future in as_completed(futures):
+                    finish(futures[future], *future.result()[1:])
+    if cache and to_store:
+        cache.store(to_store)
+
+    for key, hashed in done.items():
+        for entry in groups[key]:
+            findings.append(judge(entry.path, expected_for(entry.path, by_path, by_name), hashed))
+    for key, error in errors.items():
+        findings.extend(Finding(RESULT_ERROR, entry.path, error) for entry in groups[key])
+
+    # 目录库中有记录、位于这些目录下、但已经不存在的文件（例如中断的移动）
+    scanned = {entry.path for entries in groups.values() for entry in entries}
+    scanned_names = defaultdict(list)
+    for path in scanned:
+        scanned_names[os.path.basename(path)].append(path)
+    prefixes = [os.path.join(_norm(root), "") for root in roots]
+    for path in by_path:
+        if path not in scanned and any(path.startswith(prefix) for prefix in prefixes) and not os.path.exists(path):
+            moved = scanned_names.get(os.path.basename(path))
+            findings.append(Finding(RESULT_MISSING, path, f"可能已移动到 {'、'.join(moved)}" if moved else ""))
+    if cache:
+        cache.prune(roots, scanned)
+
+    findings.sort(key=lambda finding: finding.path)
+    return VerifyReport(findings, Counter(finding.result for finding in findings), len(scanned), cache_hits,
+                        len(pending) - len(errors), hashed_bytes, time.monotonic() - start)
+
+
+def format_report(report):
+    lines = [f"{finding.result}：{finding.path}" + (f"（{finding.detail}）" if finding.detail else "")
+             for finding in report.problems]
+    rate = report.hashed_bytes / (1 << 20) / report.seconds if report.seconds else 0
+    lines.append(f"校验 {report.files} 个镜像，耗时 {report.seconds:.1f} 秒：缓存命中 {report.cache_hits} 组，"
+                 f"重新计算 {report.hashed_files} 组共 {report.hashed_bytes / (1 << 30):.2f} GB（{rate:.0f} MB/s）")
+    order = (RESULT_OK, *PROBLEMS, RESULT_UNKNOWN)
+    lines.append("结果：" + "，".join(f"{result} {report.counts[result]}" for result in order if report.counts[result]))
+    return "\n".join(lines)
+
+
+def add_arguments(parser):
+    parser.add_argument("paths", nargs="*", help=f"要校验的目录（默认 {'、'.join(root.name for root in DEFAULT_ROOTS)}）")
+    parser.add_argument("--catalog", default=str(DEFAULT_CATALOG_PATH), help="目录库文件")
+    parser.add_argument("--cache", default=str(DEFAULT_CACHE_PATH), help="哈希缓存文件（设为 none 则不使用缓存）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="计算哈希的进程数（默认 CPU 核数）")
+    parser.add_argument("--full", action="store_true", help="忽略缓存，重新计算全部文件的哈希")
+
+
+def run(args):
+    """按命令行参数校验并打印报告，有问题时返回 1"""
+    roots = args.paths or [str(root) for root in DEFAULT_ROOTS]
+    catalog = Catalog(args.catalog) if os.path.exists(args.catalog) else None
+    if catalog is None:
+        print(f"目录库不存在（{args.catalog}），只能校验 .img.zst")
+    cache = None if args.cache.lower() == "none" else HashCache(args.cache)
+    try:
+        report = verify_library(roots, catalog, cache, workers=args.workers, full=args.full)
+    finally:
+        if cache:
+            cache.close()
+        if catalog:
+            catalog.close()
+    print(format_report(report))
+    return 1 if report.problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按提取时记录的哈希校验 boot 库中的镜像")
+    add_arguments(parser)
+    return run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+有界队列 + 固定数量 worker 的异步处理流水线。
+
+生产者把设备列表中的记录依次放入有界队列，若干 worker 协程并发消费；
+阻塞的 ZIP / 子进程操作由 handler 通过 run_blocking 交给流水线自己的线程池执行，事件循环本身不被阻塞。
+普通（同步）可迭代对象在单独的线程中推进，读取列表文件或等待上游阶段（RecordChannel）时也不阻塞事件循环。
+"""
+import asyncio
+import contextvars
+import functools
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 4
+
+_STOP = object()
+
+# 当前流水线的线程池，worker 协程创建时继承
+_executor = contextvars.ContextVar("pipeline_executor", default=None)
+
+
+class RecordChannel:
+    """
+    在两个阶段之间传递记录的线程安全通道：上游在任意线程中 put，结束时 close；
+    下游按普通迭代器读取，读完上游 close 之前的全部记录后迭代结束。只支持一个消费者。
+    """
+
+    def __init__(self, maxsize=0):
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, record):
+        self._queue.put(record)
+
+    def close(self):
+        self._queue.put(_STOP)
+
+    def __iter__(self):
+        while (record := self._queue.get()) is not _STOP:
+            yield record
+
+
+async def _iterate(records):
+    if hasattr(records, "__aiter__"):
+        async for record in records:
+            yield record
+        return
+    iterator = iter(records)
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-source") as executor:
+        while (record := await loop.run_in_executor(executor, next, iterator, _STOP)) is not _STOP:
+            yield record
+
+
+async def run_blocking(func, *args):
+    """在当前流水线的线程池中执行阻塞调用；不在流水线中时与 asyncio.to_thread 相同"""
+    executor = _executor.get()
+    if executor is None:
+        return await asyncio.to_thread(func, *args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(contextvars.copy_context().run, func, *args))
+
+
+async def run_pipeline(records, handler, workers=DEFAULT_WORKERS, queue_size=None):
+    """
+    并发处理 records 中的每条记录。
+
+    records 可以是普通或异步可迭代对象，handler 为 async def handler(record)。
+    队列容量默认为 worker 数的两倍，读取列表的速度不会远超处理速度。
+    单条记录抛出的异常只打印，不会中断整个流水线；读取 records 出错时取消所有 worker 并抛出该异常。
+    """
+    workers = max(1, workers)
+    queue = asyncio.Queue(maxsize=queue_size or workers * 2)
+
+    # 线程池大小与 worker 数一致，保证每个 worker 都能拿到线程执行阻塞操作；
+    # 不替换事件循环的默认线程池，结束后循环中的其他代码不受影响
+    executor = ThreadPoolExecutor(max_workers=workers)
+    token = _executor.set(executor)
+
+    async def worker():
+        while True:
+            record = await queue.get()
+            if record is _STOP:
+                return
+            try:
+                await handler(record)
+            except Exception as e:
+                print(f"处理失败：{record} - {e}")
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    _executor.reset(token)
+    try:
+        async for record in _iterate(records):
+            await queue.put(record)
+        for _ in range(workers):
+            await queue.put(_STOP)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        executor.shutdown(wait=True)
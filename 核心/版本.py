@@ -0,0 +1,109 @@
+"""
+MIUI / HyperOS 版本号解析与按版本选择卡刷包。
+
+版本标识优先取自链接路径（.../V12.5.6.0.RFACNXM/... 或 .../OS1.0.5.0.UNCCNXM/...），
+找不到时使用设备列表中的"版本"一栏（miui.txt 中是每个设备从 1 开始的序号）。
+不同系列按 HyperOS > MIUI（V12.5.6.0）> 早期版本（JMACNBL18.0、ICS1.0）> 序号 排序，
+同一系列内按数字段逐段比较。
+
+选择模式：
+- latest：每个设备只保留最新的 N 个版本；
+- newer_than_library：每个设备只保留比库中已有的最新版本更新的版本（夜间增量任务）。
+"""
+import re
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+FAMILY_UNKNOWN = -1
+FAMILY_INDEX = 0  # 设备列表中的序号
+FAMILY_LEGACY = 1  # JMACNBL18.0、ICS1.0 等早期版本
+FAMILY_MIUI = 2  # V12.5.6.0.RFACNXM
+FAMILY_HYPEROS = 3  # OS1.0.5.0.UNCCNXM
+
+_NUMBERS = r"(\d+(?:\.\d+)*)"
+_PATTERNS = (
+    (FAMILY_HYPEROS, re.compile(rf"OS{_NUMBERS}(?:\.[A-Z0-9]+)?")),
+    (FAMILY_MIUI, re.compile(rf"V{_NUMBERS}(?:\.[A-Z0-9]+)?")),
+    (FAMILY_INDEX, re.compile(r"(\d+)")),
+    (FAMILY_LEGACY, re.compile(rf"[A-Z]+{_NUMBERS}")),
+)
+
+
+class Version(NamedTuple):
+    family: int
+    numbers: tuple
+    text: str
+
+
+def parse_version(text):
+    """解析版本标识；无法识别时归为 FAMILY_UNKNOWN，按其中的数字段比较"""
+    text = (text or "").strip()
+    upper = text.upper()
+    for family, pattern in _PATTERNS:
+        match = pattern.fullmatch(upper)
+        if match:
+            return Version(family, tuple(int(n) for n in match.group(1).split(".")), text)
+    return Version(FAMILY_UNKNOWN, tuple(int(n) for n in re.findall(r"\d+", text)), text)
+
+
+def version_from_url(url):
+    """链接路径中第一段可识别的版本标识，找不到时返回 None"""
+    for part in urlparse(url).path.strip("/").split("/")[:-1]:
+        version = parse_version(part)
+        if version.family in (FAMILY_HYPEROS, FAMILY_MIUI, FAMILY_LEGACY):
+            return version
+    return None
+
+
+def record_version(record):
+    return version_from_url(record.url) or parse_version(record.version)
+
+
+def compare_key(record, bound):
+    """
+    把记录的版本转换成可与 bound（Version）比较的键。
+    bound 是序号时与"版本"一栏比较，否则与链接中的版本标识比较。
+    """
+    if bound.family == FAMILY_INDEX:
+        version = parse_version(record.version)
+    else:
+        version = record_version(record)
+    return version.family, version.numbers
+
+
+def bound_key(bound):
+    return bound.family, bound.numbers
+
+
+class VersionSelection(NamedTuple):
+    latest: int = 0  # 每个设备保留的最新版本数，0 表示不限
+    newer_than_library: bool = False
+
+    def __bool__(self):
+        return bool(self.latest or self.newer_than_library)
+
+
+def select_versions(records, selection, is_known=None):
+    """
+    按设备分组选择版本，is_known(url) 判断卡刷包是否已在库中（newer_than_library 模式需要）。
+    同一设备的记录在列表中不一定连续（例如 miui.txt 中的 merlin），要看到一个设备的全部版本才能选择，
+    因此先读完整个列表再按原始顺序产出；列表只有几千条记录，耗时可以忽略。
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault(record.device_name, []).append(record)
+
+    selected = []
+    for group in groups.values():
+        ordered = sorted(group, key=lambda record: (record_version(record), -record.line_number), reverse=True)
+        if selection.newer_than_library and is_known:
+            known = [record_version(record) for record in group if is_known(record.url)]
+            if known:
+                newest = max(known)
+                ordered = [record for record in ordered if record_version(record) > newest]
+        if selection.latest:
+            ordered = ordered[:selection.latest]
+        selected.extend(ordered)
+
+    # 保持列表中的原始顺序
+    yield from sorted(selected, key=lambda record: record.line_number)
@@ -0,0 +1,408 @@
+"""
+SQLite 目录库：设备、版本、卡刷包链接与已提取分区的统一索引。
+
+更新脚本写入 HyperOS 卡刷包，两个爬取脚本写入处理状态、分区哈希和输出路径，
+合并、分类脚本移动文件后同步更新输出路径。
+爬取脚本的 --prescan 模式写入卡刷包格式和所需分区在包中的位置（layouts 表），以及 payload 清单中的分区哈希，
+提取时解析的 boot 镜像头（内核版本、ramdisk 压缩格式、AVB footer 等）按 SHA-256 写入 images 表。
+"某设备最新的 boot"、"所有尚未提取的卡刷包"之类的查询都是索引查找，不再需要扫描文本和目录。
+
+命令行查询（在项目根目录执行）：
+
+    python -m 核心.目录库 latest "小米手机1/1S(mione_plus)" --partition boot
+    python -m 核心.目录库 pending --source miui
+    python -m 核心.目录库 summary
+    python -m 核心.目录库 images --kernel 5.10 --gki --ramdisk lz4_legacy
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .版本 import parse_version, version_from_url
+
+DEFAULT_CATALOG_PATH = Path(__file__).resolve().parent.parent / "目录库.sqlite3"
+
+STATUS_PENDING = "pending"
+# version_key 的编码格式，记录在 PRAGMA user_version 中；格式变化时打开目录库会重新计算
+_VERSION_KEY_FORMAT = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    url TEXT PRIMARY KEY,
+    source TEXT,
+    device_name TEXT NOT NULL,
+    device_code TEXT,
+    branch TEXT,
+    version TEXT,
+    version_key TEXT,
+    package_size INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_packages_device ON packages (device_name, version_key);
+CREATE INDEX IF NOT EXISTS idx_packages_code ON packages (device_code);
+CREATE INDEX IF NOT EXISTS idx_packages_status ON packages (status, source);
+
+CREATE TABLE IF NOT EXISTS partitions (
+    url TEXT NOT NULL REFERENCES packages (url),
+    partition TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    sha256 TEXT,
+    size INTEGER,
+    output_path TEXT,
+    PRIMARY KEY (url, partition, file_name)
+);
+CREATE INDEX IF NOT EXISTS idx_partitions_partition ON partitions (partition);
+CREATE INDEX IF NOT EXISTS idx_partitions_sha256 ON partitions (sha256);
+CREATE INDEX IF NOT EXISTS idx_partitions_output ON partitions (output_path);
+
+-- 预扫描结果：卡刷包格式与所需分区在包中的位置
+CREATE TABLE IF NOT EXISTS layouts (
+    url TEXT PRIMARY KEY,
+    package_size INTEGER,
+    layout TEXT,
+    partitions TEXT,
+    wanted_members INTEGER,
+    wanted_bytes INTEGER,
+    error TEXT,
+    scanned_at REAL
+);
+CREATE TABLE IF NOT EXISTS layout_members (
+    url TEXT NOT NULL,
+    partition TEXT NOT NULL,
+    member TEXT NOT NULL,
+    data_offset INTEGER,
+    compressed_size INTEGER,
+    size INTEGER,
+    PRIMARY KEY (url, partition, member)
+);
+-- payload 清单中记录的分区哈希（预扫描时写入），python -m 核心.校验 用它校验已提取的镜像
+CREATE TABLE IF NOT EXISTS manifest_hashes (
+    url TEXT NOT NULL,
+    partition TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (url, partition)
+);
+
+-- boot 镜像头（核心.boot镜像.ImageInfo），相同内容的镜像只记录一次
+CREATE TABLE IF NOT EXISTS images (
+    sha256 TEXT PRIMARY KEY,
+    kind TEXT,
+    header_version INTEGER,
+    page_size INTEGER,
+    kernel_size INTEGER,
+    kernel_compression TEXT,
+    kernel_release TEXT,
+    kernel_banner TEXT,
+    ramdisk_size INTEGER,
+    ramdisk_compression TEXT,
+    os_version TEXT,
+    os_patch_level TEXT,
+    cmdline TEXT,
+    avb_version TEXT,
+    avb_original_size INTEGER,
+    avb_vbmeta_offset INTEGER,
+    avb_vbmeta_size INTEGER,
+    size INTEGER,
+    inspected_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_images_kernel ON images (kernel_release);
+CREATE INDEX IF NOT EXISTS idx_images_ramdisk ON images (ramdisk_compression);
+"""
+
+IMAGE_COLUMNS = ("kind", "header_version", "page_size", "kernel_size", "kernel_compression", "kernel_release",
+                 "kernel_banner", "ramdisk_size", "ramdisk_compression", "os_version", "os_patch_level", "cmdline",
+                 "avb_version", "avb_original_size", "avb_vbmeta_offset", "avb_vbmeta_size", "size")
+
+_DEVICE_CODE_PATTERN = re.compile(r"\(([A-Za-z0-9_]+)\)\s*$")
+
+
+def device_code_from_name(device_name):
+    """miui.txt 的设备名以"(代号)"结尾，例如 小米手机1/1S(mione_plus)"""
+    match = _DEVICE_CODE_PATTERN.search(device_name)
+    return match.group(1) if match else None
+
+
+def version_sort_key(version, url=None):
+    """
+    与 核心.版本 相同的顺序（HyperOS > MIUI > 早期版本 > 序号）编码成可按字符串排序的键：
+    系列在前，数字段补零。与 record_version 一样优先使用链接中的版本标识。
+    """
+    parsed = (version_from_url(url) if url else None) or parse_version(version)
+    return f"{parsed.family + 1:02d}" + "".join(f".{number:010d}" for number in parsed.numbers)
+
+
+class Catalog:
+    def __init__(self, path=DEFAULT_CATALOG_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self._migrate_version_keys()
+
+    def _migrate_version_keys(self):
+        """旧目录库中的 version_key 按旧格式计算，重新计算一次"""
+        with self._lock:
+            if self._db.execute("PRAGMA user_version").fetchone()[0] >= _VERSION_KEY_FORMAT:
+                return
+            rows = self._db.execute("SELECT url, version FROM packages").fetchall()
+            self._db.executemany("UPDATE packages SET version_key = ? WHERE url = ?",
+                                 [(version_sort_key(version, url), url) for url, version in rows])
+            self._db.execute(f"PRAGMA user_version = {_VERSION_KEY_FORMAT}")
+            self._db.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            self._db.commit()
+            return cursor
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    # ---- 写入 ----
+
+    def upsert_packages(self, packages, source=None, branch=None):
+        """
+        批量登记卡刷包，packages 为 (device_name, version, url) 或
+        (device_name, version, url, device_code) 的序列；已有记录只更新描述信息，不覆盖处理状态。
+        """
+        now = time.time()
+        rows = []
+        for package in packages:
+            device_name, version, url = package[:3]
+            device_code = package[3] if len(package) > 3 else device_code_from_name(device_name)
+            rows.append((url, source, device_name, device_code, branch, version, version_sort_key(version, url), now))
+        with self._lock:
+            self._db.executemany("""
+                INSERT INTO packages (url, source, device_name, device_code, branch, version, version_key, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    source = COALESCE(excluded.source, source),
+                    device_name = excluded.device_name,
+                    device_code = COALESCE(excluded.device_code, device_code),
+                    branch = COALESCE(excluded.branch, branch),
+                    version = excluded.version,
+                    version_key = excluded.version_key
+            """, rows)
+            self._db.commit()
+        return len(rows)
+
+    def set_status(self, url, status):
+        self.set_statuses([(url, status)])
+
+    def set_statuses(self, items):
+        """批量更新处理状态，items 为 (链接, 状态) 的序列"""
+        now = time.time()
+        with self._lock:
+            self._db.executemany("UPDATE packages SET status = ?, updated_at = ? WHERE url = ?",
+                                 [(status, now, url) for url, status in items])
+            self._db.commit()
+
+    def set_package_size(self, url, package_size):
+        self._execute("UPDATE packages SET package_size = ? WHERE url = ?", (package_size, url))
+
+    def record_partition(self, url, partition, output_path, sha256, size):
+        output_path = Path(output_path)
+        self._execute("""
+            INSERT OR REPLACE INTO partitions (url, partition, file_name, sha256, size, output_path)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (url, partition, output_path.name, sha256, size, str(output_path)))
+
+    def record_layout(self, url, package_size, layout, partitions, members, error=None):
+        """
+        记录一个卡刷包的预扫描结果。partitions 为扫描时查找的分区，
+        members 为 (分区, 成员名, 数据偏移, 压缩后大小, 解压后大小[, 清单中的 sha256]) 的序列。
+        """
+        with self._lock:
+            self._db.execute("""
+                INSERT OR REPLACE INTO layouts
+                    (url, package_size, layout, partitions, wanted_members, wanted_bytes, error, scanned_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (url, package_size, layout, ",".join(partitions), len(members),
+                  sum(member[3] for member in members), error, time.time()))
+            self._db.execute("DELETE FROM layout_members WHERE url = ?", (url,))
+            self._db.executemany("""
+                INSERT INTO layout_members (url, partition, member, data_offset, compressed_size, size)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(url, *member[:5]) for member in members])
+            self._db.executemany("INSERT OR REPLACE INTO manifest_hashes (url, partition, sha256) VALUES (?, ?, ?)",
+                                 [(url, member[0], member[5]) for member in members if len(member) > 5 and member[5]])
+            if package_size is not None:
+                self._db.execute("UPDATE packages SET package_size = ? WHERE url = ?", (package_size, url))
+            self._db.commit()
+
+    def record_image(self, sha256, info):
+        """记录镜像头解析结果，info 为 ImageInfo（或有同名字段的映射）"""
+        values = info._asdict() if hasattr(info, "_asdict") else info
+        self._execute(f"""
+            INSERT OR REPLACE INTO images (sha256, {", ".join(IMAGE_COLUMNS)}, inspected_at)
+            VALUES (?, {", ".join("?" * len(IMAGE_COLUMNS))}, ?)
+        """, (sha256, *(values.get(column) for column in IMAGE_COLUMNS), time.time()))
+
+    def move_output(self, old_path, new_path):
+        """单个文件被移动后更新输出路径"""
+        self.move_outputs([(old_path, new_path)])
+
+    def move_outputs(self, moves):
+        """批量更新输出路径，moves 为 (原路径, 新路径) 的序列，只提交一次事务"""
+        with self._lock:
+            self._db.executemany("UPDATE partitions SET output_path = ? WHERE output_path = ?",
+                                 [(str(new_path), str(old_path)) for old_path, new_path in moves])
+            self._db.commit()
+
+    def move_output_tree(self, old_dir, new_dir):
+        """整个目录被移动后，更新该目录下所有文件的输出路径"""
+        old_dir, new_dir = str(old_dir), str(new_dir)
+        prefix = os.path.join(old_dir, "")
+        with self._lock:
+            cursor = self._db.execute("""
+                UPDATE partitions SET output_path = ? || substr(output_path, ?)
+                WHERE substr(output_path, 1, ?) = ?
+            """, (new_dir, len(old_dir) + 1, len(prefix), prefix))
+            self._db.commit()
+            return cursor.rowcount
+
+    # ---- 查询 ----
+
+    def latest_partition(self, device, partition="boot"):
+        """某设备（名称或代号）最新版本的分区镜像"""
+        return self._query("""
+            SELECT p.device_name, p.version, p.url, t.partition, t.sha256, t.size, t.output_path
+            FROM packages p JOIN partitions t ON t.url = p.url
+            WHERE (p.device_name = ? OR p.device_code = ?) AND t.partition = ?
+            ORDER BY p.version_key DESC LIMIT 1
+        """, (device, device, partition))
+
+    def pending_packages(self, source=None, include_failed=True):
+        """尚未提取（或提取失败）的卡刷包"""
+        statuses = (STATUS_PENDING, "failed") if include_failed else (STATUS_PENDING,)
+        sql = f"SELECT * FROM packages WHERE status IN ({','.join('?' * len(statuses))})"
+        params = list(statuses)
+        if source:
+            sql += " AND source = ?"
+            params.append(source)
+        return self._query(sql, params)
+
+    def device_names(self):
+        """目录库中的全部设备名称"""
+        return [row[0] for row in self._query("SELECT DISTINCT device_name FROM packages ORDER BY device_name")]
+
+    def layout_summaries(self):
+        """全部预扫描结果，{链接: 行（package_size, layout, partitions, wanted_members, wanted_bytes, error）}"""
+        rows = self._query("SELECT url, package_size, layout, partitions, wanted_members, wanted_bytes, error "
+                           "FROM layouts")
+        return {row["url"]: row for row in rows}
+
+    def layout_members(self, url):
+        return self._query("SELECT * FROM layout_members WHERE url = ? ORDER BY data_offset", (url,))
+
+    def has_image(self, sha256):
+        return bool(self._query("SELECT 1 FROM images WHERE sha256 = ?", (sha256,)))
+
+    def images_missing(self):
+        """已提取、但还没有镜像头信息的镜像：[(sha256, 其中一个输出路径)]"""
+        return [tuple(row) for row in self._query("""
+            SELECT t.sha256, MAX(t.output_path) FROM partitions t
+            WHERE t.sha256 IS NOT NULL AND NOT EXISTS (SELECT 1 FROM images i WHERE i.sha256 = t.sha256)
+            GROUP BY t.sha256
+        """)]
+
+    def find_images(self, kernel=None, gki=False, ramdisk=None, partition=None, kind=None, header_version=None):
+        """
+        按镜像头信息查找分区镜像。kernel 为内核版本前缀（5.10 匹配 5.10.x），
+        gki 只要 GKI 内核（版本中带 -androidNN），ramdisk 为压缩格式（gzip、lz4_legacy ...）。
+        """
+        conditions = []
+        params = []
+        if kernel:
+            # 5.10 匹配 5.10、5.10.x、5.10-xxx，不匹配 5.100
+            conditions.append("(i.kernel_release = ? OR i.kernel_release GLOB ? OR i.kernel_release GLOB ?)")
+            params += [kernel, f"{kernel}.*", f"{kernel}-*"]
+        if gki:
+            conditions.append("i.kernel_release GLOB '*-android[0-9]*'")
+        for column, value in (("i.ramdisk_compression", ramdisk), ("t.partition", partition),
+                              ("i.kind", kind), ("i.header_version", header_version)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        return self._query(f"""
+            SELECT p.device_name, p.version, t.partition, i.kind, i.header_version, i.kernel_release,
+                   i.ramdisk_compression, i.os_version, i.os_patch_level, i.avb_version, t.sha256, t.output_path
+            FROM images i JOIN partitions t ON t.sha256 = i.sha256 JOIN packages p ON p.url = t.url
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY p.device_name, p.version_key, t.partition
+        """, params)
+
+    def recorded_hashes(self):
+        """
+        全部已提取分区的校验依据：[(输出路径, 文件名, 提取时的 sha256, 大小, payload 清单中的 sha256)]，
+        没有预扫描记录的分区清单哈希为 None
+        """
+        return [tuple(row) for row in self._query("""
+            SELECT t.output_path, t.file_name, t.sha256, t.size, m.sha256 FROM partitions t
+            LEFT JOIN manifest_hashes m ON m.url = t.url AND m.partition = t.partition
+            WHERE t.output_path IS NOT NULL
+        """)]
+
+    def find_by_sha256(self, sha256):
+        return self._query("SELECT * FROM partitions WHERE sha256 = ?", (sha256,))
+
+    def summary(self):
+        return self._query("SELECT source, status, COUNT(*) AS count FROM packages GROUP BY source, status")
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询 boot 库目录")
+    parser.add_argument("--catalog", default=str(DEFAULT_CATALOG_PATH), help="目录库文件路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    latest = subparsers.add_parser("latest", help="某设备最新版本的分区镜像")
+    latest.add_argument("device", help="设备名称或代号")
+    latest.add_argument("--partition", default="boot")
+    pending = subparsers.add_parser("pending", help="尚未提取的卡刷包")
+    pending.add_argument("--source", choices=["miui", "hyper"])
+    subparsers.add_parser("summary", help="按来源和状态统计卡刷包数量")
+    images = subparsers.add_parser("images", help="按 boot 镜像头信息查找分区镜像")
+    images.add_argument("--kernel", help="内核版本前缀，例如 5.10")
+    images.add_argument("--gki", action="store_true", help="只列出 GKI 内核")
+    images.add_argument("--ramdisk", help="ramdisk 压缩格式：gzip、lz4_legacy、lz4、zstd、xz、cpio ...")
+    images.add_argument("--partition", help="分区，例如 boot、init_boot")
+    images.add_argument("--kind", choices=["boot", "init_boot", "vendor_boot"], help="镜像类型")
+    images.add_argument("--header-version", type=int, help="镜像头版本（0–4）")
+    args = parser.parse_args()
+
+    with Catalog(args.catalog) as catalog:
+        if args.command == "latest":
+            rows = catalog.latest_partition(args.device, args.partition)
+        elif args.command == "pending":
+            rows = catalog.pending_packages(args.source)
+        elif args.command == "images":
+            rows = catalog.find_images(args.kernel, args.gki, args.ramdisk, args.partition, args.kind,
+                                       args.header_version)
+        else:
+            rows = catalog.summary()
+        for row in rows:
+            print(", ".join(f"{key}: {row[key]}" for key in row.keys()))
+        if not rows:
+            print("没有匹配的记录")
+
+
+if __name__ == "__main__":
+    main()
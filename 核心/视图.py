@@ -0,0 +1,208 @@
+"""
+boot 库的分类视图：不移动 boot库 中的设备文件夹，而是在视图目录中按分组建立链接。
+
+    视图目录/小米系列/数字系列/小米手机1_1S(mione_plus) -> ../../../boot库/小米手机1_1S(mione_plus)
+
+默认使用指向设备文件夹的相对符号链接；无法创建符号链接时（例如没有权限的 Windows）
+改为逐个文件的硬链接目录树。两种方式都不复制数据，多个分组方式（品牌/系列、SoC、Android 版本……）
+可以同时存在。
+
+每个视图目录中有一份清单（.view_manifest.json），记录每个设备在视图中的位置和链接方式。
+重建时只处理分组发生变化、新增或已删除的设备；硬链接方式下还会同步设备文件夹中增减的文件。
+boot库 换了位置时，先删除旧清单中的全部链接，再整个重建。
+"""
+import json
+import os
+import re
+import shutil
+from typing import NamedTuple
+
+MANIFEST_NAME = ".view_manifest.json"
+LINK_SYMLINK = "symlink"
+LINK_HARDLINK = "hardlink"
+UNKNOWN_GROUP = "未知"
+
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|]')
+
+
+class ViewStats(NamedTuple):
+    added: int = 0
+    moved: int = 0  # 分组发生变化的设备
+    removed: int = 0
+    unchanged: int = 0
+    synced_files: int = 0  # 硬链接方式下新增或删除的文件
+
+
+def series_grouping(classifier):
+    """按 品牌系列/系列 分组"""
+    def group_of(device):
+        brand, series = classifier.classify(device)
+        return f"{brand}系列", series
+    return group_of
+
+
+def attribute_grouping(path, default=UNKNOWN_GROUP):
+    """
+    按外部属性文件分组，文件为 JSON：{"设备文件夹名": "属性值"}，例如 SoC 或 Android 版本。
+    文件中没有的设备归入 default。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        attributes = json.load(f)
+
+    def group_of(device):
+        return (_safe_name(str(attributes.get(device) or default)),)
+    return group_of
+
+
+def _safe_name(name):
+    return _UNSAFE_CHARS.sub("_", name).strip() or UNKNOWN_GROUP
+
+
+def _remove_link(path):
+    """删除视图中的设备条目（符号链接或硬链接目录树），不会影响 boot库 中的文件"""
+    if os.path.islink(path):
+        try:
+            os.unlink(path)
+        except (IsADirectoryError, PermissionError):
+            os.rmdir(path)  # Windows 下的目录符号链接
+    elif os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def _sync_hardlinks(src, dst):
+    """让 dst 成为 src 的硬链接镜像，返回新增和删除的文件数"""
+    changed = 0
+    for root, _, files in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            target = os.path.join(target_root, name)
+            if not os.path.exists(target):
+                os.link(os.path.join(root, name), target)
+                changed += 1
+    for root, dirs, files in os.walk(dst, topdown=False):
+        source_root = os.path.join(src, os.path.relpath(root, dst))
+        for name in files:
+            if not os.path.exists(os.path.join(source_root, name)):
+                os.remove(os.path.join(root, name))
+                changed += 1
+        if root != dst and not os.path.isdir(source_root) and not os.listdir(root):
+            os.rmdir(root)
+    return changed
+
+
+class LibraryView:
+    def __init__(self, source_dir, view_dir, group_of, link_mode=LINK_SYMLINK):
+        self.source_dir = os.path.abspath(source_dir)
+        self.view_dir = os.path.abspath(view_dir)
+        self.group_of = group_of
+        self.link_mode = link_mode
+        self.manifest_path = os.path.join(self.view_dir, MANIFEST_NAME)
+
+    def load_manifest(self):
+        """返回 (清单记录的 boot库 路径, {设备: 条目})，没有清单时为 (None, {})"""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None, {}
+        return manifest.get("source"), manifest.get("devices", {})
+
+    def _save_manifest(self, devices):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source_dir, "devices": devices}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def plan(self):
+        """{设备文件夹名: 视图中的相对路径}"""
+        with os.scandir(self.source_dir) as entries:
+            devices = sorted(entry.name for entry in entries if entry.is_dir())
+        return {device: os.path.join(*self.group_of(device), device) for device in devices}
+
+    def _create(self, device, path):
+        """建立一个设备的链接，返回实际使用的链接方式和新增的文件数"""
+        src = os.path.join(self.source_dir, device)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.link_mode == LINK_SYMLINK:
+            try:
+                os.symlink(os.path.relpath(src, os.path.dirname(path)), path, target_is_directory=True)
+                return LINK_SYMLINK, 0
+            except OSError as e:
+                if isinstance(e, FileExistsError):
+                    raise
+        return LINK_HARDLINK, _sync_hardlinks(src, path)
+
+    def _prune(self, path):
+        """删除设备条目后，逐级删除变空的分组文件夹"""
+        parent = os.path.dirname(path)
+        while parent != self.view_dir and os.path.isdir(parent) and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+
+    def build(self, dry_run=False):
+        """按当前分组增量重建视图，返回 ViewStats"""
+        source, old = self.load_manifest()
+        new = {}
+        added = moved = removed = unchanged = synced = 0
+        plan = self.plan()
+        if not dry_run:
+            os.makedirs(self.view_dir, exist_ok=True)
+        # boot库 换了位置时，旧的链接全部失效，全部删除后重建
+        relocated = source is not None and source != self.source_dir
+        if relocated:
+            print(f"boot库 位置已从 {source} 变为 {self.source_dir}，重建整个视图")
+        removed_paths = set()
+
+        for device, entry in old.items():
+            if not relocated and plan.get(device) == entry["path"]:
+                continue
+            removed_paths.add(entry["path"])
+            if device in plan and not relocated:
+                moved += 1
+            else:
+                removed += 1
+            print(f"{'📝 ' if dry_run else ''}移除 {entry['path']}")
+            if not dry_run:
+                path = os.path.join(self.view_dir, entry["path"])
+                _remove_link(path)
+                self._prune(path)
+        if relocated:
+            old = {}
+
+        for device, rel_path in plan.items():
+            entry = old.get(device)
+            path = os.path.join(self.view_dir, rel_path)
+            if entry and entry["path"] == rel_path and os.path.lexists(path):
+                unchanged += 1
+                if entry["mode"] == LINK_HARDLINK and not dry_run:
+                    synced += _sync_hardlinks(os.path.join(self.source_dir, device), path)
+                new[device] = entry
+                continue
+            if os.path.lexists(path) and rel_path not in removed_paths:
+                # 不是视图建立的（例如以前用 --move 实际移动过来的设备文件夹），不能删除
+                print(f"⏩ 跳过 {rel_path}：已存在且不在视图清单中")
+                continue
+            if not entry or entry["path"] == rel_path:
+                added += 1
+            print(f"{'📝 ' if dry_run else ''}链接 {rel_path}")
+            if not dry_run:
+                mode, files = self._create(device, path)
+                synced += files
+                new[device] = {"path": rel_path, "mode": mode}
+
+        if not dry_run:
+            self._save_manifest(new)
+        return ViewStats(added, moved, removed, unchanged, synced)
+
+    def clear(self):
+        """删除视图中的全部链接和清单（boot库 不受影响）"""
+        for entry in self.load_manifest()[1].values():
+            path = os.path.join(self.view_dir, entry["path"])
+            if os.path.lexists(path):
+                _remove_link(path)
+                self._prune(path)
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
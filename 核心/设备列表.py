@@ -0,0 +1,136 @@
+"""
+设备列表（"设备: xxx, 版本: xxx, 链接: xxx" 格式的 TXT）的流式读取。
+
+逐行解析为 DeviceRecord，不把整个文件读入内存，流水线读到第一行就可以开始提取；
+格式不对的行带行号报告后跳过。可以在联网之前按设备（名称或代号）和版本范围过滤，
+版本的比较规则见 核心/版本.py。
+"""
+import re
+import time
+from typing import NamedTuple, Optional
+
+from .目录库 import device_code_from_name
+from .版本 import parse_version, compare_key, bound_key
+
+# 设备名称中可能有逗号和冒号，用 ", 版本:" / ", 链接:" 作为分隔；链接中不能有空白
+_LINE_PATTERN = re.compile(r"设备:\s*(?P<name>.+?),\s*版本:\s*(?P<version>.+?),\s*链接:\s*(?P<url>https?://\S+)")
+# 更新脚本为没有目标分支 ROM 的设备写入的行
+_NO_ROM_PATTERN = re.compile(r"设备:\s*.+?,\s*未找到目标分支的 ROM 数据。")
+
+
+class DeviceRecord(NamedTuple):
+    device_name: str
+    version: str
+    url: str
+    device_code: Optional[str]  # 设备名以 "(代号)" 结尾时的代号
+    line_number: int
+
+
+class DeviceFilter(NamedTuple):
+    devices: frozenset = frozenset()  # 设备名称或代号，为空时不过滤
+    min_version: Optional[str] = None
+    max_version: Optional[str] = None
+
+    def match(self, record):
+        if self.devices and record.device_name not in self.devices and record.device_code not in self.devices:
+            return False
+        if self.min_version:
+            bound = parse_version(self.min_version)
+            if compare_key(record, bound) < bound_key(bound):
+                return False
+        if self.max_version:
+            bound = parse_version(self.max_version)
+            if compare_key(record, bound) > bound_key(bound):
+                return False
+        return True
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(frozenset(args.device or ()), args.min_version, args.max_version)
+
+
+def add_filter_arguments(parser):
+    """给爬取脚本的命令行加上过滤参数"""
+    parser.add_argument("--device", action="append", help="只处理指定设备（名称或代号），可重复指定")
+    parser.add_argument("--min-version", help="只处理不低于此版本的卡刷包，例如 V12.5、OS1.0 或列表中的序号")
+    parser.add_argument("--max-version", help="只处理不高于此版本的卡刷包")
+    parser.add_argument("--latest", type=int, default=0, help="每个设备只处理最新的 N 个版本")
+    parser.add_argument("--new-only", action="store_true", help="每个设备只处理比库中已有版本更新的版本")
+
+
+def parse_line(line):
+    """解析一行，返回 (设备名称, 版本, 链接)；格式不对时返回 None"""
+    match = _LINE_PATTERN.fullmatch(line.strip())
+    if not match:
+        return None
+    return match.group("name").strip(), match.group("version").strip(), match.group("url")
+
+
+class DeviceListReader:
+    """
+    可迭代的设备列表，每次迭代重新从头读取文件。
+    迭代结束后可从 lines / records / filtered / malformed / parse_seconds 得到统计。
+    """
+
+    def __init__(self, path, device_filter=None):
+        self.path = path
+        self.device_filter = device_filter
+        self.lines = 0
+        self.records = 0  # 通过过滤、交给调用方的记录数
+        self.filtered = 0
+        self.no_rom = 0
+        self.malformed = 0
+        self.parse_seconds = 0.0
+
+    def __iter__(self):
+        self.lines = self.records = self.filtered = self.no_rom = self.malformed = 0
+        self.parse_seconds = 0.0
+        with open(self.path, "r", encoding="utf-8-sig") as f:
+            for line_number, line in enumerate(f, 1):
+                start = time.perf_counter()
+                record = self._parse(line_number, line)
+                self.parse_seconds += time.perf_counter() - start
+                if record is not None:
+                    self.records += 1
+                    yield record
+
+    def _parse(self, line_number, line):
+        line = line.strip()
+        if not line:
+            return None
+        self.lines += 1
+        parsed = parse_line(line)
+        if parsed is None:
+            if _NO_ROM_PATTERN.fullmatch(line):
+                self.no_rom += 1
+            else:
+                self.malformed += 1
+                print(f"设备列表第 {line_number} 行格式无效，已跳过：{line}")
+            return None
+        device_name, version, url = parsed
+        record = DeviceRecord(device_name, version, url, device_code_from_name(device_name), line_number)
+        if self.device_filter and not self.device_filter.match(record):
+            self.filtered += 1
+            return None
+        return record
+
+    def summary(self):
+        return (f"设备列表：{self.lines} 行，有效 {self.records} 条，过滤 {self.filtered} 条，"
+                f"无卡刷包 {self.no_rom} 条，格式无效 {self.malformed} 行")
+
+
+def tap_batches(records, callback, batch_size=500):
+    """
+    按批次把 records 交给 callback（例如登记到目录库）之后再逐条产出，
+    既不必等整个列表读完，也避免每条记录单独提交一次事务。
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            callback(batch)
+            yield from batch
+            batch = []
+    if batch:
+        callback(batch)
+        yield from batch
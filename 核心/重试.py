@@ -0,0 +1,92 @@
+"""
+下载失败的分类重试。
+
+只有暂时性的错误才值得重试：连接错误（断开、超时）、服务器错误（5xx / 429）和读取不完整。
+重试间隔按指数退避并加随机抖动，避免所有 worker 同时重试同一个主机；
+每个主机同时处理的卡刷包数量有上限。重试用尽或遇到永久性错误（404、无效 ZIP 等）的链接
+写入死信列表，普通运行时跳过，用 --retry-failed 重新处理。
+"""
+import http.client
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+import requests
+
+try:
+    import httpx
+except ImportError:  # HttpFile 的某些版本基于 httpx
+    httpx = None
+
+RETRY_CONNECTION = "连接错误"
+RETRY_SERVER = "服务器错误"
+RETRY_TRUNCATED = "读取不完整"
+
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 4
+
+_CONNECTION_ERRORS = (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout)
+if httpx is not None:
+    _CONNECTION_ERRORS += (httpx.TransportError,)
+
+
+class TruncatedReadError(OSError):
+    """远程文件返回的数据比请求的少"""
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int = 4  # 包括第一次尝试
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+    def delay(self, attempt):
+        """第 attempt 次失败后的等待时间：指数增长的上限内均匀随机（full jitter）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+def classify_error(exc):
+    """返回错误的重试类别；永久性错误返回 None"""
+    if isinstance(exc, (TruncatedReadError, http.client.IncompleteRead, requests.exceptions.ChunkedEncodingError)):
+        return RETRY_TRUNCATED
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return RETRY_SERVER if status >= 500 or status == 429 else None
+    if isinstance(exc, _CONNECTION_ERRORS):
+        return RETRY_CONNECTION
+    return None
+
+
+class HostConnectionLimiter:
+    """每个主机同时进行的下载数上限"""
+
+    def __init__(self, max_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST):
+        self.max_per_host = max_per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+        with semaphore:
+            yield
+
+
+class DeadLetterList:
+    """死信列表：每行 "时间<TAB>链接<TAB>原因"，只追加"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, url, reason):
+        line = f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{url}\t{reason}\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            self.count += 1
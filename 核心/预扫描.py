@@ -0,0 +1,153 @@
+"""
+卡刷包预扫描：不下载分区数据，只用 HEAD 请求和文件尾部的 Range 读取（ZIP 中央目录）确定
+- 卡刷包大小；
+- 格式：payload（包含 payload.bin，与爬取脚本中 check_for_payload_bin 的判断相同）或 zip（镜像直接放在 ZIP 中）；
+- 所需分区在包中的位置：ZIP 成员的本地文件头偏移和压缩后大小，
+  或 payload.bin 中该分区操作数据的起始偏移和总长度（需要额外读取 payload.bin 的头部和清单），
+  payload 格式同时记录清单中的分区哈希，供 python -m 核心.校验 使用。
+
+结果写入目录库（layouts / layout_members 表），正式爬取时据此
+- 估计需要下载的总字节数，并按所需数据量从大到小调度（--largest-first）；
+- 已确认不含所需分区的卡刷包直接记为"无分区"，不再打开。
+"""
+import contextlib
+import zipfile
+from collections import Counter
+from typing import NamedTuple
+
+from .块缓存 import CachedRangeFile
+from .payload提取 import PayloadReader, PayloadError, PAYLOAD_NAME
+from .分区 import zip_partition_index
+from .流水线 import run_pipeline, run_blocking
+
+LAYOUT_PAYLOAD = "payload"
+LAYOUT_ZIP = "zip"
+LAYOUT_INVALID = "invalid"  # 不是有效的 ZIP 文件
+
+DEFAULT_PRESCAN_WORKERS = 16
+
+
+class LayoutMember(NamedTuple):
+    partition: str
+    member: str  # ZIP 成员名，payload 格式为 payload.bin
+    data_offset: int  # 在卡刷包中的偏移（ZIP 成员为本地文件头偏移）
+    compressed_size: int  # 需要下载的字节数
+    size: int  # 解压后的镜像大小
+    sha256: str = None  # payload 清单中的分区哈希，ZIP 成员没有
+
+
+class PackageLayout(NamedTuple):
+    url: str
+    package_size: int
+    layout: str
+    partitions: tuple
+    members: list
+    error: str = None
+
+
+def scan_package(url, partitions, opener, retry=None):
+    """扫描一个卡刷包，opener(url) 返回可 seek 的远程文件（例如 HttpFile，创建时发出 HEAD 请求）"""
+    partitions = tuple(partitions)
+    with opener(url) as raw, CachedRangeFile(raw, retry=retry) as file:
+        try:
+            z = zipfile.ZipFile(file)
+        except zipfile.BadZipFile:
+            return PackageLayout(url, file.size, LAYOUT_INVALID, partitions, [], "无效的 ZIP 文件")
+
+        with z:
+            if PAYLOAD_NAME not in z.NameToInfo:
+                members = [LayoutMember(partition, info.filename, info.header_offset, info.compress_size, info.file_size)
+                           for partition, info in zip_partition_index(z, partitions)]
+                return PackageLayout(url, file.size, LAYOUT_ZIP, partitions, members)
+
+            try:
+                payload = PayloadReader.from_zip(file, z)
+            except PayloadError as e:
+                return PackageLayout(url, file.size, LAYOUT_PAYLOAD, partitions, [], str(e))
+            members = []
+            for partition in payload.sweep_order(partitions):
+                start, length = payload.data_range(partition)
+                info = payload.partitions[partition].new_partition_info
+                members.append(LayoutMember(partition, PAYLOAD_NAME, payload.offset + start, length, info.size,
+                                            info.hash.hex() or None))
+            return PackageLayout(url, file.size, LAYOUT_PAYLOAD, partitions, members)
+
+
+def covers(summary, partitions):
+    """预扫描结果是否有效且覆盖了这些分区"""
+    return (summary is not None and not summary["error"]
+            and set(partitions) <= set(summary["partitions"].split(",")))
+
+
+def lacks_partitions(summary, partitions):
+    """预扫描已确认卡刷包中没有任何所需分区"""
+    return covers(summary, partitions) and not summary["wanted_members"]
+
+
+def order_largest_first(records, summaries):
+    """按预扫描得到的所需下载量从大到小排序；没有预扫描结果的记录排在最后，保持原顺序"""
+    known = []
+    unknown = []
+    for record in records:
+        summary = summaries.get(record.url)
+        if summary is not None and summary["wanted_bytes"] is not None:
+            known.append(record)
+        else:
+            unknown.append(record)
+    known.sort(key=lambda r: summaries[r.url]["wanted_bytes"], reverse=True)
+    return known + unknown
+
+
+def estimate_download(records, summaries):
+    """返回 (已预扫描数, 未预扫描数, 所需分区的下载字节数, 卡刷包总字节数)，同一链接只计一次"""
+    scanned = unscanned = wanted = total = 0
+    for url in {record.url for record in records}:
+        summary = summaries.get(url)
+        if summary is None or summary["error"]:
+            unscanned += 1
+            continue
+        scanned += 1
+        wanted += summary["wanted_bytes"] or 0
+        total += summary["package_size"] or 0
+    return scanned, unscanned, wanted, total
+
+
+def format_estimate(records, summaries):
+    scanned, unscanned, wanted, total = estimate_download(records, summaries)
+    text = f"预计下载 {wanted / (1 << 20):.1f} MB（{scanned} 个已预扫描的卡刷包共 {total / (1 << 30):.2f} GB）"
+    if unscanned:
+        text += f"，另有 {unscanned} 个卡刷包没有预扫描结果"
+    return text
+
+
+async def prescan(records, partitions, catalog, opener, retry=None, workers=DEFAULT_PRESCAN_WORKERS,
+                  host_limiter=None, rescan=False):
+    """
+    并发预扫描并写入目录库，返回各格式（以及 skipped、error）的计数。
+    已有覆盖这些分区的有效结果时跳过，rescan 为真时重新扫描。
+    """
+    partitions = tuple(partitions)
+    summaries = catalog.layout_summaries()
+    counts = Counter()
+    seen = set()  # 列表中同一个卡刷包可能对应多个设备名
+
+    def scan(url):
+        with host_limiter.slot(url) if host_limiter else contextlib.nullcontext():
+            return scan_package(url, partitions, opener, retry)
+
+    async def handle(record):
+        if record.url in seen or (not rescan and covers(summaries.get(record.url), partitions)):
+            counts["skipped"] += 1
+            return
+        seen.add(record.url)
+        try:
+            layout = await run_blocking(scan, record.url)
+        except Exception as e:
+            layout = PackageLayout(record.url, None, None, partitions, [], f"{type(e).__name__}: {e}")
+        catalog.record_layout(*layout)
+        counts["error" if layout.error else layout.layout] += 1
+        members = "、".join(f"{m.partition} {m.compressed_size} 字节" for m in layout.members) or "无所需分区"
+        print(f"预扫描：{record.url}（{layout.layout or '失败'}，{layout.error or members}）")
+
+    await run_pipeline(records, handle, workers=workers)
+    return counts
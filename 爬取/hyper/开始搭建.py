@@ -1,18 +1,92 @@
 import os
+import sys
+import time
+import asyncio
+import argparse
 import zipfile
-import subprocess
-import aiofiles
-import shutil
 from pathlib import Path
 import shlex
 import re
 from payload_dumper.http_file import HttpFile
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from 核心.流水线 import run_pipeline, run_blocking
+from 核心.提取 import stream_to_file
+from 核心.payload提取 import PayloadReader, PayloadError
+from 核心.块缓存 import CachedRangeFile
+from 核心.去重存储 import BlobStore
+from 核心.压缩存储 import compressed_writer, compressed_path, DEFAULT_LEVEL
+from 核心.目录库 import Catalog, DEFAULT_CATALOG_PATH
+from 核心.处理记录 import ResumeJournal, STATUS_OK, STATUS_NO_PARTITION, STATUS_FAILED, STATUS_DEAD_LETTER
+from 核心.重试 import RetryPolicy, HostConnectionLimiter, DeadLetterList, classify_error
+from 核心.设备列表 import DeviceListReader, DeviceFilter, add_filter_arguments, tap_batches
+from 核心.版本 import VersionSelection, select_versions
+from 核心.分片 import ShardSpec, LeaseQueue, add_shard_arguments, default_worker_id
+from 核心.分区 import parse_partitions, add_partition_arguments, zip_partition_index
+from 核心.预扫描 import prescan, lacks_partitions, order_largest_first, format_estimate
+from 核心.boot镜像 import BootImageInspector
+from 核心.带宽 import IOBudget, DEFAULT_BUDGET_PATH, BUCKET_DOWNLOAD, BUCKET_DISK, add_budget_arguments, format_rate
+from 核心.指标 import (Metrics, STAGE_LIST_PARSE, STAGE_METADATA, STAGE_ZIP_DIRECTORY, STAGE_PAYLOAD,
+                      STAGE_ZIP_EXTRACT, STAGE_DISK_WRITE, STAGE_JOURNAL, STAGE_IO_WAIT)
+
 # 常量定义
 PROCESSED_URLS_FILE = r"processed_urls.txt"
-DEFAULT_PARTITIONS = "boot,init_boot"  # 添加需要的分区
+DEFAULT_PARTITIONS = "boot,init_boot"  # 默认提取的分区，可用命令行参数 --partitions 覆盖
+# 同时处理的卡刷包数量
+MAX_CONCURRENT_PACKAGES = 4
+# 每个主机同时处理的卡刷包数量上限
+MAX_CONNECTIONS_PER_HOST = 4
+# 暂时性错误（连接错误、5xx、读取不完整）的重试次数与指数退避参数（秒）
+RETRY_POLICY = RetryPolicy(max_attempts=4, base_delay=2.0, max_delay=60.0)
+# 死信列表：永久性错误和重试用尽的链接及原因
+DEAD_LETTER_FILE = "dead_letter.txt"
+# 处理记录批量写盘（fsync）的间隔，单位秒
+JOURNAL_FLUSH_INTERVAL = 5
+# 去重存储目录（两个爬取脚本共用），设为 None 则每个镜像单独写一份
+BLOB_STORE_DIR = Path(__file__).resolve().parents[2] / "boot对象库"
+# 压缩存储：zstd 压缩级别，镜像保存为 .img.zst；设为 None 则保存原始镜像（也可用 --compress 开启）
+COMPRESS_LEVEL = None
+# 目录库路径（更新、爬取、整理脚本共用），设为 None 则不登记
+CATALOG_PATH = DEFAULT_CATALOG_PATH
+# 目录库中卡刷包的来源标记
+SOURCE = "hyper"
+# 运行指标：进度行的打印间隔（秒），结束时导出的 JSON / CSV 文件
+PROGRESS_INTERVAL = 30
+METRICS_JSON = "crawl_metrics.json"
+METRICS_CSV = "crawl_metrics.csv"
+# 预扫描（--prescan）时同时扫描的卡刷包数量，只读取 ZIP 目录和 payload 清单
+PRESCAN_CONCURRENCY = 16
+# 预扫描时每个主机同时进行的请求数上限；预扫描只发 HEAD 和小的 Range 请求，单独限制，不占用下载的 MAX_CONNECTIONS_PER_HOST
+PRESCAN_CONNECTIONS_PER_HOST = 8
+# 共享带宽预算（下载带宽、写盘速度上限，用 python -m 核心.带宽 set 修改），设为 None 则不限速
+IO_BUDGET_PATH = DEFAULT_BUDGET_PATH
+# 带宽优先级，数值越大越优先：hyper 高于 miui，新的 HyperOS 卡刷包先下载
+IO_PRIORITY = 1
 payload_dumper_path = ".\payload_dumper.exe"
 
+# 在 main() 中根据上面的配置创建
+blob_store = None
+catalog = None
+dead_letters = None
+io_budget = None
+image_writer = None  # 压缩存储的写入函数，为 None 时写原始镜像
+metrics = Metrics()
+layouts = {}  # 目录库中的预扫描结果（链接 -> 行）
+output_root = Path.cwd()  # 输出目录：镜像、处理记录、死信列表和运行指标
+host_limiter = HostConnectionLimiter(MAX_CONNECTIONS_PER_HOST)
+
+
+def _throttle(bucket):
+    """带宽预算的限速函数，未启用预算时为 None"""
+    if io_budget is None:
+        return None
+    return io_budget.throttle(bucket, on_wait=lambda seconds: metrics.observe(STAGE_IO_WAIT, seconds))
+
+
+def _image_path(path):
+    """压缩存储时镜像文件名加上 .zst"""
+    return compressed_path(path) if image_writer else path
+
 
 def sanitize_path_name(name):
     invalid_chars = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
@@ -21,159 +95,186 @@ def sanitize_path_name(name):
     return name.strip()
 
 
-async def load_device_info_from_file(file_path):
+def extract_partition_from_zip(z, output_dir, partitions, version, device_name):
     try:
-        devices = []
-        async with aiofiles.open(file_path, 'r', encoding='utf-8') as file:
-            async for line in file:
-                line = line.strip()
-                if not line:
-                    continue
-                # 提取格式 "设备: xxx, 版本: xxx, 链接: xxx"
-                if "设备:" in line and "版本:" in line and "链接:" in line:
-                    parts = line.split(",")
-                    name_part = parts[0].split(":")[1].strip()
-                    version_part = parts[1].split(":")[1].strip()
-                    link_part = parts[2].split(":")[1].strip()
-                    devices.append((name_part, version_part, link_part))
-        return devices
-    except Exception as e:
-        print(f"加载设备文件失败：{e}")
-        return []
-
-
-async def load_processed_urls():
-    if os.path.exists(PROCESSED_URLS_FILE):
-        async with aiofiles.open(PROCESSED_URLS_FILE, 'r', encoding='utf-8') as file:
-            return set(line.strip() for line in await file.readlines())
-    return set()
+        sanitized_name = sanitize_path_name(device_name)
+        extracted = []
 
+        # 一次遍历中央目录建立 分区 -> 成员 的索引，按成员在文件中的偏移顺序提取，远程文件只向前读取
+        members = zip_partition_index(z, partitions)
+        for partition, info in members:
+            target_dir = Path(output_dir) / sanitized_name / partition
+            target_dir.mkdir(parents=True, exist_ok=True)
 
-async def save_processed_url(url):
-    print(f"记录链接：{url}")  # 调试输出
-    async with aiofiles.open(PROCESSED_URLS_FILE, 'a', encoding='utf-8') as file:
-        await file.write(url + "\n")
+            # 保留原始文件名
+            filename = os.path.basename(info.filename)
+            output_path = _image_path(target_dir / f"{version}_{filename}")
+            # 流式写盘，内存占用与镜像大小无关；相同镜像只保存一份；写盘的同时解析 boot 镜像头
+            image = BootImageInspector()
+            with metrics.time(STAGE_ZIP_EXTRACT):
+                if blob_store:
+                    result = blob_store.write_zip_member(z, info.filename, output_path, throttle=_throttle(BUCKET_DISK),
+                                                         observer=image.feed)
+                else:
+                    with z.open(info) as src:
+                        result = (image_writer or stream_to_file)(src, output_path, throttle=_throttle(BUCKET_DISK),
+                                                                  observer=image.feed)
+            extracted.append((partition, result, image.result(result.size)))
+            reused = "，复用已有镜像" if result.reused else ""
+            print(f"提取完成：{info.filename} -> {output_path}（sha256: {result.sha256}{reused}）")
 
+        # 打印未找到的分区
+        found_partitions = {partition for partition, _ in members}
+        not_found = [partition for partition in partitions if partition not in found_partitions]
+        if not_found:
+            print(f"在ZIP中未找到分区: {', '.join(not_found)}")
 
-async def extract_partition_from_zip(file, output_dir, partitions, version, device_name):
-    try:
-        with zipfile.ZipFile(file) as z:
-            file_list = z.namelist()
-            sanitized_name = sanitize_path_name(device_name)
-            found_partitions = set()
-
-            # 收集所有找到的分区
-            for partition in partitions.split(","):
-                partition_files = [f for f in file_list if f.endswith(f"{partition}.img")]
-                if partition_files:
-                    found_partitions.add(partition)
-
-            # 只处理找到的分区
-            for partition in found_partitions:
-                target_dir = Path(output_dir) / sanitized_name / partition
-                target_dir.mkdir(parents=True, exist_ok=True)
-
-                partition_files = [f for f in file_list if f.endswith(f"{partition}.img")]
-                for partition_file in partition_files:
-                    # 保留原始文件名
-                    filename = os.path.basename(partition_file)
-                    output_path = target_dir / f"{version}_{filename}"
-                    with z.open(partition_file) as src, open(output_path, "wb") as dest:
-                        dest.write(src.read())
-                    print(f"提取完成：{partition_file} -> {output_path}")
-
-            # 打印未找到的分区
-            not_found = set(partitions.split(",")) - found_partitions
-            if not_found:
-                print(f"在ZIP中未找到分区: {', '.join(not_found)}")
+        return extracted
 
     except zipfile.BadZipFile:
-        print(f"无效的 ZIP 文件：{file}")
+        print(f"无效的 ZIP 文件：{z.filename or '远程文件'}")
+        metrics.failure("无效ZIP")
+        return None
 
 
-async def check_for_payload_bin(file):
+def check_for_payload_bin(z):
     """
     检查 ZIP 文件中是否包含 payload.bin。
     """
-    try:
-        with zipfile.ZipFile(file) as z:
-            return "payload.bin" in z.namelist()
-    except zipfile.BadZipFile:
-        print(f"无效的 ZIP 文件：{file}")
-        return False
+    return "payload.bin" in z.NameToInfo
 
 
-async def extract_partitions(partitions, source, version, device_name):
+def extract_partitions(file, z, partitions, version, device_name):
     """
-    使用 payload_dumper 提取分区。
+    从 payload.bin 中提取分区。
+    在进程内解析清单，只读取所需分区的数据，直接写入各自的目标路径，多个卡刷包可以同时提取。
     """
-    base_dir = Path(os.getcwd())
+    base_dir = output_root
     sanitized_name = sanitize_path_name(device_name)
-    default_output_dir = base_dir / "output"
     found_partitions = []
+    extracted = []
 
     try:
-        subprocess.run(["payload_dumper", "--partitions", partitions, str(source)], check=True)
-
-        # 检查哪些分区被成功提取
-        for partition in partitions.split(","):
-            partition_file = default_output_dir / f"{partition}.img"
-            if partition_file.exists():
-                found_partitions.append(partition)
+        payload = PayloadReader.from_zip(file, z)
 
-        # 只处理找到的分区
-        for partition in found_partitions:
-            partition_file = default_output_dir / f"{partition}.img"
+        # 按分区数据在 payload.bin 中的位置依次提取
+        for partition in payload.sweep_order(partitions):
             target_dir = base_dir / sanitized_name / partition
             target_dir.mkdir(parents=True, exist_ok=True)
-            renamed_file = target_dir / f"{version}_{partition}.img"
-            shutil.move(str(partition_file), str(renamed_file))
-            print(f"成功提取：{partition_file} -> {renamed_file}")
+            renamed_file = _image_path(target_dir / f"{version}_{partition}.img")
+            image = BootImageInspector()
+            with metrics.time(STAGE_PAYLOAD):
+                if blob_store:
+                    result = blob_store.write_payload_partition(payload, partition, renamed_file,
+                                                                throttle=_throttle(BUCKET_DISK), observer=image.feed)
+                else:
+                    result = payload.extract(partition, renamed_file, throttle=_throttle(BUCKET_DISK),
+                                             observer=image.feed, writer=image_writer)
+            found_partitions.append(partition)
+            extracted.append((partition, result, image.result(result.size)))
+            reused = "，复用已有镜像" if result.reused else ""
+            print(f"成功提取：{partition} -> {renamed_file}（sha256: {result.sha256}{reused}）")
 
         # 打印未找到的分区
-        not_found = set(partitions.split(",")) - set(found_partitions)
+        not_found = [partition for partition in partitions if partition not in found_partitions]
         if not_found:
             print(f"未找到分区文件: {', '.join(not_found)}")
 
-        shutil.rmtree(str(default_output_dir), ignore_errors=True)
+        return extracted
 
-    except subprocess.CalledProcessError as e:
+    except PayloadError as e:
         print(f"分区提取失败：{e}")
+        metrics.failure("payload错误")
+        return None
     except Exception as e:
+        if classify_error(e):
+            raise  # 暂时性错误交给外层重试
         print(f"提取过程中发生错误：{e}")
-
-
-async def process_recovery_package(url, version, device_name, partitions=DEFAULT_PARTITIONS):
-    try:
-        with HttpFile(url) as file:
-            if await check_for_payload_bin(file):
-                await extract_partitions(partitions, url, version, device_name)
-            else:
-                await extract_partition_from_zip(file, os.getcwd(), partitions, version, device_name)
-    except Exception as e:
-        print(f"处理失败：{e}")
-
-
-def load_device_list(file_path):
-    devices = []
-    with open(file_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-        for line in lines:
-            # 用正则表达式匹配设备、版本和链接信息
-            match = re.match(r"设备:\s*(.*),\s*版本:\s*(.*),\s*链接:\s*(https?://.*)", line.strip())
-            if match:
-                device_name = match.group(1)
-                version = match.group(2)
-                url = match.group(3)
-                devices.append((device_name, version, url))
-            else:
-                print(f"跳过无效的行: {line.strip()}")
-    return devices
-
-
-async def process_device(device_name, version, url):
-    processed_urls = await load_processed_urls()
-
+        metrics.failure(type(e).__name__)
+        return None
+
+
+def _dead_letter(url, reason):
+    print(f"加入死信列表：{url}（{reason}）")
+    if dead_letters:
+        dead_letters.add(url, reason)
+
+
+def _process_recovery_package(url, version, device_name, partitions):
+    """在线程池中执行的阻塞部分：读取远程 ZIP 目录并提取分区，返回处理状态"""
+    with host_limiter.slot(url):
+        start = time.perf_counter()
+        with metrics.time(STAGE_METADATA):
+            raw = HttpFile(url)
+        # 块缓存合并零碎的 Range 请求，读取中断时从断点续传；中央目录只解析一次，判断和提取共用同一个 ZipFile
+        with raw, CachedRangeFile(raw, retry=RETRY_POLICY, throttle=_throttle(BUCKET_DOWNLOAD)) as file:
+            try:
+                try:
+                    with metrics.time(STAGE_ZIP_DIRECTORY):
+                        z = zipfile.ZipFile(file)
+                except zipfile.BadZipFile:
+                    print(f"无效的 ZIP 文件：{url}")
+                    metrics.failure("无效ZIP")
+                    _dead_letter(url, "无效的 ZIP 文件")
+                    return STATUS_DEAD_LETTER
+
+                if catalog:
+                    catalog.set_package_size(url, file.size)
+
+                with z:
+                    if check_for_payload_bin(z):
+                        extracted = extract_partitions(file, z, partitions, version, device_name)
+                    else:
+                        extracted = extract_partition_from_zip(z, output_root, partitions, version, device_name)
+            finally:
+                stats = file.stats()
+                print(f"网络读取：{stats['requests']} 次请求，{stats['bytes_fetched']} 字节（{url}）")
+                metrics.add_download(url, stats['bytes_fetched'], time.perf_counter() - start)
+                if stats['retries']:
+                    metrics.retry("断点续传", stats['retries'])
+
+    if extracted is None:
+        _dead_letter(url, "分区提取失败")
+        return STATUS_DEAD_LETTER
+    for partition, result, image in extracted:
+        # 复用已有镜像时没有写盘，也没有解析镜像头（目录库中通常已有相同哈希的记录）
+        if not result.reused:
+            metrics.observe(STAGE_DISK_WRITE, result.write_seconds)
+            metrics.add_written(result.size)
+        if catalog:
+            catalog.record_partition(url, partition, result.path, result.sha256, result.size)
+            if image:
+                catalog.record_image(result.sha256, image)
+    return STATUS_OK if extracted else STATUS_NO_PARTITION
+
+
+async def process_recovery_package(url, version, device_name, partitions):
+    """
+    处理一个卡刷包。暂时性错误按 RETRY_POLICY 退避后重试，已提取的分区在重试时从去重存储直接复用；
+    永久性错误直接加入死信列表。
+    """
+    for attempt in range(1, RETRY_POLICY.max_attempts + 1):
+        try:
+            return await run_blocking(_process_recovery_package, url, version, device_name, partitions)
+        except Exception as e:
+            retry_class = classify_error(e)
+            if retry_class is None:
+                print(f"处理失败：{e}")
+                metrics.failure(type(e).__name__)
+                _dead_letter(url, f"{type(e).__name__}: {e}")
+                return STATUS_DEAD_LETTER
+            if attempt == RETRY_POLICY.max_attempts:
+                print(f"处理失败（{retry_class}，已尝试 {attempt} 次）：{e}")
+                metrics.failure(retry_class)
+                _dead_letter(url, f"{retry_class}: {e}")
+                return STATUS_FAILED
+            delay = RETRY_POLICY.delay(attempt)
+            print(f"{retry_class}，{delay:.1f} 秒后重试（第 {attempt} 次）：{url} - {e}")
+            metrics.retry(retry_class)
+            await asyncio.sleep(delay)
+
+
+async def process_device(journal, device_name, version, url, partitions, force=False):
     # 输出接收到的 URL，便于调试
     print(f"接收到的链接：{url}")
 
@@ -182,30 +283,229 @@ async def process_device(device_name, version, url):
         print(f"跳过无效的链接：{url}")
         return
 
-    if url in processed_urls:
+    if journal.is_done(url) and not force:
         print(f"跳过已处理的链接：{url}")
         return
 
-    print(f"处理卡刷包：{url} （版本号：{version}）")
-    await process_recovery_package(url, version, device_name)
-    await save_processed_url(url)
-
-
-async def main():
-    file_path = input("请输入设备列表 TXT 文件路径：")
-    print(f"从文件加载设备列表：{file_path}")
+    if lacks_partitions(layouts.get(url), partitions):
+        print(f"预扫描确认卡刷包中没有所需分区，不再打开：{url}")
+        with metrics.time(STAGE_JOURNAL):
+            journal.record(url, STATUS_NO_PARTITION)
+            if catalog:
+                catalog.set_status(url, STATUS_NO_PARTITION)
+        metrics.package_done(STATUS_NO_PARTITION)
+        return
 
-    # 加载设备列表
-    devices = load_device_list(file_path)
-    if not devices:
-        print("未找到有效的设备数据。")
+    print(f"处理卡刷包：{url} （版本号：{version}）")
+    status = await process_recovery_package(url, version, device_name, partitions)
+    # 失败的链接也会记录，下次运行时重新处理；死信链接只在 --retry-failed 时重新处理
+    with metrics.time(STAGE_JOURNAL):
+        journal.record(url, status)
+        if catalog:
+            catalog.set_status(url, status)
+    metrics.package_done(status)
+    print(f"记录链接：{url}（{status}）")
+
+
+async def run_prescan(devices, partitions):
+    """只预扫描卡刷包（大小、格式、所需分区的位置）并写入目录库，不提取"""
+    devices = list(devices)
+    counts = await prescan(devices, partitions, catalog, HttpFile, retry=RETRY_POLICY,
+                           workers=PRESCAN_CONCURRENCY,
+                           host_limiter=HostConnectionLimiter(PRESCAN_CONNECTIONS_PER_HOST))
+    print("预扫描完成：" + "，".join(f"{name} {count}" for name, count in sorted(counts.items())))
+    print(format_estimate(devices, catalog.layout_summaries()))
+
+
+async def main(list_path=None, output_dir=None, records=None, concurrency=MAX_CONCURRENT_PACKAGES,
+               retry_failed=False, device_filter=None, selection=None, shard=None, queue_path=None, worker_id=None,
+               prescan_only=False, largest_first=False, partitions=None, io_budget_path=IO_BUDGET_PATH,
+               io_priority=IO_PRIORITY, compress_level=COMPRESS_LEVEL):
+    """
+    list_path 为设备列表文件，不指定时交互输入；records 为上游阶段直接传来的 DeviceRecord 序列，指定时不读取文件。
+    output_dir 为输出目录，默认当前目录。io_budget_path 为共享的带宽预算文件，None 时不限速。
+    compress_level 不为 None 时镜像以 zstd 压缩保存（.img.zst）。
+    """
+    global blob_store, catalog, dead_letters, io_budget, image_writer, metrics, layouts, output_root
+    if records is None:
+        if list_path is None:
+            list_path = input("请输入设备列表 TXT 文件路径：")
+        print(f"从文件加载设备列表：{list_path}")
+        if not os.path.isfile(list_path):
+            print(f"设备列表文件不存在：{list_path}")
+            return
+    metrics = Metrics()
+    partitions = partitions or parse_partitions(DEFAULT_PARTITIONS)
+    print(f"提取分区：{', '.join(partitions)}")
+    if prescan_only and not CATALOG_PATH:
+        print("预扫描结果保存在目录库中，请先设置 CATALOG_PATH")
         return
 
-    for device_name, version, url in devices:
-        await process_device(device_name, version, url)
+    output_root = Path(output_dir or os.getcwd()).resolve()
+    base_journals = ()
+    lease_queue = None
+    if shard or queue_path:
+        # 分片模式：每个 worker 在自己的子目录中输出镜像和处理记录，结束后用 python -m 核心.分片 merge 合并；
+        # 输出目录中已合并的处理记录只读加载，已处理的链接照常跳过
+        base_journals = (output_root / PROCESSED_URLS_FILE,)
+        if queue_path:
+            worker_id = worker_id or default_worker_id()
+            lease_queue = LeaseQueue(os.path.abspath(queue_path))
+        output_root = output_root / (shard.name if shard else f"worker-{worker_id}")
+        print(f"分片输出目录：{output_root}")
+    output_root.mkdir(parents=True, exist_ok=True)
+
+    if compress_level is not None and not prescan_only:
+        image_writer = compressed_writer(compress_level)
+        print(f"压缩存储：zstd 级别 {compress_level}，镜像保存为 .img.zst")
+    if BLOB_STORE_DIR and not prescan_only:
+        blob_store = BlobStore(BLOB_STORE_DIR, compress_level=compress_level)
+        if not blob_store.can_link(output_root):
+            # 跨文件系统时只能复制，镜像会保存两份，不如直接写入输出目录
+            print(f"去重存储：{BLOB_STORE_DIR} 与输出目录不在同一文件系统或不支持硬链接，本次不使用去重存储")
+            blob_store.close()
+            blob_store = None
+    if DEAD_LETTER_FILE:
+        dead_letters = DeadLetterList(output_root / DEAD_LETTER_FILE)
+    if io_budget_path and not prescan_only:
+        # 与其他爬取进程（或 all 中的另一个爬取阶段）共用下载带宽和写盘速度上限
+        io_budget = IOBudget(io_budget_path, priority=io_priority)
+        rates = io_budget.rates()
+        print(f"带宽预算：下载 {format_rate(rates[BUCKET_DOWNLOAD])}，写盘 {format_rate(rates[BUCKET_DISK])}，"
+              f"优先级 {io_priority}")
+
+    with ResumeJournal(output_root / PROCESSED_URLS_FILE, flush_interval=JOURNAL_FLUSH_INTERVAL,
+                       base_paths=base_journals) as journal:
+        reader = None
+        if records is None:
+            # 流式读取设备列表，读到第一条记录就开始处理
+            reader = DeviceListReader(list_path, device_filter)
+            devices = iter(reader)
+        else:
+            devices = (record for record in records if device_filter is None or device_filter.match(record))
+
+        if CATALOG_PATH:
+            catalog = Catalog(CATALOG_PATH)
+            layouts = catalog.layout_summaries()
+
+            def register(batch):
+                # 登记列表中的卡刷包，并把处理记录中已有的状态同步到目录库
+                catalog.upsert_packages(batch, source=SOURCE)
+                catalog.set_statuses((device.url, journal.status(device.url)) for device in batch if device.url in journal)
+
+            devices = tap_batches(devices, register)
+
+        if selection:
+            # 按版本选择：每个设备最新的 N 个版本，或只处理比库中已有版本更新的版本
+            devices = select_versions(devices, selection,
+                                      is_known=lambda url: journal.status(url) in (STATUS_OK, STATUS_NO_PARTITION))
+
+        if retry_failed:
+            # 只重试上次失败和进入死信列表的链接
+            failed_urls = set(journal.urls_with_status(STATUS_FAILED))
+            failed_urls.update(journal.urls_with_status(STATUS_DEAD_LETTER))
+            devices = (device for device in devices if device.url in failed_urls)
+            print(f"重试失败的链接：{len(failed_urls)} 个")
+
+        if largest_first:
+            # 按预扫描得到的所需下载量从大到小处理（需要先读完整个列表）
+            devices = order_largest_first(devices, layouts)
+            print(format_estimate(devices, layouts))
+
+        if prescan_only:
+            if shard:
+                devices = (device for device in devices if shard.match(device))
+            await run_prescan(devices, partitions)
+            catalog.close()
+            return
+
+        queue_size = None
+        if shard:
+            devices = (device for device in devices if shard.match(device))
+        elif lease_queue:
+            added = lease_queue.enqueue(devices, reset_failed=retry_failed)
+            print(f"租约队列：新登记 {added} 个任务，worker：{worker_id}")
+            devices = lease_queue.iter_leases(worker_id)
+            # 只预先领取一个任务，其余留给其他 worker
+            queue_size = 1
+            lease_queue.start_heartbeat(worker_id)
+
+        async def handle(device):
+            await process_device(journal, device.device_name, device.version, device.url, partitions, force=retry_failed)
+            if lease_queue:
+                lease_queue.complete(device.url, worker_id, journal.status(device.url))
+
+        # 有界队列 + 多个 worker 并发处理卡刷包
+        metrics.start_reporter(PROGRESS_INTERVAL)
+        try:
+            await run_pipeline(devices, handle, workers=concurrency, queue_size=queue_size)
+        finally:
+            metrics.stop_reporter()
+            if lease_queue:
+                # 中断时把已领取但未完成的任务放回队列
+                lease_queue.release(worker_id)
+                lease_queue.close()
+
+    if reader:
+        metrics.observe(STAGE_LIST_PARSE, reader.parse_seconds)
+        print(reader.summary())
+        if not reader.records:
+            print("未找到有效的设备数据。")
+
+    print(metrics.report())
+    metrics.export_json(output_root / METRICS_JSON)
+    metrics.export_csv(output_root / METRICS_CSV)
+    print(f"运行指标已导出：{output_root / METRICS_JSON}，{output_root / METRICS_CSV}")
+    if dead_letters and dead_letters.count:
+        print(f"本次新增死信 {dead_letters.count} 个，见 {dead_letters.path}")
+
+    if blob_store:
+        print(f"去重存储：复用 {blob_store.reused} 个镜像，节省写入 {blob_store.bytes_saved} 字节")
+        blob_store.close()
+    if io_budget:
+        print(f"带宽预算：下载等待 {io_budget.waited[BUCKET_DOWNLOAD]:.1f} 秒，写盘等待 {io_budget.waited[BUCKET_DISK]:.1f} 秒")
+        io_budget.close()
+    if catalog:
+        catalog.close()
+
+
+def add_arguments(parser):
+    parser.add_argument("--list", help="设备列表 TXT 文件（不指定时交互输入）")
+    parser.add_argument("--output-dir", help="输出目录（默认当前目录）")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_PACKAGES,
+                        help=f"同时处理的卡刷包数量（默认 {MAX_CONCURRENT_PACKAGES}）")
+    parser.add_argument("--retry-failed", action="store_true", help="只重试上次失败和进入死信列表的链接")
+    add_filter_arguments(parser)
+    add_shard_arguments(parser)
+    add_partition_arguments(parser, DEFAULT_PARTITIONS)
+    parser.add_argument("--prescan", action="store_true",
+                        help="只预扫描：记录卡刷包大小、格式和所需分区的位置到目录库，不提取")
+    parser.add_argument("--largest-first", action="store_true",
+                        help="按预扫描得到的所需下载量从大到小处理，并估计总下载量")
+    add_budget_arguments(parser, IO_BUDGET_PATH, IO_PRIORITY)
+    parser.add_argument("--compress", type=int, nargs="?", const=DEFAULT_LEVEL, default=COMPRESS_LEVEL, metavar="级别",
+                        help=f"镜像以 zstd 压缩保存为 .img.zst（默认级别 {DEFAULT_LEVEL}），用 python -m 核心.压缩存储 export 解压")
+
+
+def run(args, parser, records=None):
+    """按命令行参数运行；python -m 核心 crawl / all 也通过这里调用，records 为上游阶段传来的记录"""
+    if args.prescan and args.queue:
+        parser.error("--prescan 不能与 --queue 同时使用")
+    try:
+        shard = ShardSpec.parse(args.shard, args.shard_by) if args.shard else None
+        partitions = parse_partitions(args.partitions)
+    except ValueError as e:
+        parser.error(str(e))
+    asyncio.run(main(list_path=args.list, output_dir=args.output_dir, records=records, concurrency=args.concurrency,
+                     retry_failed=args.retry_failed, device_filter=DeviceFilter.from_args(args),
+                     selection=VersionSelection(args.latest, args.new_only),
+                     shard=shard, queue_path=args.queue, worker_id=args.worker_id,
+                     prescan_only=args.prescan, largest_first=args.largest_first, partitions=partitions,
+                     io_budget_path=None if args.io_budget.lower() == "none" else args.io_budget,
+                     io_priority=args.io_priority, compress_level=args.compress))
 
 
 if __name__ == "__main__":
-    import asyncio
-
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="从设备列表中的卡刷包提取分区镜像")
+    add_arguments(parser)
+    run(parser.parse_args(), parser)